@@ -8,6 +8,36 @@ current_dir = os.path.dirname(__file__)
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
+@pytest.fixture(scope="session", autouse=True)
+def feature_cache_dir(tmp_path_factory):
+    """Point the process-wide ORB feature cache at a temporary directory so
+    test runs never write into the repository's cache/features"""
+    from config.settings import reload_settings
+    import vision.feature_cache as feature_cache
+
+    path = str(tmp_path_factory.mktemp("features"))
+    previous = os.environ.get('FEATURE_CACHE_DIR')
+    os.environ['FEATURE_CACHE_DIR'] = path
+    reload_settings()
+    feature_cache._default_cache = None
+    yield path
+    if previous is None:
+        os.environ.pop('FEATURE_CACHE_DIR', None)
+    else:
+        os.environ['FEATURE_CACHE_DIR'] = previous
+    reload_settings()
+    feature_cache._default_cache = None
+
+@pytest.fixture(autouse=True)
+def default_model_router():
+    """Fresh process-wide ModelRouter per test, so circuit breaker and latency
+    state from one test cannot steer another"""
+    import utils.model_router as model_router
+
+    model_router._default_router = None
+    yield
+    model_router._default_router = None
+
 @pytest.fixture
 def sample_image():
     """Provide a sample test image"""
@@ -0,0 +1,587 @@
+import sys
+import os
+import pytest
+from unittest.mock import Mock, patch
+
+# Add parent directory to path
+current_dir = os.path.dirname(__file__)
+parent_dir = os.path.dirname(current_dir)
+sys.path.append(parent_dir)
+
+from utils.openrouter_llm import OpenRouterLLM, FREE_MODELS
+from utils.llm_cache import LLMCache
+from utils.async_openrouter_llm import AsyncOpenRouterLLM
+from utils.model_router import ModelRouter
+from utils.rate_limiter import RateLimiter
+from utils.openrouter_standin import OpenRouterStandIn, Cassette
+from utils.llm_usage import UsageTracker, caller_scope, track_caller
+from config.settings import Settings, get_settings, load_settings, parse_env_file
+from utils.prompt_fitter import PromptFitter
+
+class TestSettings:
+    def test_parse_env_file(self, tmp_path):
+        env_file = tmp_path / ".env"
+        env_file.write_text("# comment\nA=1\nexport B='two'\nC=\"x=y\"\n\nbroken line\n")
+        assert parse_env_file(str(env_file)) == {'A': '1', 'B': 'two', 'C': 'x=y'}
+
+    def test_environment_overrides_env_file_without_mutating_it(self, tmp_path):
+        env_file = tmp_path / ".env"
+        env_file.write_text("LLM_TIMEOUT=12\nLLM_POOL_SIZE=4\nSETTINGS_TEST_ONLY=from-file\n")
+        with patch.dict(os.environ, {'LLM_TIMEOUT': '45'}):
+            settings = load_settings(str(env_file))
+        assert settings.llm_timeout == 45.0
+        assert settings.llm_pool_size == 4
+        assert settings.get('SETTINGS_TEST_ONLY') == 'from-file'
+        assert 'SETTINGS_TEST_ONLY' not in os.environ
+
+    def test_defaults_come_from_llm_config(self):
+        settings = Settings({'LLM_MAX_TOKENS': 'not a number'})
+        assert settings.llm_timeout == 30
+        assert settings.llm_max_tokens == 1000
+        assert settings.default_model == "deepseek/deepseek-chat"
+
+    def test_loaded_once(self):
+        assert get_settings() is get_settings()
+
+    def test_client_reads_settings(self):
+        settings = Settings({'LLM_TIMEOUT': '7', 'LLM_MAX_RETRIES': '1', 'LLM_TEMPERATURE': '0.2'})
+        with patch('utils.openrouter_llm.get_settings', return_value=settings):
+            llm = OpenRouterLLM(api_key="test-key", use_cache=False, rate_limit=False)
+        assert llm.timeout == 7.0
+        assert llm.max_retries == 1
+        assert llm._request_params({})['temperature'] == 0.2
+
+class TestPromptFitter:
+    def setup_method(self):
+        self.fitter = PromptFitter(limits={"tiny": {"context": 600, "chars_per_token": 4.0}})
+
+    def _prompt(self, passages=10):
+        context = ''.join(f"Source: doc{i}\n{('passage %d ' % i) * 40}\n\n" for i in range(passages))
+        return f"Use the context to answer the question concisely.\n\nContext: {context}\n\nQuestion: How old is the roof?"
+
+    def test_compress_collapses_whitespace_and_boilerplate(self):
+        text = "Roof   age:\t20 years\n\n\n\nAccept all cookies\nThis listing line is repeated verbatim.\nThis listing line is repeated verbatim.\n- ok\n- ok"
+        assert self.fitter.compress(text) == "Roof age: 20 years\n\nThis listing line is repeated verbatim.\n- ok\n- ok"
+
+    def test_compress_keeps_structure(self):
+        text = ("Listings:\n- 12 Oak St, 3 bed, 2 bath, roof 2015\n  - garage:  detached\n"
+                "- 40 Elm St\n- 12 Oak St, 3 bed, 2 bath, roof 2015\n"
+                "def score(x):\n    if x:\n        return 1")
+        assert self.fitter.compress(text) == text.replace("garage:  detached", "garage: detached")
+
+    def test_small_prompt_keeps_budget(self):
+        prompt, max_tokens, info = self.fitter.fit("Question: short", "tiny", 200)
+        assert prompt == "Question: short"
+        assert max_tokens == 200
+        assert not info['trimmed']
+
+    def test_oversized_prompt_trims_least_relevant_context(self):
+        prompt, max_tokens, info = self.fitter.fit(self._prompt(), "tiny", 1000)
+        assert info['trimmed']
+        assert max_tokens == 256
+        assert info['tokens'] <= 600 - 256 - 64
+        assert prompt.startswith("Use the context")
+        assert prompt.endswith("Question: How old is the roof?")
+        assert "Source: doc0" in prompt
+        assert "Source: doc9" not in prompt
+
+    def test_client_sends_fitted_request(self):
+        llm = OpenRouterLLM(api_key="test-key", use_cache=False, rate_limit=False, routing=False,
+                            model="tiny", prompt_fitter=self.fitter)
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "done"}}]}
+        with patch.object(llm.session, 'post', return_value=ok) as post:
+            llm._post_model_completion("tiny", self._prompt(), {"max_tokens": 1000})
+        sent = post.call_args[1]['json']
+        assert sent['max_tokens'] == 256
+        assert len(sent['messages'][0]['content']) < len(self._prompt())
+
+class TestLLMCache:
+    def test_key_depends_on_model_params_and_prompt(self):
+        key = LLMCache.make_key("m1", {"temperature": 0.7}, "prompt")
+        assert key == LLMCache.make_key("m1", {"temperature": 0.7}, "prompt")
+        assert key != LLMCache.make_key("m2", {"temperature": 0.7}, "prompt")
+        assert key != LLMCache.make_key("m1", {"temperature": 0.2}, "prompt")
+        assert key != LLMCache.make_key("m1", {"temperature": 0.7}, "other prompt")
+
+    def test_set_get_and_ttl(self, tmp_path):
+        cache_path = str(tmp_path / "answers.sqlite")
+        cache = LLMCache(cache_path, ttl_seconds=60)
+        cache.set("k", "answer")
+        assert cache.get("k") == "answer"
+
+        expired = LLMCache(cache_path, ttl_seconds=-1)
+        assert expired.get("k") is None
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        cache = LLMCache(str(tmp_path / "answers.sqlite"), max_entries=2, touch_interval=0)
+        cache.set("a", "1")
+        cache.set("b", "2")
+        cache.get("a")
+        cache.set("c", "3")
+        cache.evict()
+        assert cache.get("b") is None
+        assert cache.get("a") == "1"
+        assert cache.stats()['entries'] == 2
+
+    def test_wal_mode_and_throttled_touch(self, tmp_path):
+        cache = LLMCache(str(tmp_path / "answers.sqlite"))
+        cache.set("k", "answer")
+        conn = cache._connect()
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        before = conn.total_changes
+        assert cache.get("k") == "answer"
+        # A fresh entry's hit does not write
+        assert conn.total_changes == before
+
+class TestOpenRouterLLM:
+    def setup_method(self):
+        self.cache = Mock()
+        self.cache.make_key.side_effect = LLMCache.make_key
+        # A private router keeps failures injected here out of the process-wide one
+        self.llm = OpenRouterLLM(api_key="test-key", cache=self.cache, rate_limit=False,
+                                 router=ModelRouter(FREE_MODELS.values()))
+
+    def test_clients_share_default_router(self):
+        first = OpenRouterLLM(api_key="test-key", use_cache=False, rate_limit=False)
+        second = OpenRouterLLM(api_key="test-key", use_cache=False, rate_limit=False, model="custom/model")
+        assert first.router is second.router
+        # A client's own model is routed to only for that client
+        assert "custom/model" not in first.router.models
+        assert "custom/model" not in [first.router.choose(primary=first.model) for _ in range(50)]
+
+    def test_router_prefers_callers_primary(self):
+        router = ModelRouter(["a", "b"], primary="a", explore_rate=0)
+        assert router.choose() == "a"
+        assert router.choose(primary="b") == "b"
+
+    def test_hedging_without_healthy_model_raises(self):
+        self.llm.hedge_after = 0.05
+        with patch.object(self.llm.router, 'choose', return_value=None):
+            with pytest.raises(RuntimeError, match="No healthy model"):
+                self.llm._post_completion("prompt", {})
+
+    def test_cache_hit_skips_request(self):
+        self.cache.get.return_value = "cached answer"
+        with patch.object(self.llm, '_post_completion') as post:
+            assert self.llm.invoke("prompt") == "cached answer"
+            post.assert_not_called()
+
+    def test_cache_read_error_falls_through_to_model(self):
+        import sqlite3
+        self.cache.get.side_effect = sqlite3.OperationalError("database is locked")
+        with patch.object(self.llm, '_post_completion', return_value="fresh answer"):
+            assert self.llm.invoke("prompt") == "fresh answer"
+
+    def test_cache_miss_stores_answer(self):
+        self.cache.get.return_value = None
+        with patch.object(self.llm, '_post_completion', return_value="fresh answer"):
+            assert self.llm.invoke("prompt") == "fresh answer"
+        self.cache.set.assert_called_once()
+
+    def test_stream_parses_sse_deltas(self):
+        self.cache.get.return_value = None
+        response = Mock(status_code=200)
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+        response.iter_lines.return_value = [
+            ": OPENROUTER PROCESSING",
+            'data: {"choices": [{"delta": {"content": "Hel"}}]}',
+            "",
+            'data: {"choices": [{"delta": {"content": "lo"}}]}',
+            "data: [DONE]"
+        ]
+        with patch.object(self.llm.session, 'post', return_value=response):
+            assert list(self.llm.stream("prompt")) == ["Hel", "lo"]
+        self.cache.set.assert_called_once()
+        assert self.cache.set.call_args[0][1] == "Hello"
+
+    def test_reports_finish_reason(self):
+        self.cache.get.return_value = None
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "cut"}, "finish_reason": "length"}]}
+        info = {}
+        with patch.object(self.llm.session, 'post', return_value=ok):
+            assert self.llm.invoke("prompt", info=info) == "cut"
+        assert info['finish_reason'] == 'length'
+        
+        response = Mock(status_code=200)
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+        response.iter_lines.return_value = [
+            'data: {"choices": [{"delta": {"content": "cut"}}]}',
+            'data: {"choices": [{"delta": {}, "finish_reason": "length"}]}',
+            "data: [DONE]"
+        ]
+        info = {}
+        with patch.object(self.llm.session, 'post', return_value=response):
+            assert "".join(self.llm.stream("other prompt", info=info)) == "cut"
+        assert info['finish_reason'] == 'length'
+
+    def test_retries_transient_errors_with_backoff(self):
+        throttled = Mock(status_code=429, headers={})
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "done"}}]}
+        with patch.object(self.llm.session, 'post', side_effect=[throttled, ok]) as post, \
+                patch('utils.openrouter_llm.time.sleep') as sleep:
+            assert self.llm._post_completion("prompt", {}) == "done"
+        assert post.call_count == 2
+        sleep.assert_called_once()
+
+    def test_honours_long_retry_after_up_to_cap(self):
+        throttled = Mock(status_code=429, headers={"Retry-After": "20"})
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "done"}}]}
+        with patch.object(self.llm.session, 'post', side_effect=[throttled, ok]), \
+                patch('utils.openrouter_llm.time.sleep') as sleep:
+            assert self.llm._post_model_completion(self.llm.model, "prompt", {}) == "done"
+        assert sleep.call_args[0][0] == 20
+
+    def test_gives_up_when_retry_after_exceeds_cap(self):
+        throttled = Mock(status_code=429, headers={"Retry-After": "3600"})
+        throttled.raise_for_status.side_effect = Exception("429")
+        with patch.object(self.llm.session, 'post', return_value=throttled) as post, \
+                patch('utils.openrouter_llm.time.sleep') as sleep:
+            with pytest.raises(Exception):
+                self.llm._post_model_completion(self.llm.model, "prompt", {})
+        assert post.call_count == 1
+        sleep.assert_not_called()
+
+    def test_gives_up_after_max_retries(self):
+        failing = Mock(status_code=503, headers={})
+        failing.raise_for_status.side_effect = Exception("503")
+        with patch.object(self.llm.session, 'post', return_value=failing) as post, \
+                patch('utils.openrouter_llm.time.sleep'):
+            with pytest.raises(Exception):
+                self.llm._post_model_completion(self.llm.model, "prompt", {})
+        assert post.call_count == self.llm.max_retries + 1
+
+    def test_fails_over_to_next_model(self):
+        models = []
+
+        def fake_post(model, prompt, params):
+            models.append(model)
+            if model == self.llm.model:
+                raise RuntimeError("upstream down")
+            return "backup answer"
+
+        with patch.object(self.llm, '_post_model_completion', side_effect=fake_post):
+            assert self.llm._post_completion("prompt", {}) == "backup answer"
+        assert models[0] == self.llm.model
+        assert len(models) == 2
+        assert self.llm.router.snapshot()[models[1]]['latency_ewma'] is not None
+
+    def test_hedges_slow_request(self):
+        import time
+        self.llm.hedge_after = 0.05
+
+        def fake_post(model, prompt, params):
+            if model == self.llm.model:
+                time.sleep(0.5)
+                return "slow answer"
+            return "hedged answer"
+
+        with patch.object(self.llm, '_post_model_completion', side_effect=fake_post):
+            assert self.llm._post_completion("prompt", {}) == "hedged answer"
+
+    def test_fallback_answer_cached_under_answering_model(self):
+        self.cache.get.return_value = None
+        primary = self.llm.model
+
+        def fake_post(model, prompt, params):
+            if model == primary:
+                raise RuntimeError("upstream down")
+            return "backup answer"
+
+        with patch.object(self.llm, '_post_model_completion', side_effect=fake_post):
+            assert self.llm.invoke("prompt") == "backup answer"
+        key, value = self.cache.set.call_args[0][:2]
+        answered = self.cache.set.call_args[1]['model']
+        assert answered != primary
+        assert key == LLMCache.make_key(answered, self.llm._request_params({}), "prompt")
+        assert key != LLMCache.make_key(primary, self.llm._request_params({}), "prompt")
+
+    def test_concurrent_identical_prompts_share_one_call(self):
+        import threading
+        import time
+        self.cache.get.return_value = None
+        calls = []
+
+        def slow_post(prompt, params, served=None):
+            calls.append(prompt)
+            time.sleep(0.1)
+            return "shared answer"
+
+        results = []
+        with patch.object(self.llm, '_post_completion', side_effect=slow_post):
+            threads = [threading.Thread(target=lambda: results.append(self.llm.invoke("same prompt"))) for _ in range(5)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        assert results == ["shared answer"] * 5
+        assert len(calls) == 1
+
+class TestRateLimiter:
+    def test_burst_then_queue(self, tmp_path):
+        limiter = RateLimiter(str(tmp_path / "bucket.json"), requests_per_minute=2)
+        with patch('utils.rate_limiter.time.sleep') as sleep:
+            assert limiter.acquire() == 0
+            assert limiter.acquire() == 0
+            assert limiter.acquire() == pytest.approx(30, abs=0.5)
+            # The next caller queues behind the one already waiting
+            assert limiter.acquire() == pytest.approx(60, abs=0.5)
+        assert sleep.call_count == 2
+
+    def test_budget_shared_through_state_file(self, tmp_path):
+        path = str(tmp_path / "bucket.json")
+        first = RateLimiter(path, requests_per_minute=60, tokens_per_minute=1000)
+        second = RateLimiter(path, requests_per_minute=60, tokens_per_minute=1000)
+        with patch('utils.rate_limiter.time.sleep'):
+            assert first.acquire(tokens=900) == 0
+            assert second.acquire(tokens=200) == pytest.approx(6, abs=0.5)
+        assert first.available()['tokens'] < 0
+
+    def test_client_acquires_once_per_request(self, tmp_path):
+        limiter = Mock(tokens_per_minute=1000)
+        llm = OpenRouterLLM(api_key="test-key", use_cache=False, rate_limiter=limiter, routing=False)
+        throttled = Mock(status_code=429, headers={})
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "done"}}],
+                                "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15}}
+        with patch.object(llm.session, 'post', side_effect=[throttled, ok]), \
+                patch('utils.openrouter_llm.time.sleep'):
+            assert llm._post_completion("x" * 40, {"max_tokens": 100}) == "done"
+        # Retries reuse the reservation instead of queueing for another
+        limiter.acquire.assert_called_once_with(110)
+        # The unused part of the worst-case reservation is given back
+        limiter.adjust_tokens.assert_called_once_with(15 - 110)
+
+    def test_failed_request_returns_its_reservation(self, tmp_path):
+        limiter = RateLimiter(str(tmp_path / "bucket.json"), tokens_per_minute=1000)
+        llm = OpenRouterLLM(api_key="test-key", use_cache=False, rate_limiter=limiter, routing=False)
+        failing = Mock(status_code=400, headers={})
+        failing.raise_for_status.side_effect = Exception("400")
+        with patch.object(llm.session, 'post', return_value=failing):
+            with pytest.raises(Exception):
+                llm._post_completion("x" * 40, {"max_tokens": 100})
+        assert limiter.available()['tokens'] == pytest.approx(1000, abs=1)
+
+    def test_hedged_request_reserves_once(self, tmp_path):
+        import time
+        limiter = Mock(tokens_per_minute=1000)
+        llm = OpenRouterLLM(api_key="test-key", use_cache=False, rate_limiter=limiter,
+                            router=ModelRouter(FREE_MODELS.values()), hedge_after=0.05)
+
+        def fake_post(model, prompt, params):
+            if model == llm.model:
+                time.sleep(0.3)
+            return "answer"
+
+        with patch.object(llm, '_post_model_completion', side_effect=fake_post):
+            assert llm._post_completion("prompt", {"max_tokens": 100}) == "answer"
+        assert limiter.acquire.call_count == 1
+
+class TestModelRouter:
+    def setup_method(self):
+        self.router = ModelRouter(["a", "b", "c"], primary="a", min_requests=2,
+                                  cooldown_seconds=60, explore_rate=0)
+
+    def test_prefers_primary_then_fastest(self):
+        assert self.router.choose() == "a"
+        self.router.record_success("a", 2.0)
+        self.router.record_success("b", 0.5)
+        assert self.router.choose() == "b"
+
+    def test_circuit_opens_and_half_opens(self):
+        self.router.record_failure("a")
+        self.router.record_failure("a")
+        assert self.router.snapshot()["a"]["state"] == "open"
+        assert self.router.choose() != "a"
+
+        self.router._stats["a"].opened_at -= 61
+        assert self.router.choose() == "a"
+        assert self.router.snapshot()["a"]["state"] == "half_open"
+        # Only one probe at a time while half-open
+        assert self.router.choose() != "a"
+        self.router.record_success("a", 0.1)
+        assert self.router.snapshot()["a"]["state"] == "closed"
+
+    def test_failed_probe_reopens(self):
+        self.router.record_failure("a")
+        self.router.record_failure("a")
+        self.router._stats["a"].opened_at -= 61
+        self.router.choose()
+        self.router.record_failure("a")
+        assert self.router.snapshot()["a"]["state"] == "open"
+
+class TestAsyncOpenRouterLLM:
+    def setup_method(self):
+        self.llm = OpenRouterLLM(api_key="test-key", use_cache=False, rate_limit=False)
+        self.client = AsyncOpenRouterLLM(self.llm, max_concurrency=2)
+
+    def test_invoke_many_keeps_order_and_bounds_concurrency(self):
+        import threading
+        import time
+        active = {'now': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def fake_post(prompt, params, served=None):
+            with lock:
+                active['now'] += 1
+                active['peak'] = max(active['peak'], active['now'])
+            time.sleep(0.02)
+            with lock:
+                active['now'] -= 1
+            return prompt.upper()
+
+        with patch('utils.async_openrouter_llm.aiohttp', None), \
+                patch.object(self.llm, '_post_completion', side_effect=fake_post):
+            results = self.client.invoke_many_sync(["a", "b", "c", "d", "e"])
+        assert results == ["A", "B", "C", "D", "E"]
+        assert active['peak'] <= 2
+
+    def test_session_from_previous_loop_is_closed(self):
+        import asyncio
+        closed = []
+
+        class FakeSession:
+            def __init__(self, **kwargs):
+                self.closed = False
+
+            async def close(self):
+                self.closed = True
+                closed.append(self)
+
+        fake_aiohttp = Mock()
+        fake_aiohttp.ClientSession = FakeSession
+        with patch('utils.async_openrouter_llm.aiohttp', fake_aiohttp):
+            first = asyncio.run(self.client._get_session())
+            second = asyncio.run(self.client._get_session())
+            asyncio.run(self.client.aclose())
+        assert first is not second
+        assert closed == [first, second]
+
+    def test_concurrent_first_requests_share_one_session(self):
+        import asyncio
+        created = []
+
+        class FakeSession:
+            def __init__(self, **kwargs):
+                self.closed = False
+                created.append(self)
+
+            async def close(self):
+                await asyncio.sleep(0)
+                self.closed = True
+
+        async def run():
+            # A stale session makes creation await before the new one exists
+            sessions = await asyncio.gather(*(self.client._get_session() for _ in range(5)))
+            await self.client.aclose()
+            return sessions
+
+        fake_aiohttp = Mock()
+        fake_aiohttp.ClientSession = FakeSession
+        with patch('utils.async_openrouter_llm.aiohttp', fake_aiohttp):
+            asyncio.run(self.client._get_session())
+            sessions = asyncio.run(run())
+        assert len(created) == 2
+        assert all(session is sessions[0] for session in sessions)
+        assert all(session.closed for session in created)
+
+class TestUsageTracker:
+    def setup_method(self):
+        self.tracker = UsageTracker(pricing={"paid/model": {"prompt": 1.0, "completion": 2.0}})
+
+    def test_periodic_summary_restart_and_stop(self):
+        import threading
+        import time
+        printed = []
+        self.tracker.record("free/model", 10, 5, 100.0)
+        self.tracker.start_periodic_summary(0.01, printer=printed.append)
+        self.tracker.start_periodic_summary(0.01, printer=printed.append)
+        time.sleep(0.05)
+        workers = [t for t in threading.enumerate() if t.name == "llm-usage-summary"]
+        self.tracker.stop_periodic_summary()
+        count = len(printed)
+        time.sleep(0.05)
+        assert len(workers) == 1
+        assert count > 0 and len(printed) == count
+
+    def test_attributes_calls_to_nested_callers(self):
+        with caller_scope('orchestrator'):
+            with caller_scope('query_engine', 'cost_estimation'):
+                self.tracker.record("paid/model", 1000, 500, latency_ms=120)
+            self.tracker.record("free/model", cache='hit', prompt_text="Summarize this\nmore")
+        summary = self.tracker.summary()
+        engine = summary['by_caller']['orchestrator/query_engine']
+        assert engine['total_tokens'] == 1500
+        assert engine['cost_usd'] == pytest.approx(0.002)
+        assert summary['by_caller']['orchestrator']['cache_hits'] == 1
+        assert summary['top_prompts'][0]['prompt'] == 'cost_estimation'
+        assert summary['top_prompts'][1]['prompt'] == 'Summarize this'
+
+    def test_track_caller_labels_by_argument(self):
+        @track_caller('query_engine', prompt_arg='query_type')
+        def query(question, query_type='general'):
+            self.tracker.record("free/model", 10, 10)
+
+        query("q", query_type='regulatory')
+        assert self.tracker.summary()['top_prompts'][0]['prompt'] == 'regulatory'
+
+    def test_client_records_usage_and_cache_hits(self):
+        cache = Mock()
+        cache.make_key.side_effect = LLMCache.make_key
+        cache.get.return_value = None
+        llm = OpenRouterLLM(api_key="test-key", cache=cache, rate_limit=False, routing=False, usage_tracker=self.tracker)
+        ok = Mock(status_code=200)
+        ok.json.return_value = {"choices": [{"message": {"content": "done"}}],
+                                "usage": {"prompt_tokens": 12, "completion_tokens": 3}}
+        with caller_scope('report_generator'):
+            with patch.object(llm.session, 'post', return_value=ok):
+                llm.invoke("prompt")
+            cache.get.return_value = "done"
+            llm.invoke("prompt")
+        bucket = self.tracker.summary()['by_caller']['report_generator']
+        assert bucket['upstream_calls'] == 1
+        assert bucket['cache_hits'] == 1
+        assert bucket['prompt_tokens'] == 12
+        assert bucket['completion_tokens'] == 3
+
+class TestOpenRouterStandIn:
+    def setup_method(self):
+        self.standin = None
+
+    def teardown_method(self):
+        if self.standin is not None:
+            self.standin.stop()
+
+    def _client(self, **kwargs):
+        self.standin = OpenRouterStandIn(**kwargs)
+        url = self.standin.start()
+        return OpenRouterLLM(api_key="test-key", use_cache=False, rate_limit=False, routing=False, base_url=url)
+
+    def test_replays_cassette(self, tmp_path):
+        cassette_path = str(tmp_path / "cassette.json")
+        Cassette(cassette_path).record("deepseek/deepseek-chat", [{"role": "user", "content": "hello"}], "recorded answer")
+        llm = self._client(cassette_path=cassette_path)
+        assert llm.invoke("hello") == "recorded answer"
+        assert "".join(llm.stream("hello")) == "recorded answer"
+        assert self.standin.stats['replayed'] == 2
+
+    def test_synthesizes_cassette_misses(self):
+        llm = self._client(fallback_words=20)
+        answer = llm.invoke("unknown prompt")
+        assert answer.startswith("Stand-in answer for: unknown prompt")
+        assert len(answer.split()) == 20
+
+    def test_injects_errors(self):
+        llm = self._client(error_rate=1.0, error_statuses=[503])
+        with patch('utils.openrouter_llm.time.sleep'):
+            with pytest.raises(Exception):
+                llm._post_completion("prompt", {})
+        assert self.standin.stats['errors_injected'] == llm.max_retries + 1
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -11,6 +11,10 @@ sys.path.append(parent_dir)
 from rag.vector_store import PropertyVectorStore
 from rag.query_engine import PropertyQueryEngine
 from rag.knowledge_base import KnowledgeBase
+from rag.context_packer import ContextPacker
+from rag.reranker import LexicalReranker
+from rag.intent_router import StructuredIntentRouter
+from apis.building_codes_api import BuildingCodesAPI
 
 class TestKnowledgeBase:
     def setup_method(self):
@@ -41,6 +45,26 @@ class TestPropertyVectorStore:
     def test_as_retriever(self):
         retriever = self.vector_store.as_retriever()
         assert retriever is not None
+    
+    def test_search_terms_ranks_by_weight(self):
+        from rag.vector_store import Document
+        self.vector_store.add_documents([
+            Document("walls and paint", {'source': 'a'}),
+            Document("roof shingles and walls", {'source': 'b'})
+        ])
+        results = self.vector_store.search_terms([('roof', 2.0), ('walls', 1.0)], k=5)
+        assert [d.metadata['source'] for d in results] == ['b', 'a']
+    
+    def test_save_load_compressed(self, tmp_path):
+        from rag.vector_store import Document
+        self.vector_store.add_documents([Document("roof shingle guidance", {'source': 'codes.json'})])
+        self.vector_store.save(str(tmp_path), compression='gzip')
+        assert (tmp_path / 'docs.json.gz').exists()
+        
+        loaded = PropertyVectorStore()
+        loaded.load(str(tmp_path))
+        assert loaded.documents[0].page_content == "roof shingle guidance"
+        assert loaded.documents[0].metadata['source'] == 'codes.json'
 
 class TestPropertyQueryEngine:
     def setup_method(self):
@@ -62,6 +86,14 @@ class TestPropertyQueryEngine:
         assert "roof" in enhanced
         assert "NYC" in enhanced
     
+    def test_enhance_query_size_is_bounded(self):
+        components = {f'component_{i}': {'condition': 'x' * 1000} for i in range(200)}
+        cv_context = {'components': components, 'condition_scores': {'component_3': 1}}
+        
+        enhanced = self.query_engine._enhance_query("roof leak", cv_context, {'location': 'NYC'})
+        assert len(enhanced) < 200
+        assert "{" not in enhanced
+    
     def test_select_categories(self):
         cv_context = {'components': ['roof', 'walls']}
         categories = self.query_engine._select_categories('cost_estimation', cv_context)
@@ -69,6 +101,184 @@ class TestPropertyQueryEngine:
         assert 'general' in categories
         assert 'cost' in categories
         assert 'roof' in categories
+    
+    def test_aquery_with_context(self):
+        import asyncio
+        from rag.vector_store import Document
+        vector_store = PropertyVectorStore()
+        vector_store.add_documents([Document("roof permits are required", {'source': 'codes'})])
+        engine = PropertyQueryEngine(vector_store)
+        engine.llm = Mock()
+        engine.llm.invoke.return_value = "async answer"
+        
+        result = asyncio.run(engine.aquery_with_context("roof"))
+        assert result['answer'] == "async answer"
+        assert len(result['retrieved']) == 1
+    
+    def test_query_with_context_timings(self):
+        from rag.tracing import InMemoryMetricsSink
+        sink = InMemoryMetricsSink()
+        engine = PropertyQueryEngine(PropertyVectorStore(), metrics_sink=sink)
+        engine.llm = Mock()
+        engine.llm.invoke.return_value = "answer"
+        
+        result = engine.query_with_context("roof leak repair")
+        for stage in ('enhance_query', 'retrieval', 'prompt_format', 'llm_invoke', 'total'):
+            assert stage in result['timings']
+        assert sink.percentile('query_engine.llm_invoke', 99) is not None
+    
+    def test_stream_reports_truncation(self):
+        engine = PropertyQueryEngine(PropertyVectorStore())
+        
+        def fake_stream(prompt, info=None):
+            yield "partial"
+            info['finish_reason'] = 'length'
+        
+        engine.llm = Mock()
+        engine.llm.stream.side_effect = fake_stream
+        done = list(engine.stream_query_with_context("roof leak repair"))[-1]
+        assert done['type'] == 'done'
+        assert done['result']['truncated'] is True
+        assert done['result']['finish_reason'] == 'length'
+        
+        def fake_invoke(prompt, info=None):
+            info['finish_reason'] = 'stop'
+            return "full"
+        
+        engine.llm.invoke.side_effect = fake_invoke
+        result = engine.query_with_context("roof leak repair")
+        assert result['finish_reason'] == 'stop' and result['truncated'] is False
+    
+    def test_structured_route_skips_llm(self):
+        self.query_engine.llm = Mock()
+        
+        result = self.query_engine.query_with_context("What inspections are required for electrical work?")
+        assert result['route'] == 'structured'
+        assert "Rough electrical inspection" in result['answer']
+        self.query_engine.llm.invoke.assert_not_called()
+    
+    def test_open_ended_question_is_not_routed(self):
+        assert self.query_engine.intent_router.detect("How should I maintain my roof?") is None
+        assert self.query_engine.intent_router.detect("Do I need a permit for roofing?")['work_type'] == 'roofing'
+    
+    def test_permit_question_without_real_data_goes_to_llm(self):
+        # Without an API key the sample data only covers some work types
+        router = StructuredIntentRouter(building_codes_api=BuildingCodesAPI(api_key=None))
+        assert router.route('Do I need a permit for foundation work?', '') is None
+        
+        api = Mock()
+        api.lookup_permit_requirements.return_value = None
+        failing = StructuredIntentRouter(building_codes_api=api)
+        assert failing.route('Do I need a permit for roofing?', 'Springfield') is None
+        assert 'Permit required for roofing work: Yes' in router.route('Do I need a permit for roofing?', '')['answer']
+    
+    def test_ambiguous_panel_is_not_electrical(self):
+        router = self.query_engine.intent_router
+        assert router.detect("Do I need a permit to install a solar panel?") is None
+        assert router.detect("Do I need a permit to replace a damaged siding panel?") is None
+        assert router.detect("Do I need a permit for a panel upgrade?")['work_type'] == 'electrical'
+        assert router.detect("Is an inspection required for a new breaker panel?")['work_type'] == 'electrical'
+    
+    def test_route_respects_query_type(self):
+        engine = PropertyQueryEngine(PropertyVectorStore())
+        engine.llm = Mock()
+        engine.llm.invoke.return_value = "Estimate"
+        question = "What inspections are required for electrical work?"
+        assert engine.intent_router.route(question, '', 'cost_estimation') is None
+        assert engine.intent_router.route(question, '', 'regulatory') is not None
+        
+        result = engine.query_with_context(question, query_type='cost_estimation')
+        assert result['answer'] == "Estimate"
+        engine.llm.invoke.assert_called_once()
+    
+    def test_permit_cache_is_bounded(self):
+        api = Mock()
+        api.lookup_permit_requirements.return_value = {'permit_required': True}
+        router = StructuredIntentRouter(building_codes_api=api, permit_cache_size=2)
+        for city in ('a', 'b', 'c', 'A '):
+            router.route('Do I need a permit for roofing?', city)
+        # 'A ' normalizes to 'a', which was already evicted
+        assert list(router._permit_cache) == [('roofing', 'c'), ('roofing', 'a')]
+        assert api.lookup_permit_requirements.call_count == 4
+        router.route('Do I need a permit for roofing?', 'c')
+        assert api.lookup_permit_requirements.call_count == 4
+    
+    def test_query_batch_single_round_trip(self):
+        self.query_engine.vector_store = PropertyVectorStore()
+        self.query_engine.llm = Mock()
+        self.query_engine.llm.invoke.return_value = 'Sure: {"1": "about $500", "2": "about $900"}'
+        
+        results = self.query_engine.query_batch(["Cost of gutters?", "Cost of paint?"], 'cost_estimation')
+        assert [r['answer'] for r in results] == ["about $500", "about $900"]
+        assert self.query_engine.llm.invoke.call_count == 1
+    
+    def test_query_batch_falls_back_for_unparsed_items(self):
+        self.query_engine.vector_store = PropertyVectorStore()
+        self.query_engine.llm = Mock()
+        self.query_engine.llm.invoke.side_effect = ['{"1": "batched"}', "single"]
+        
+        results = self.query_engine.query_batch(["q one", "q two"])
+        assert [r['answer'] for r in results] == ["batched", "single"]
+    
+    def test_query_batch_keeps_answers_from_truncated_reply(self):
+        self.query_engine.vector_store = PropertyVectorStore()
+        self.query_engine.llm = Mock()
+        self.query_engine.llm.invoke.side_effect = ['{"1": "first \\"quoted\\"", "2": "second", "3": "cut o', "single"]
+        
+        results = self.query_engine.query_batch(["q one", "q two", "q three"])
+        assert [r['answer'] for r in results] == ['first "quoted"', "second", "single"]
+        assert self.query_engine.llm.invoke.call_count == 2
+        assert self.query_engine.llm.invoke.call_args_list[0][1]['max_tokens'] >= 3 * self.query_engine.batch_answer_tokens
+    
+    def test_stream_query_with_context(self):
+        self.query_engine.vector_store = PropertyVectorStore()
+        self.query_engine.llm = Mock()
+        self.query_engine.llm.stream.return_value = iter(["Permits ", "required"])
+        
+        events = list(self.query_engine.stream_query_with_context("roof leak repair"))
+        assert events[0]['type'] == 'sources'
+        assert [e['text'] for e in events if e['type'] == 'token'] == ["Permits ", "required"]
+        assert events[-1]['type'] == 'done'
+        assert events[-1]['result']['answer'] == "Permits required"
+
+class TestContextPacker:
+    def setup_method(self):
+        from rag.vector_store import Document
+        self.docs = [
+            Document("Roof shingle replacement permit rules. " * 40, {'source': 'codes_a'}),
+            Document("Roof shingle replacement permit rules. " * 40, {'source': 'codes_b'}),
+            Document("Kitchen plumbing fixtures and drain guidance.", {'source': 'plumbing'})
+        ]
+    
+    def test_pack_respects_budget(self):
+        packer = ContextPacker(budgets={'general': 300})
+        context, passages = packer.pack("roof shingle permit", self.docs, 'general')
+        assert passages
+        assert sum(p['tokens'] for p in passages) <= 300
+        assert "Source:" in context
+    
+    def test_pack_prefers_diverse_passages(self):
+        packer = ContextPacker(budgets={'general': 10000}, passage_chars=2000, mmr_lambda=0.3)
+        _, passages = packer.pack("roof shingle permit", self.docs, 'general')
+        assert passages[0]['source'] in ('codes_a', 'codes_b')
+        assert passages[1]['source'] == 'plumbing'
+
+class TestLexicalReranker:
+    def setup_method(self):
+        from rag.vector_store import Document
+        self.reranker = LexicalReranker(min_score=0.2)
+        self.docs = [
+            Document("Gutter cleaning schedule for autumn leaves.", {'source': 'maintenance'}),
+            Document("The roof needs new shingles; shingle roof permits apply.", {'source': 'codes'}),
+            Document("Roof colour trends. Many unrelated words here before shingles appear.", {'source': 'design'})
+        ]
+    
+    def test_orders_by_relevance_and_applies_cutoff(self):
+        ranked = self.reranker.rerank([('roof', 2.0), ('shingles', 1.0)], self.docs, top_n=3)
+        sources = [d.metadata['source'] for d, _ in ranked]
+        assert sources[0] == 'codes'
+        assert 'maintenance' not in sources
+        assert all(score >= 0.2 for _, score in ranked)
 
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
@@ -1,14 +1,20 @@
 import sys
 import os
+import json
 import pytest
 import numpy as np
 import cv2
+from unittest.mock import patch
 
 current_dir = os.path.dirname(__file__)
 parent_dir = os.path.dirname(current_dir)
 sys.path.append(parent_dir)
 
 from vision.change_detector import ChangeDetector
+from vision.feature_cache import FeatureCache, get_default_feature_cache
+from vision.feature_matcher import FeatureMatcher
+from vision.mask_encoding import encode_rle, decode_rle, decode_change_mask
+from vision.tiled_processor import TiledProcessor, open_raster
 from vision.property_detector import PropertyDetector
 from vision.condition_scorer import ConditionScorer
 from vision.material_recognizer import MaterialRecognizer
@@ -41,6 +47,370 @@ class TestChangeDetector:
         roi = self.detector._extract_region(self.test_image1, region)
         assert roi.shape == (20, 20, 3)
 
+    def _large_pair(self):
+        before = np.full((1200, 1600, 3), 90, dtype=np.uint8)
+        cv2.rectangle(before, (100, 100), (400, 300), (30, 60, 200), -1)
+        after = before.copy()
+        cv2.rectangle(after, (1100, 700), (1200, 780), (250, 250, 250), -1)
+        return before, after
+
+    def test_pyramid_finds_change_in_few_tiles(self):
+        detector = ChangeDetector(pyramid_max_side=400, tile_size=256)
+        before, after = self._large_pair()
+        result = detector.detect_changes(before, after, mode='pyramid')
+        assert result['mode'] == 'pyramid'
+        assert result['num_changes'] == 1
+        x, y, w, h = result['change_regions'][0]
+        assert (x, y, w, h) == (1100, 700, 101, 81)
+        assert 0 < result['pyramid']['tiles_changed'] < result['pyramid']['tiles_total']
+
+    def test_pyramid_unchanged_pair_skips_all_tiles(self):
+        detector = ChangeDetector(pyramid_max_side=400, tile_size=256)
+        before, _ = self._large_pair()
+        result = detector.detect_changes(before, before.copy(), mode='pyramid')
+        assert result['pyramid']['tiles_changed'] == 0
+        assert result['num_changes'] == 0
+        assert result['change_percentage'] == 0
+
+    def test_pyramid_matches_full_mode(self):
+        detector = ChangeDetector(pyramid_max_side=400, tile_size=256)
+        before, after = self._large_pair()
+        pyramid = detector.detect_changes(before, after, mode='pyramid')
+        full = detector.detect_changes(before, after, mode='full')
+        assert sorted(pyramid['change_regions']) == sorted(full['change_regions'])
+        assert pyramid['total_change_area'] == full['total_change_area']
+
+    def test_auto_mode_uses_pixel_count(self):
+        detector = ChangeDetector(pyramid_min_pixels=1_000_000)
+        assert detector.detect_changes(self.test_image1, self.test_image2)['mode'] == 'full'
+        before, after = self._large_pair()
+        assert detector.detect_changes(before, after)['mode'] == 'pyramid'
+
+    def test_detect_sequence(self):
+        images = [np.full((120, 160, 3), 90, dtype=np.uint8) for _ in range(4)]
+        cv2.rectangle(images[1], (10, 10), (40, 40), (255, 255, 255), -1)
+        cv2.rectangle(images[2], (10, 10), (40, 40), (255, 255, 255), -1)
+        cv2.rectangle(images[3], (10, 10), (40, 40), (255, 255, 255), -1)
+        cv2.rectangle(images[3], (100, 60), (140, 100), (0, 0, 0), -1)
+        result = self.detector.detect_sequence(images, artifacts='arrays')
+        assert result['num_images'] == 4
+        assert len(result['pairwise']) == 3
+        assert len(result['cumulative']) == 3
+        assert [step['num_changes'] for step in result['history']] == [1, 0, 1]
+        assert [step['cumulative_num_changes'] for step in result['history']] == [1, 1, 2]
+        assert result['change_frequency'].shape == (120, 160)
+        assert result['change_frequency'][20, 20] == 1
+        assert result['change_frequency'][5, 5] == 0
+        lean = self.detector.detect_sequence(images)
+        assert lean['change_frequency'] is None
+        assert [step['num_changes'] for step in lean['history']] == [1, 0, 1]
+
+    def _square_pair(self):
+        before = np.full((200, 300, 3), 90, dtype=np.uint8)
+        after = before.copy()
+        cv2.rectangle(after, (50, 40), (120, 100), (255, 255, 255), -1)
+        return before, after
+
+    def test_default_result_is_lean_and_json_serializable(self):
+        before, after = self._square_pair()
+        result = self.detector.detect_changes(before, after)
+        assert 'difference_image' not in result
+        assert 'threshold_image' not in result
+        assert result['change_polygons'] == [[[50, 40], [50, 100], [120, 100], [120, 40]]]
+        assert len(json.dumps(result)) < 2048
+        mask = decode_change_mask(result)
+        assert mask.shape == (200, 300)
+        assert mask[70, 80] == 255 and mask[10, 10] == 0
+
+    def test_artifact_levels(self):
+        before, after = self._square_pair()
+        lean = self.detector.detect_changes(before, after, artifacts='none')
+        assert 'change_polygons' not in lean
+        with pytest.raises(ValueError):
+            decode_change_mask(lean)
+        rle = self.detector.detect_changes(before, after, artifacts='rle')
+        expected = np.zeros((200, 300), dtype=np.uint8)
+        expected[40:101, 50:121] = 255
+        assert np.array_equal(decode_change_mask(rle), expected)
+        arrays = self.detector.detect_changes(before, after, artifacts='arrays')
+        assert arrays['threshold_image'].shape == (200, 300)
+        assert arrays['difference_image'].shape == (200, 300)
+        with pytest.raises(ValueError):
+            self.detector.detect_changes(before, after, artifacts='everything')
+
+    def test_rle_round_trip(self):
+        rng = np.random.RandomState(3)
+        for mask in (rng.rand(37, 53) > 0.7, np.ones((4, 5), bool), np.zeros((4, 5), bool)):
+            mask = mask.astype(np.uint8) * 255
+            rle = encode_rle(mask)
+            assert sum(rle['counts']) == mask.size
+            assert np.array_equal(decode_rle(json.loads(json.dumps(rle))), mask)
+
+    def test_detect_sequence_prepares_each_image_once(self):
+        images = [np.full((60, 80, 3), value, dtype=np.uint8) for value in (10, 50, 90, 130, 170)]
+        prepared = []
+        original = self.detector._prepare
+
+        def counting_prepare(image, *args, **kwargs):
+            prepared.append(image)
+            return original(image, *args, **kwargs)
+
+        self.detector._prepare = counting_prepare
+        result = self.detector.detect_sequence(images)
+        assert len(prepared) == len(images)
+        assert len(result['history']) == len(images) - 1
+
+    def test_detect_sequence_needs_two_images(self):
+        result = self.detector.detect_sequence([self.test_image1])
+        assert result['pairwise'] == []
+        assert result['history'] == []
+
+class TestFeatureCache:
+    def setup_method(self):
+        self.orb = cv2.ORB_create()
+        rng = np.random.RandomState(0)
+        self.gray = cv2.GaussianBlur(rng.randint(0, 255, (200, 200), dtype=np.uint8), (5, 5), 0)
+        self.calls = 0
+
+    def _compute(self, image):
+        self.calls += 1
+        return self.orb.detectAndCompute(image, None)
+
+    def test_memory_hit_skips_compute(self, tmp_path):
+        cache = FeatureCache(cache_dir=str(tmp_path))
+        first = cache.get_or_compute(self.gray, self._compute)
+        second = cache.get_or_compute(self.gray.copy(), self._compute)
+        assert self.calls == 1
+        assert second is not None and len(second[0]) == len(first[0])
+        assert cache.stats()['hits'] == 1
+
+    def test_persists_to_disk(self, tmp_path):
+        keypoints, descriptors = FeatureCache(cache_dir=str(tmp_path)).get_or_compute(self.gray, self._compute)
+        assert len(list(tmp_path.glob('*.npz'))) == 1
+        fresh = FeatureCache(cache_dir=str(tmp_path))
+        loaded_keypoints, loaded_descriptors = fresh.get_or_compute(self.gray, self._compute)
+        assert self.calls == 1
+        assert fresh.stats()['disk_hits'] == 1
+        assert np.array_equal(loaded_descriptors, descriptors)
+        assert [kp.pt for kp in loaded_keypoints] == [kp.pt for kp in keypoints]
+        assert [kp.octave for kp in loaded_keypoints] == [kp.octave for kp in keypoints]
+
+    def test_default_cache_dir_from_settings(self, feature_cache_dir):
+        assert get_default_feature_cache().cache_dir == feature_cache_dir
+
+    def test_failed_write_leaves_no_temp_file(self, tmp_path):
+        cache = FeatureCache(cache_dir=str(tmp_path))
+        with patch('vision.feature_cache.os.replace', side_effect=OSError("disk full")):
+            cache.get_or_compute(self.gray, self._compute)
+        assert list(tmp_path.iterdir()) == []
+
+    def test_namespace_and_content_change_key(self):
+        assert FeatureCache.make_key(self.gray) == FeatureCache.make_key(self.gray.copy())
+        assert FeatureCache.make_key(self.gray) != FeatureCache.make_key(self.gray, namespace='orb:1000')
+        changed = self.gray.copy()
+        changed[0, 0] ^= 1
+        assert FeatureCache.make_key(self.gray) != FeatureCache.make_key(changed)
+
+    def test_lru_eviction(self):
+        cache = FeatureCache(cache_dir=None, max_entries=2)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, (), None)
+        assert cache.get('a') is None
+        assert cache.get('c') is not None
+
+    def test_change_detector_reuses_baseline_features(self, tmp_path):
+        detector = ChangeDetector(feature_cache=FeatureCache(cache_dir=str(tmp_path)))
+        baseline = cv2.cvtColor(self.gray, cv2.COLOR_GRAY2BGR)
+        extracted = []
+        original = detector.orb.detectAndCompute
+
+        class CountingOrb:
+            def __getattr__(self, name):
+                return getattr(original.__self__, name)
+
+            def detectAndCompute(self, image, mask):
+                extracted.append(image.shape)
+                return original(image, mask)
+
+        detector.orb = CountingOrb()
+        for value in (0, 80, 160):
+            after = baseline.copy()
+            after[50:100, 50:100] = value
+            detector.detect_changes(baseline, after)
+        # one extraction for the baseline plus one per distinct later image
+        assert len(extracted) == 4
+
+class TestFeatureMatcher:
+    def setup_method(self):
+        rng = np.random.RandomState(1)
+        image = cv2.GaussianBlur(rng.randint(0, 255, (300, 300), dtype=np.uint8), (3, 3), 0)
+        self.orb = cv2.ORB_create(nfeatures=400)
+        self.kp, self.des = self.orb.detectAndCompute(image, None)
+        shifted = np.roll(image, 7, axis=1)
+        self.kp2, self.des2 = self.orb.detectAndCompute(shifted, None)
+
+    def test_identical_images_match_perfectly(self):
+        matcher = FeatureMatcher(method='bf')
+        matches = matcher.match(self.des, self.des)
+        assert len(matches) > 0
+        assert all(m.distance == 0 for m in matches)
+        assert matcher.similarity(self.des, self.des) == 100.0
+
+    def test_uses_hamming_norm(self):
+        matches = FeatureMatcher(method='bf', ratio=None).match(self.des, self.des2)
+        first = matches[0]
+        expected = cv2.norm(self.des[first.queryIdx], self.des2[first.trainIdx], cv2.NORM_HAMMING)
+        assert first.distance == expected
+
+    def test_ratio_test_and_cross_check_filter(self):
+        plain = FeatureMatcher(method='bf', ratio=None, max_features=None).match(self.des, self.des2)
+        ratio = FeatureMatcher(method='bf', ratio=0.75, max_features=None).match(self.des, self.des2)
+        both = FeatureMatcher(method='bf', ratio=0.75, cross_check=True, max_features=None).match(self.des, self.des2)
+        assert len(plain) == len(self.des)
+        assert 0 < len(both) <= len(ratio) < len(plain)
+
+    def test_flann_lsh(self):
+        matcher = FeatureMatcher(method='flann')
+        matches = matcher.match(self.des, self.des2)
+        assert len(matches) > 0
+        assert matches == sorted(matches, key=lambda m: m.distance)
+
+    def test_auto_switches_to_flann_at_the_cap(self):
+        matcher = FeatureMatcher(method='auto', max_features=200)
+        assert len(self.des) > 200 and len(self.des2) > 200
+        with patch.object(matcher, '_one_way', wraps=matcher._one_way) as one_way:
+            assert matcher.match(self.des, self.des2, self.kp, self.kp2)
+        assert one_way.call_args[0][0] is matcher.flann
+        # Sparse images stay on exact matching
+        assert matcher._matcher_for(50, 400) is matcher.bf
+
+    def test_max_features_keeps_strongest_and_original_indices(self):
+        matcher = FeatureMatcher(method='bf', ratio=None, max_features=50)
+        matches = matcher.match(self.des, self.des, self.kp, self.kp)
+        assert len(matches) == 50
+        strongest = set(np.argsort([-kp.response for kp in self.kp], kind='stable')[:50])
+        assert {m.queryIdx for m in matches} == strongest
+        assert all(m.queryIdx == m.trainIdx for m in matches)
+
+    def test_empty_descriptors(self):
+        assert FeatureMatcher().match(None, self.des) == []
+        assert FeatureMatcher().similarity(self.des, np.zeros((0, 32), dtype=np.uint8)) == 0.0
+
+class TestTiledProcessor:
+    def setup_method(self):
+        self.processor = TiledProcessor(tile_size=256, workers=4,
+                                        change_detector=ChangeDetector(use_feature_cache=False))
+        self.before = np.full((700, 900, 3), 90, dtype=np.uint8)
+        self.after = self.before.copy()
+        # Crosses the tile corner at (512, 512) and a vertical border at 256
+        cv2.rectangle(self.after, (480, 470), (560, 540), (255, 255, 255), -1)
+        cv2.rectangle(self.after, (200, 100), (300, 160), (0, 0, 0), -1)
+        # Too small to count on its own
+        self.after[650:655, 50:55] = 255
+
+    def test_tiles_cover_image(self):
+        windows = self.processor.tiles((700, 900))
+        assert len(windows) == 3 * 4
+        assert windows[-1] == (512, 768, 700, 900)
+
+    def test_stitched_regions_match_full_resolution(self):
+        tiled = self.processor.detect_changes(self.before, self.after)
+        full = self.processor.change_detector.detect_changes(self.before, self.after, mode='full')
+        assert tiled['mode'] == 'tiled'
+        assert sorted(tiled['change_regions']) == sorted(full['change_regions'])
+        assert tiled['total_change_area'] == full['total_change_area']
+        assert tiled['tiles']['tiles_changed'] == 7
+        mask = decode_change_mask(tiled)
+        assert mask[500, 520] == 255 and mask[10, 10] == 0
+
+    def test_region_cut_by_tiles_keeps_untiled_area(self):
+        before = np.full((300, 300, 3), 90, dtype=np.uint8)
+        after = before.copy()
+        # Contour area 100 untiled; the two pieces cut at x=256 sum to only 90
+        cv2.rectangle(after, (250, 100), (260, 110), (255, 255, 255), -1)
+        full = self.processor.change_detector.detect_changes(before, after, mode='full')
+        tiled = self.processor.detect_changes(before, after)
+        assert full['num_changes'] == tiled['num_changes'] == 1
+        assert tiled['total_change_area'] == full['total_change_area']
+        coarse = TiledProcessor(tile_size=256, merge_max_pixels=1,
+                                change_detector=self.processor.change_detector)
+        assert coarse.detect_changes(before, after)['total_change_area'] >= full['total_change_area']
+
+    def test_artifacts_level_is_honoured(self):
+        lean = self.processor.detect_changes(self.before, self.after, artifacts='none')
+        assert lean['artifacts'] == 'none' and 'change_polygons' not in lean
+        rle = self.processor.detect_changes(self.before, self.after, artifacts='rle')
+        full = self.processor.change_detector.detect_changes(self.before, self.after, mode='full', artifacts='rle')
+        assert np.array_equal(decode_change_mask(rle), decode_change_mask(full))
+        arrays = self.processor.detect_changes(self.before, self.after, artifacts='arrays')
+        assert arrays['threshold_image'].shape == (700, 900)
+
+    def test_caller_memmap_pages_are_kept(self, tmp_path):
+        np.save(tmp_path / 'after.npy', self.before)
+        after = np.load(tmp_path / 'after.npy', mmap_mode='c')
+        after[470:541, 480:561] = 255
+        result = self.processor.detect_changes(self.before, after)
+        assert result['num_changes'] == 1
+        assert after[500, 500, 0] == 255
+
+    def test_diagonal_touch_across_tile_corner(self):
+        before = np.zeros((512, 512, 3), dtype=np.uint8)
+        after = before.copy()
+        after[206:256, 206:256] = 255
+        after[256:306, 256:306] = 255
+        result = self.processor.detect_changes(before, after)
+        assert result['change_regions'] == [(206, 206, 100, 100)]
+
+    def test_memory_mapped_npy_and_raw(self, tmp_path):
+        np.save(tmp_path / 'before.npy', self.before)
+        self.after.tofile(tmp_path / 'after.raw')
+        before = open_raster(str(tmp_path / 'before.npy'))
+        after = open_raster(str(tmp_path / 'after.raw'), shape=self.after.shape)
+        assert isinstance(before, np.memmap) and isinstance(after, np.memmap)
+        result = self.processor.detect_changes(before, after)
+        assert result['num_changes'] == 2
+        with pytest.raises(ValueError):
+            open_raster(str(tmp_path / 'after.raw'))
+
+    def test_tiff_rgb(self, tmp_path):
+        tifffile = pytest.importorskip('tifffile')
+        path = str(tmp_path / 'after.tif')
+        tifffile.imwrite(path, cv2.cvtColor(self.after, cv2.COLOR_BGR2RGB))
+        processor = TiledProcessor(tile_size=256, channel_order='rgb',
+                                   change_detector=ChangeDetector(use_feature_cache=False))
+        result = processor.detect_changes(self.before, path)
+        assert result['num_changes'] == 2
+
+    def test_size_mismatch(self):
+        with pytest.raises(ValueError):
+            self.processor.detect_changes(self.before, self.after[:100])
+
+    def test_property_components_in_global_coordinates(self):
+        image = np.full((600, 600, 3), 200, dtype=np.uint8)
+        # dark square window straddling the tile border at x=256
+        cv2.rectangle(image, (230, 300), (290, 360), (20, 20, 20), -1)
+        result = self.processor.detect_property_components(image)
+        bboxes = [w['bbox'] for w in result['properties']['windows']]
+        assert bboxes == [(230, 300, 61, 61)]
+        assert result['property_summary']['tiles'] == 9
+
+    def test_summed_measures_ignore_overlap(self):
+        image = np.full((600, 600, 3), 200, dtype=np.uint8)
+        for x in range(40, 600, 60):
+            cv2.line(image, (x, 0), (x, 599), (20, 20, 20), 3)
+        for y in range(420, 600, 40):
+            cv2.line(image, (0, y), (599, y), (20, 20, 20), 3)
+        totals = []
+        for overlap in (0, 64):
+            processor = TiledProcessor(tile_size=256, overlap=overlap, workers=2,
+                                       change_detector=ChangeDetector(use_feature_cache=False))
+            properties = processor.detect_property_components(image)['properties']
+            totals.append(tuple(properties[name][counter] for name, counter in
+                                (('roof', 'estimated_area'), ('walls', 'vertical_edges'),
+                                 ('foundation', 'horizontal_edges'))))
+        assert totals[0] == totals[1]
+        assert totals[0][1] > 0
+
 class TestPropertyDetector:
     def setup_method(self):
         self.detector = PropertyDetector()
@@ -52,7 +52,20 @@ class HomeInspectorAgent:
             inspection_report['components'][component]['material'] = material_info
         
         # Change detection if multiple images provided
-        if len(images) > 1:
+        if len(images) > 2:
+            # Inspection history: compare every visit, reusing each image's features
+            sequence = self.change_detector.detect_sequence(images)
+            changes = sequence['cumulative'][-1]
+            inspection_report['changes'] = changes
+            inspection_report['change_history'] = sequence['history']
+            
+            for step in sequence['history']:
+                if step['change_percentage'] > 5:
+                    inspection_report['issues'].append(
+                        f"Significant changes between images {step['index'] - 1} and {step['index']}: {step['change_percentage']:.1f}%")
+            if changes['change_percentage'] > 5:
+                inspection_report['issues'].append(f"Significant changes detected: {changes['change_percentage']:.1f}%")
+        elif len(images) > 1:
             changes = self.change_detector.detect_changes(images[0], images[-1])
             inspection_report['changes'] = changes
             
@@ -7,7 +7,10 @@ from agents.insurance_agent import InsuranceAgent
 from agents.real_estate_agent import RealEstateAgent
 from agents.historical_analyzer import HistoricalAnalyzer
 from rag.query_engine import PropertyQueryEngine
+from utils.llm_usage import track_caller
 from typing import List, Dict
+from concurrent.futures import ThreadPoolExecutor
+import contextvars
 
 class PropertyOrchestrator:
     def __init__(self, query_engine: PropertyQueryEngine):
@@ -17,6 +20,7 @@ class PropertyOrchestrator:
         self.real_estate_agent = RealEstateAgent(query_engine)
         self.historical_analyzer = HistoricalAnalyzer()
         
+    @track_caller('orchestrator')
     def comprehensive_property_analysis(self, images, property_info=None, analysis_type='full'):
         """Orchestrate comprehensive property analysis"""
         results = {
@@ -80,19 +84,26 @@ class PropertyOrchestrator:
         results['summary'] = self._generate_summary(results)
         results['recommendations'] = self._consolidate_recommendations(results)
         
-        # Enrich recommendations with RAG-driven cost and code checks
-        enriched = []
-        for rec in results['recommendations']:
-            try:
-                cost = self.query_engine.query_with_context(f"Estimate cost for: {rec}", query_type='cost_estimation')
-            except Exception as e:
-                cost = {'answer': f'Cost estimation unavailable: {e}'}
-            try:
-                codes = self.query_engine.query_with_context(f"Building code requirements for: {rec}", query_type='regulatory')
-            except Exception as e:
-                codes = {'answer': f'Regulatory lookup unavailable: {e}'}
-            enriched.append({'recommendation': rec, 'cost_estimate': cost, 'code_check': codes})
-        results['recommendation_details'] = enriched
+        # Enrich recommendations with RAG-driven cost and code checks,
+        # batching all questions of one type into a single LLM call
+        # The cost and regulatory batches are independent, so run them concurrently
+        recommendations = results['recommendations']
+        # Each worker runs in a copy of this context so LLM usage stays attributed to the orchestrator
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            cost_future = pool.submit(contextvars.copy_context().run, self.query_engine.query_batch, [f"Estimate cost for: {rec}" for rec in recommendations], query_type='cost_estimation')
+            code_future = pool.submit(contextvars.copy_context().run, self.query_engine.query_batch, [f"Building code requirements for: {rec}" for rec in recommendations], query_type='regulatory')
+        try:
+            costs = cost_future.result()
+        except Exception as e:
+            costs = [{'answer': f'Cost estimation unavailable: {e}'} for _ in recommendations]
+        try:
+            codes = code_future.result()
+        except Exception as e:
+            codes = [{'answer': f'Regulatory lookup unavailable: {e}'} for _ in recommendations]
+        results['recommendation_details'] = [
+            {'recommendation': rec, 'cost_estimate': cost, 'code_check': code}
+            for rec, cost, code in zip(recommendations, costs, codes)
+        ]
 
         return results
     
@@ -156,6 +167,7 @@ class PropertyOrchestrator:
         """Get comprehensive property history"""
         return self.historical_analyzer.get_historical_property_data(address)
     
+    @track_caller('orchestrator')
     def query_property_knowledge(self, question, context=None):
         """Query the property knowledge base"""
         return self.query_engine.query_with_context(
@@ -164,6 +176,7 @@ class PropertyOrchestrator:
             user_context=context or {}
         )
     
+    @track_caller('orchestrator')
     def get_cost_estimate(self, repair_description, property_info=None):
         """Get cost estimate for repairs/improvements"""
         context = {}
@@ -176,6 +189,7 @@ class PropertyOrchestrator:
             user_context=context
         )
     
+    @track_caller('orchestrator')
     def check_building_codes(self, work_description, location=None):
         """Check building code requirements"""
         context = {'location': location} if location else {}
@@ -1,5 +1,10 @@
 import os
+import sys
 from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
 from .real_estate_api import RealEstateAPI
 from .insurance_api import InsuranceAPI
 from .building_codes_api import BuildingCodesAPI
@@ -14,14 +19,8 @@ class APIManager:
         self.weather_api = WeatherAPI(self.api_keys.get('weather'))
     
     def _load_api_keys(self) -> Dict[str, Optional[str]]:
-        """Load API keys from environment variables"""
-        return {
-            'real_estate': os.getenv('REAL_ESTATE_API_KEY'),
-            'insurance': os.getenv('INSURANCE_API_KEY'),
-            'building_codes': os.getenv('BUILDING_CODES_API_KEY'),
-            'weather': os.getenv('OPENWEATHERMAP_API_KEY'),
-            'google_maps': os.getenv('GOOGLE_MAPS_API_KEY')
-        }
+        """API keys from the shared settings (environment and .env)"""
+        return dict(get_settings().api_keys)
     
     def get_property_data(self, location: str) -> Dict:
         """Get comprehensive property data for location"""
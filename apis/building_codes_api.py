@@ -1,9 +1,38 @@
+import os
+import sys
 import requests
 from typing import Dict, List, Optional
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+
+# Sample permit requirements served when no API key is configured
+MOCK_PERMIT_REQUIREMENTS = {
+    'electrical': {
+        'permit_required': True,
+        'estimated_cost': 150,
+        'processing_time': '5-10 business days',
+        'required_documents': ['electrical_plan', 'contractor_license']
+    },
+    'plumbing': {
+        'permit_required': True,
+        'estimated_cost': 125,
+        'processing_time': '3-7 business days',
+        'required_documents': ['plumbing_plan', 'contractor_license']
+    },
+    'roofing': {
+        'permit_required': True,
+        'estimated_cost': 200,
+        'processing_time': '7-14 business days',
+        'required_documents': ['structural_plan', 'contractor_license']
+    }
+}
+
 class BuildingCodesAPI:
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None, timeout: Optional[float] = None):
         self.api_key = api_key
+        self.timeout = timeout or get_settings().http_timeout
         self.base_urls = {
             'icc': 'https://api.iccsafe.org/v1',
             'municipal': 'https://api.municode.com/v1',
@@ -24,7 +53,7 @@ class BuildingCodesAPI:
             }
             headers = {'Authorization': f'Bearer {self.api_key}'}
             
-            response = requests.get(url, params=params, headers=headers)
+            response = requests.get(url, params=params, headers=headers, timeout=self.timeout)
             if response.status_code == 200:
                 return response.json().get('codes', [])
         except Exception as e:
@@ -34,8 +63,18 @@ class BuildingCodesAPI:
     
     def get_permit_requirements(self, work_type: str, location: str) -> Dict:
         """Get permit requirements for specific work type"""
-        if not self.api_key:
+        requirements = self.lookup_permit_requirements(work_type, location)
+        if requirements is None:
             return self._mock_permit_requirements(work_type)
+        return requirements
+    
+    def lookup_permit_requirements(self, work_type: str, location: str) -> Optional[Dict]:
+        """Permit requirements actually known for this work type, or None when
+        the API failed or has no data (unlike get_permit_requirements, which
+        falls back to a generic 'no permit' default)"""
+        if not self.api_key:
+            requirements = MOCK_PERMIT_REQUIREMENTS.get(work_type)
+            return dict(requirements) if requirements else None
         
         try:
             url = f"{self.base_urls['permits']}/requirements"
@@ -45,13 +84,13 @@ class BuildingCodesAPI:
             }
             headers = {'Authorization': f'Bearer {self.api_key}'}
             
-            response = requests.get(url, params=params, headers=headers)
+            response = requests.get(url, params=params, headers=headers, timeout=self.timeout)
             if response.status_code == 200:
-                return response.json()
+                return response.json() or None
         except Exception as e:
             print(f"Permits API Error: {e}")
         
-        return self._mock_permit_requirements(work_type)
+        return None
     
     def check_compliance(self, property_details: Dict, location: str) -> Dict:
         """Check property compliance with current codes"""
@@ -66,7 +105,7 @@ class BuildingCodesAPI:
             }
             headers = {'Authorization': f'Bearer {self.api_key}'}
             
-            response = requests.post(url, json=payload, headers=headers)
+            response = requests.post(url, json=payload, headers=headers, timeout=self.timeout)
             if response.status_code == 200:
                 return response.json()
         except Exception as e:
@@ -115,33 +154,15 @@ class BuildingCodesAPI:
     
     def _mock_permit_requirements(self, work_type: str) -> Dict:
         """Mock permit requirements"""
-        requirements = {
-            'electrical': {
-                'permit_required': True,
-                'estimated_cost': 150,
-                'processing_time': '5-10 business days',
-                'required_documents': ['electrical_plan', 'contractor_license']
-            },
-            'plumbing': {
-                'permit_required': True,
-                'estimated_cost': 125,
-                'processing_time': '3-7 business days',
-                'required_documents': ['plumbing_plan', 'contractor_license']
-            },
-            'roofing': {
-                'permit_required': True,
-                'estimated_cost': 200,
-                'processing_time': '7-14 business days',
-                'required_documents': ['structural_plan', 'contractor_license']
-            }
-        }
-        
-        return requirements.get(work_type, {
+        requirements = MOCK_PERMIT_REQUIREMENTS.get(work_type)
+        if requirements:
+            return dict(requirements)
+        return {
             'permit_required': False,
             'estimated_cost': 0,
             'processing_time': 'N/A',
             'required_documents': []
-        })
+        }
     
     def _mock_compliance_check(self) -> Dict:
         """Mock compliance check results"""
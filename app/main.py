@@ -6,7 +6,8 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-if not os.getenv("OPENROUTER_API_KEY"):
+from config.settings import get_settings
+if not get_settings().openrouter_api_key:
     print("\nTo use free LLM models, get a free API key from https://openrouter.ai")
     print("Then set: export OPENROUTER_API_KEY=your_key_here\n")
 
@@ -19,6 +19,32 @@ MODEL_PARAMS = {
     "timeout": 30
 }
 
+# Context window (prompt + completion tokens) and approximate characters per
+# token for each model; used to fit prompts before sending them
+MODEL_LIMITS = {
+    "deepseek/deepseek-chat": {"context": 64000, "chars_per_token": 4.0},
+    "google/gemma-2-9b-it:free": {"context": 8192, "chars_per_token": 4.0},
+    "meta-llama/llama-3.1-8b-instruct:free": {"context": 131072, "chars_per_token": 4.0},
+    "microsoft/phi-3-mini-128k-instruct:free": {"context": 128000, "chars_per_token": 3.5},
+    "huggingface/zephyr-7b-beta:free": {"context": 4096, "chars_per_token": 3.5}
+}
+
+# Assumed for models missing from MODEL_LIMITS
+DEFAULT_MODEL_LIMITS = {"context": 4096, "chars_per_token": 3.5}
+
+# USD per million tokens, used when a response carries no cost;
+# models missing here (the :free ones) are counted as free
+MODEL_PRICING = {
+    "deepseek/deepseek-chat": {"prompt": 0.14, "completion": 0.28}
+}
+
+# Shared across all threads and processes (see utils/rate_limiter.py);
+# None disables that limit
+RATE_LIMITS = {
+    "requests_per_minute": 20,
+    "tokens_per_minute": 100000
+}
+
 def get_model_name(model_key: str = "deepseek-chat") -> str:
     """Get full model name from key"""
     return FREE_MODELS.get(model_key, DEFAULT_MODEL)
\ No newline at end of file
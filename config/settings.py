@@ -0,0 +1,113 @@
+"""Application settings, resolved once from the environment, .env and config/llm_config.py"""
+
+import os
+import sys
+import threading
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.llm_config import DEFAULT_MODEL, MODEL_PARAMS, RATE_LIMITS
+
+ENV_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env")
+
+def parse_env_file(path: str) -> Dict[str, str]:
+    """KEY=VALUE lines of a .env file; comments, blank lines and surrounding quotes are ignored"""
+    values = {}
+    if not os.path.exists(path):
+        return values
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            key = key.strip()
+            if key.startswith('export '):
+                key = key[len('export '):].strip()
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in ('"', "'"):
+                value = value[1:-1]
+            values[key] = value
+    return values
+
+class Settings:
+    """Read-only view of configuration shared by the LLM and API clients.
+
+    Process environment variables take precedence over .env, which takes
+    precedence over the defaults in config/llm_config.py. os.environ is
+    never modified.
+    """
+
+    def __init__(self, env: Dict[str, str]):
+        self._env = env
+
+        # LLM
+        self.openrouter_api_key = self.get('OPENROUTER_API_KEY')
+        self.openrouter_base_url = self.get('OPENROUTER_BASE_URL')
+        self.default_model = self.get('OPENROUTER_MODEL') or DEFAULT_MODEL
+        self.llm_temperature = self.get_float('LLM_TEMPERATURE', MODEL_PARAMS['temperature'])
+        self.llm_max_tokens = self.get_int('LLM_MAX_TOKENS', MODEL_PARAMS['max_tokens'])
+        self.llm_timeout = self.get_float('LLM_TIMEOUT', MODEL_PARAMS['timeout'])
+        self.llm_pool_size = self.get_int('LLM_POOL_SIZE', 10)
+        self.llm_max_retries = self.get_int('LLM_MAX_RETRIES', 3)
+        self.llm_cache_path = self.get('LLM_CACHE_PATH')
+        self.llm_rate_limit_path = self.get('LLM_RATE_LIMIT_PATH')
+        self.llm_requests_per_minute = self.get_float('LLM_REQUESTS_PER_MINUTE', RATE_LIMITS.get('requests_per_minute'))
+        self.llm_tokens_per_minute = self.get_float('LLM_TOKENS_PER_MINUTE', RATE_LIMITS.get('tokens_per_minute'))
+        self.llm_usage_summary_seconds = self.get_float('LLM_USAGE_SUMMARY_SECONDS', None)
+
+        # Vision
+        self.feature_cache_dir = self.get('FEATURE_CACHE_DIR')
+
+        # External APIs
+        self.api_keys = {
+            'real_estate': self.get('REAL_ESTATE_API_KEY'),
+            'insurance': self.get('INSURANCE_API_KEY'),
+            'building_codes': self.get('BUILDING_CODES_API_KEY'),
+            'weather': self.get('OPENWEATHERMAP_API_KEY'),
+            'google_maps': self.get('GOOGLE_MAPS_API_KEY')
+        }
+        self.http_timeout = self.get_float('HTTP_TIMEOUT', 30)
+        self.maps_user_agent = self.get('MAPS_USER_AGENT') or 'PropertyAnalysisApp/1.0'
+
+    def get(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Raw value; empty strings count as unset"""
+        value = self._env.get(key)
+        return value if value not in (None, '') else default
+
+    def get_int(self, key: str, default: Optional[int]) -> Optional[int]:
+        try:
+            return int(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+    def get_float(self, key: str, default: Optional[float]) -> Optional[float]:
+        try:
+            return float(self.get(key))
+        except (TypeError, ValueError):
+            return default
+
+_settings = None
+_settings_lock = threading.Lock()
+
+def get_settings() -> Settings:
+    """Settings parsed on first use and cached for the life of the process"""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = load_settings()
+    return _settings
+
+def load_settings(env_file: str = ENV_FILE) -> Settings:
+    env = parse_env_file(env_file)
+    env.update({key: value for key, value in os.environ.items() if value != ''})
+    return Settings(env)
+
+def reload_settings(env_file: str = ENV_FILE) -> Settings:
+    """Re-read .env and the environment (e.g. in tests or after editing .env)"""
+    global _settings
+    with _settings_lock:
+        _settings = load_settings(env_file)
+    return _settings
@@ -6,9 +6,9 @@ from apis.api_manager import APIManager
 from knowledge_base.web_scraper import FinalDump
 
 class KnowledgeBaseScraper:
-    def __init__(self, knowledge_base_path="knowledge_base"):
+    def __init__(self, knowledge_base_path="knowledge_base", compression=None):
         self.knowledge_base_path = knowledge_base_path
-        self.dump = FinalDump(knowledge_base_path)
+        self.dump = FinalDump(knowledge_base_path, compression=compression)
         self.api_manager = APIManager()
         
     def scrape_real_estate_data(self, location):
@@ -1,8 +1,12 @@
 import requests
 from bs4 import BeautifulSoup
-import json
 import os
-from typing import List, Dict
+import sys
+from typing import List, Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.compressed_io import dump_json, with_compression_suffix
 
 class REGScraper:
     def __init__(self, base_url: str):
@@ -68,15 +72,19 @@ class BCParser:
         return codes
 
 class FinalDump:
-    def __init__(self, output_dir: str):
+    def __init__(self, output_dir: str, compression: Optional[str] = None):
         self.output_dir = output_dir
+        # 'gzip', 'xz', 'zstd' or None for plain JSON
+        self.compression = compression
         os.makedirs(output_dir, exist_ok=True)
     
-    def save_data(self, data: Dict, filepath: str):
+    def save_data(self, data: Dict, filepath: str, compression: Optional[str] = None) -> str:
+        """Save data as JSON, compressed when requested. Returns the path written."""
+        filepath = with_compression_suffix(filepath, compression or self.compression)
         # Ensure the directory exists
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2)
+        dump_json(data, filepath, indent=2)
+        return filepath
     
     def dump_all(self, reg_data: List[Dict], igl_data: List[Dict], bc_data: List[Dict]):
         self.save_data({'listings': reg_data}, os.path.join(self.output_dir, 'real_estate_data.json'))
@@ -0,0 +1,112 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, List, Optional, Tuple
+from utils.text_utils import tokenize, estimate_tokens
+
+class ContextPacker:
+    """Select retrieved passages for the prompt under a token budget.
+
+    Documents are split into passages, then picked greedily by maximal
+    marginal relevance (MMR) so the context covers the question without
+    repeating near-duplicate listing blobs.
+    """
+
+    # Context token budget per query type
+    DEFAULT_BUDGETS = {
+        'cost_estimation': 1500,
+        'regulatory': 2000,
+        'general': 1200
+    }
+
+    def __init__(self, budgets: Optional[Dict[str, int]] = None, passage_chars: int = 800, mmr_lambda: float = 0.7):
+        self.budgets = dict(self.DEFAULT_BUDGETS)
+        if budgets:
+            self.budgets.update(budgets)
+        self.passage_chars = passage_chars
+        # 1.0 = pure relevance, 0.0 = pure diversity
+        self.mmr_lambda = mmr_lambda
+
+    def get_budget(self, query_type: str) -> int:
+        return self.budgets.get(query_type, self.budgets['general'])
+
+    def pack(self, question: str, documents: list, query_type: str = 'general') -> Tuple[str, List[Dict]]:
+        """Return the context text and the passages that made it in"""
+        budget = self.get_budget(query_type)
+        candidates = self._split_passages(documents)
+        if not candidates:
+            return '', []
+
+        query_terms = set(tokenize(question))
+        for passage in candidates:
+            passage['relevance'] = self._relevance(query_terms, passage['terms'])
+
+        selected = []
+        used = 0
+        while candidates:
+            best, best_score = None, None
+            for passage in candidates:
+                if used + passage['tokens'] > budget:
+                    continue
+                redundancy = max((self._similarity(passage['terms'], s['terms']) for s in selected), default=0.0)
+                score = self.mmr_lambda * passage['relevance'] - (1 - self.mmr_lambda) * redundancy
+                if best_score is None or score > best_score:
+                    best, best_score = passage, score
+            if best is None:
+                break
+            selected.append(best)
+            used += best['tokens']
+            candidates.remove(best)
+
+        context_text = ''.join(p['text'] for p in selected)
+        return context_text, [{'source': p['source'], 'tokens': p['tokens'], 'relevance': p['relevance']} for p in selected]
+
+    def _split_passages(self, documents: list) -> List[Dict]:
+        passages = []
+        for d in documents:
+            text = getattr(d, 'page_content', str(d)) or ''
+            meta = getattr(d, 'metadata', {}) or {}
+            source = meta.get('source', meta.get('category', 'unknown'))
+            for chunk in self._chunk(text):
+                block = f"Source: {source}\n{chunk}\n\n"
+                passages.append({
+                    'text': block,
+                    'source': source,
+                    'terms': set(tokenize(chunk)),
+                    'tokens': estimate_tokens(block)
+                })
+        return passages
+
+    def _chunk(self, text: str) -> List[str]:
+        """Split on blank lines, merging short paragraphs and cutting long ones"""
+        chunks = []
+        current = ''
+        for para in text.split('\n\n'):
+            para = para.strip()
+            if not para:
+                continue
+            while len(para) > self.passage_chars:
+                if current:
+                    chunks.append(current)
+                    current = ''
+                chunks.append(para[:self.passage_chars])
+                para = para[self.passage_chars:]
+            if current and len(current) + len(para) + 2 > self.passage_chars:
+                chunks.append(current)
+                current = para
+            else:
+                current = f"{current}\n\n{para}" if current else para
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _relevance(self, query_terms: set, passage_terms: set) -> float:
+        if not query_terms or not passage_terms:
+            return 0.0
+        return len(query_terms & passage_terms) / len(query_terms)
+
+    def _similarity(self, a: set, b: set) -> float:
+        if not a or not b:
+            return 0.0
+        return len(a & b) / len(a | b)
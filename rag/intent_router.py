@@ -0,0 +1,118 @@
+import sys
+import os
+import threading
+from collections import OrderedDict
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, Optional
+from apis.building_codes_api import BuildingCodesAPI
+from utils.text_utils import tokenize
+from config.settings import get_settings
+
+class StructuredIntentRouter:
+    """Answer permit and inspection questions straight from BuildingCodesAPI.
+
+    Only questions that name exactly one work type together with a permit
+    or inspection intent are routed, and only for query types where a
+    permit answer is what the caller wants; everything else goes to the LLM.
+    """
+
+    WORK_TYPE_KEYWORDS = {
+        'roofing': {'roof', 'roofs', 'roofing', 'shingle', 'shingles'},
+        'electrical': {'electrical', 'electric', 'wiring', 'outlet', 'outlets'},
+        'plumbing': {'plumbing', 'pipe', 'pipes', 'drain', 'drains', 'sewer'},
+        'structural': {'structural', 'foundation', 'framing', 'beam', 'beams'}
+    }
+    # Multi-word terms for words that are ambiguous alone ("panel" may be
+    # solar, wall or siding)
+    WORK_TYPE_PHRASES = {
+        'electrical': {'breaker panel', 'service panel', 'panel upgrade', 'fuse box'}
+    }
+    PERMIT_KEYWORDS = {'permit', 'permits', 'permitting'}
+    INSPECTION_KEYWORDS = {'inspection', 'inspections', 'inspector'}
+    # Callers asking for e.g. a cost estimate want the LLM's answer even if
+    # the question mentions a permit
+    ROUTABLE_QUERY_TYPES = {'general', 'regulatory'}
+
+    def __init__(self, building_codes_api: BuildingCodesAPI = None, permit_cache_size: int = 256):
+        self.building_codes_api = building_codes_api or BuildingCodesAPI(get_settings().api_keys['building_codes'])
+        # (work_type, location) -> permit requirements, so repeats skip the API.
+        # Locations come from users, so the cache is bounded (LRU)
+        self.permit_cache_size = permit_cache_size
+        self._permit_cache: OrderedDict = OrderedDict()
+        self._permit_cache_lock = threading.Lock()
+
+    def detect(self, question: str) -> Optional[Dict]:
+        """Return {'work_type', 'permit', 'inspection'} or None if not routable"""
+        words = tokenize(question)
+        tokens = set(words)
+        text = ' '.join(words)
+        work_types = [wt for wt, keywords in self.WORK_TYPE_KEYWORDS.items()
+                      if tokens & keywords or any(phrase in text for phrase in self.WORK_TYPE_PHRASES.get(wt, ()))]
+        if len(work_types) != 1:
+            return None
+        wants_permit = bool(tokens & self.PERMIT_KEYWORDS)
+        wants_inspection = bool(tokens & self.INSPECTION_KEYWORDS)
+        if not (wants_permit or wants_inspection):
+            return None
+        return {'work_type': work_types[0], 'permit': wants_permit, 'inspection': wants_inspection}
+
+    def route(self, question: str, location: str = '', query_type: Optional[str] = None) -> Optional[Dict]:
+        """Return {'answer', 'intent', 'data'} when the question can be answered without the LLM"""
+        if query_type is not None and query_type not in self.ROUTABLE_QUERY_TYPES:
+            return None
+        intent = self.detect(question)
+        if intent is None:
+            return None
+        work_type = intent['work_type']
+        data = {}
+        lines = []
+
+        if intent['permit']:
+            requirements = self._permit_requirements(work_type, location)
+            if not requirements:
+                # No real data for this work type (or the API failed); a
+                # generic default would be a confident wrong answer
+                return None
+            data['permit_requirements'] = requirements
+            lines.append(self._format_permit(work_type, requirements))
+
+        if intent['inspection']:
+            inspections = self.building_codes_api.get_inspection_requirements(work_type)
+            if not inspections:
+                # Nothing structured to say; let the LLM handle it
+                return None
+            data['inspections'] = inspections
+            lines.append(f"Required inspections for {work_type} work:")
+            lines.extend(f"- {i['description']} ({i['stage'].replace('_', ' ')})" for i in inspections)
+
+        return {'answer': '\n'.join(lines), 'intent': intent, 'data': data}
+
+    def _permit_requirements(self, work_type: str, location: str) -> Optional[Dict]:
+        key = (work_type, (location or '').strip().lower())
+        with self._permit_cache_lock:
+            if key in self._permit_cache:
+                self._permit_cache.move_to_end(key)
+                return self._permit_cache[key]
+        requirements = self.building_codes_api.lookup_permit_requirements(work_type, location)
+        if requirements is None:
+            # Failures are not cached so the next question retries the API
+            return None
+        with self._permit_cache_lock:
+            self._permit_cache[key] = requirements
+            self._permit_cache.move_to_end(key)
+            while len(self._permit_cache) > self.permit_cache_size:
+                self._permit_cache.popitem(last=False)
+        return requirements
+
+    def _format_permit(self, work_type: str, requirements: Dict) -> str:
+        required = 'Yes' if requirements.get('permit_required') else 'No'
+        lines = [f"Permit required for {work_type} work: {required}"]
+        if requirements.get('estimated_cost'):
+            lines.append(f"- Estimated permit cost: ${requirements['estimated_cost']}")
+        if requirements.get('processing_time') and requirements['processing_time'] != 'N/A':
+            lines.append(f"- Processing time: {requirements['processing_time']}")
+        documents = requirements.get('required_documents') or []
+        if documents:
+            lines.append(f"- Required documents: {', '.join(d.replace('_', ' ') for d in documents)}")
+        return '\n'.join(lines) + '\n'
@@ -1,8 +1,13 @@
 import os
+import sys
 import json
 import pandas as pd
 from typing import List, Dict
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.compressed_io import read_text, strip_compression_suffix
+
 class Document:
     """Simple document class to replace LangChain dependency"""
     def __init__(self, page_content: str, metadata: dict = None):
@@ -10,14 +15,16 @@ class Document:
         self.metadata = metadata or {}
 
 class SimpleLoader:
-    """Simple file loader to replace LangChain loaders"""
+    """Simple file loader to replace LangChain loaders.
+
+    Files ending in .gz, .xz or .zst are decompressed transparently.
+    """
     def __init__(self, file_path: str):
         self.file_path = file_path
     
     def load(self) -> List[Document]:
         try:
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
+            content = read_text(self.file_path)
             return [Document(page_content=content, metadata={'source': self.file_path})]
         except Exception as e:
             print(f"Error loading {self.file_path}: {e}")
@@ -46,7 +53,7 @@ class KnowledgeBase:
         documents = []
         if os.path.exists(directory):
             for filename in os.listdir(directory):
-                if any(filename.endswith(ext) for ext in extensions):
+                if any(strip_compression_suffix(filename).endswith(ext) for ext in extensions):
                     file_path = os.path.join(directory, filename)
                     loader = SimpleLoader(file_path)
                     documents.extend(loader.load())
@@ -0,0 +1,79 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, List, Tuple
+from utils.text_utils import tokenize
+
+class QueryBuilder:
+    """Turn a question plus CV/user context into weighted terms and filters.
+
+    The output size is bounded by `max_question_terms` and
+    `max_context_terms`, no matter how large the inspection report is.
+    """
+
+    QUESTION_WEIGHT = 2.0
+    COMPONENT_WEIGHT = 1.0
+    FILTER_KEYS = ('location', 'user_type', 'property_type')
+
+    def __init__(self, max_question_terms: int = 12, max_context_terms: int = 6):
+        self.max_question_terms = max_question_terms
+        self.max_context_terms = max_context_terms
+
+    def build(self, question: str, cv_context: dict = None, user_context: dict = None) -> Dict:
+        """Return {'question', 'terms': [(term, weight)], 'filters': {...}}"""
+        cv_context = cv_context or {}
+        user_context = user_context or {}
+
+        weights = {}
+        for term in tokenize(question)[:self.max_question_terms]:
+            weights[term] = max(weights.get(term, 0.0), self.QUESTION_WEIGHT)
+
+        context_terms = self._component_terms(cv_context)
+        for term, weight in context_terms[:self.max_context_terms]:
+            weights[term] = max(weights.get(term, 0.0), weight)
+
+        filters = {}
+        for key in self.FILTER_KEYS:
+            value = user_context.get(key)
+            if isinstance(value, (str, int, float)) and str(value).strip():
+                filters[key] = str(value).strip()[:64]
+
+        terms = sorted(weights.items(), key=lambda tw: -tw[1])
+        return {'question': question, 'terms': terms, 'filters': filters}
+
+    def format(self, spec: Dict) -> str:
+        """Compact single-line rendering used as the enhanced query string"""
+        question_terms = set(tokenize(spec['question']))
+        focus = [t for t, _ in spec['terms'] if t not in question_terms]
+        parts = [spec['question']]
+        if focus:
+            parts.append(f"focus: {' '.join(focus)}")
+        for key, value in spec['filters'].items():
+            parts.append(f"{key}: {value}")
+        return ' | '.join(parts)
+
+    def _component_terms(self, cv_context: dict) -> List[Tuple[str, float]]:
+        """Component names, boosted by how poor their condition score is"""
+        components = cv_context.get('components', [])
+        if isinstance(components, dict):
+            names = list(components.keys())
+        elif isinstance(components, (list, tuple, set)):
+            names = [c for c in components if isinstance(c, str)]
+        else:
+            names = []
+
+        scores = cv_context.get('condition_scores', {})
+        if not isinstance(scores, dict):
+            scores = {}
+
+        weighted = {}
+        for name in names:
+            for term in tokenize(name.replace('_', ' '))[:2]:
+                weight = self.COMPONENT_WEIGHT
+                score = scores.get(name)
+                # Scores are on a 0-10 scale where 10 is best; worse parts matter more
+                if isinstance(score, (int, float)) and 0 <= score <= 10:
+                    weight += (10 - score) / 10
+                weighted[term] = max(weighted.get(term, 0.0), weight)
+        return sorted(weighted.items(), key=lambda tw: -tw[1])
@@ -1,5 +1,8 @@
 import sys
 import os
+import re
+import json
+import asyncio
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 class PromptTemplate:
@@ -12,13 +15,36 @@ class PromptTemplate:
         return self.template.format(**kwargs)
 from vector_store import PropertyVectorStore
 from utils.openrouter_llm import OpenRouterLLM
-from typing import List, Dict
+from utils.async_openrouter_llm import AsyncOpenRouterLLM
+from rag.context_packer import ContextPacker
+from rag.query_builder import QueryBuilder
+from rag.reranker import LexicalReranker
+from rag.tracing import MetricsSink, NullMetricsSink, StageTimer
+from rag.intent_router import StructuredIntentRouter
+from utils.llm_usage import caller_scope, track_caller
+from typing import Iterator, List, Dict, Optional
 
 class PropertyQueryEngine:
-    def __init__(self, vector_store: PropertyVectorStore):
+    def __init__(self, vector_store: PropertyVectorStore, context_budgets: Dict[str, int] = None, metrics_sink: MetricsSink = None):
         self.vector_store = vector_store
+        # Per-stage query timings are exported here as well as returned in results
+        self.metrics_sink = metrics_sink or NullMetricsSink()
+        # Keeps retrieved context within a per-query_type token budget
+        self.context_packer = ContextPacker(budgets=context_budgets)
+        # Compact weighted terms/filters instead of dumping CV dicts into the query
+        self.query_builder = QueryBuilder()
+        # Candidates are over-fetched, then re-ranked and cut off locally
+        self.reranker = LexicalReranker()
+        self.candidate_multiplier = 4
+        # Permit/inspection questions are answered from structured data, no LLM
+        self.intent_router = StructuredIntentRouter()
+        # Completion budget per question in a batched prompt; the batch's
+        # max_tokens grows with its size so the JSON reply is not cut off
+        self.batch_answer_tokens = 300
         # Use OpenRouter with free Deepseek model
         self.llm = OpenRouterLLM(model="deepseek/deepseek-chat")
+        # asyncio client sharing the same config and cache, used by aquery_with_context
+        self.async_llm = AsyncOpenRouterLLM(self.llm)
         print(f"Initialized with OpenRouter LLM: {self.llm.model}")
         self.prompts = {
             'cost_estimation': PromptTemplate(
@@ -35,36 +61,277 @@ class PropertyQueryEngine:
             )
         }
 
+    @track_caller('query_engine', prompt_arg='query_type')
     def query_with_context(self, question: str, query_type: str = 'general', user_context: dict = None, cv_context: dict = None, top_k: int = 5) -> dict:
         """Run a retrieval-augmented query and return an LLM answer plus sources."""
+        timer = self._start_timer(query_type)
+        routed = self._route_structured(question, user_context, timer, query_type)
+        if routed is not None:
+            return routed
+        # build a compact structured query and select categories
+        with timer.span('enhance_query'):
+            query_spec, enhanced, categories = self._plan_query(question, query_type, user_context, cv_context)
+        # retrieve
+        retrieved_docs = self._retrieve(enhanced, categories, top_k, query_spec, timer)
+        with timer.span('prompt_format'):
+            prompt_text = self._build_prompt(question, query_type, retrieved_docs)
+
+        # Call OpenRouter LLM
+        info = {}
+        with timer.span('llm_invoke'):
+            try:
+                llm_result = self.llm.invoke(prompt_text, info=info)
+            except Exception as e:
+                llm_result = f"LLM invocation failed: {e}"
+
+        return self._build_result(question, enhanced, llm_result, retrieved_docs, timer, info.get('finish_reason'))
+
+    @track_caller('query_engine', prompt_arg='query_type')
+    def query_batch(self, questions: List[str], query_type: str = 'general', user_context: dict = None, cv_context: dict = None, top_k: int = 5, batch_size: int = 5) -> List[dict]:
+        """Answer several questions with one LLM call per batch.
+
+        The questions share one prompt and the model is asked for a JSON
+        object keyed by question number. Any item that cannot be parsed back
+        out falls back to its own query_with_context call, and questions the
+        intent router recognizes skip the LLM entirely. Results come back in
+        the same order and shape as query_with_context.
+        """
+        results = [None] * len(questions)
+        pending = []
+        for i, question in enumerate(questions):
+            routed = self._route_structured(question, user_context, self._start_timer(query_type), query_type)
+            if routed is not None:
+                results[i] = routed
+            else:
+                pending.append(i)
+        for start in range(0, len(pending), batch_size):
+            chunk = pending[start:start + batch_size]
+            answers = self._query_batch_chunk([questions[i] for i in chunk], query_type, user_context, cv_context, top_k)
+            for i, result in zip(chunk, answers):
+                results[i] = result
+        return results
+
+    def _query_batch_chunk(self, questions: List[str], query_type: str, user_context: dict, cv_context: dict, top_k: int) -> List[dict]:
+        if len(questions) <= 1:
+            return [self.query_with_context(q, query_type, user_context, cv_context, top_k) for q in questions]
+
+        planned = []
+        shared_docs = []
+        for question in questions:
+            query_spec, enhanced, categories = self._plan_query(question, query_type, user_context, cv_context)
+            docs = self._retrieve(enhanced, categories, top_k, query_spec)
+            planned.append((question, enhanced, docs))
+            for d in docs:
+                if not any(d is seen for seen in shared_docs):
+                    shared_docs.append(d)
+
+        numbered = '\n'.join(f"{i}. {q}" for i, q in enumerate(questions, 1))
+        batch_question = (
+            "Answer each numbered question separately. Reply only with a JSON object "
+            "mapping each question number to its answer, for example {\"1\": \"...\", \"2\": \"...\"}.\n\n"
+            f"{numbered}"
+        )
+        prompt_text = self._build_prompt(batch_question, query_type, shared_docs, relevance_text=' '.join(questions))
+
+        # JSON framing plus one answer's worth of tokens per question
+        max_tokens = 64 + self.batch_answer_tokens * len(questions)
+        try:
+            answers = self._parse_batch_answers(self.llm.invoke(prompt_text, max_tokens=max_tokens), len(questions))
+        except Exception as e:
+            print(f"Batched query failed, falling back to single calls: {e}")
+            answers = {}
+
+        results = []
+        for i, (question, enhanced, docs) in enumerate(planned, 1):
+            if i in answers:
+                result = self._build_result(question, enhanced, answers[i], docs)
+                result['batched'] = True
+            else:
+                result = self.query_with_context(question, query_type, user_context, cv_context, top_k)
+            results.append(result)
+        return results
+
+    def _parse_batch_answers(self, response: str, count: int) -> Dict[int, str]:
+        """Extract {question number: answer} from a batched LLM response.
+
+        A reply cut off mid-object still yields every answer that was
+        completed before the cut.
+        """
+        answers = {}
+        data = None
+        match = re.search(r'\{.*\}', response or '', re.DOTALL)
+        if match:
+            try:
+                data = json.loads(match.group(0))
+            except ValueError:
+                data = None
+        if isinstance(data, dict):
+            for key, value in data.items():
+                if str(key).strip().isdigit() and value:
+                    answers[int(str(key).strip())] = value if isinstance(value, str) else json.dumps(value)
+        else:
+            # Truncated or malformed JSON: salvage complete "n": "answer" pairs
+            for key, raw in re.findall(r'"\s*(\d+)\s*"\s*:\s*"((?:[^"\\]|\\.)*)"', response or ''):
+                try:
+                    value = json.loads(f'"{raw}"')
+                except ValueError:
+                    continue
+                if value:
+                    answers[int(key)] = value
+        return {i: a for i, a in answers.items() if 1 <= i <= count}
+
+    def stream_query_with_context(self, question: str, query_type: str = 'general', user_context: dict = None, cv_context: dict = None, top_k: int = 5) -> Iterator[dict]:
+        """Streaming variant of query_with_context.
+
+        Yields a 'sources' event once retrieval is done, then one 'token'
+        event per answer chunk and finally a 'done' event with the full result
+        (including 'finish_reason' and 'truncated', as query_with_context).
+        """
+        timer = self._start_timer(query_type)
+        routed = self._route_structured(question, user_context, timer, query_type)
+        if routed is not None:
+            yield {'type': 'sources', 'retrieved': []}
+            yield {'type': 'token', 'text': routed['answer']}
+            yield {'type': 'done', 'result': routed}
+            return
+        with timer.span('enhance_query'):
+            query_spec, enhanced, categories = self._plan_query(question, query_type, user_context, cv_context)
+        retrieved_docs = self._retrieve(enhanced, categories, top_k, query_spec, timer)
+        with timer.span('prompt_format'):
+            prompt_text = self._build_prompt(question, query_type, retrieved_docs)
+        yield {'type': 'sources', 'retrieved': self._build_result(question, enhanced, '', retrieved_docs)['retrieved']}
+
+        parts = []
+        info = {}
+        with caller_scope('query_engine', query_type):
+            try:
+                if hasattr(self.llm, 'stream'):
+                    chunks = self.llm.stream(prompt_text, info=info)
+                else:
+                    chunks = iter([self.llm.invoke(prompt_text, info=info)])
+                for chunk in chunks:
+                    if not parts:
+                        timer.mark('first_token')
+                    parts.append(chunk)
+                    yield {'type': 'token', 'text': chunk}
+            except Exception as e:
+                error_text = f"LLM invocation failed: {e}"
+                parts.append(error_text)
+                yield {'type': 'token', 'text': error_text}
+
+        yield {'type': 'done', 'result': self._build_result(question, enhanced, ''.join(parts), retrieved_docs, timer, info.get('finish_reason'))}
+
+    async def aclose(self):
+        """Close the async client's HTTP session; call before the event loop
+        that ran aquery_with_context finishes (e.g. at the end of asyncio.run)"""
+        if self.async_llm is not None:
+            await self.async_llm.aclose()
+
+    @track_caller('query_engine', prompt_arg='query_type')
+    async def aquery_with_context(self, question: str, query_type: str = 'general', user_context: dict = None, cv_context: dict = None, top_k: int = 5) -> dict:
+        """Async variant of query_with_context that never blocks the event loop.
+
+        Retrieval runs in a worker thread and the LLM call is awaited, so many
+        queries can be in flight at once from a single process.
+        """
+        timer = self._start_timer(query_type)
+        routed = self._route_structured(question, user_context, timer, query_type)
+        if routed is not None:
+            return routed
+        with timer.span('enhance_query'):
+            query_spec, enhanced, categories = self._plan_query(question, query_type, user_context, cv_context)
+        retrieved_docs = await asyncio.to_thread(self._retrieve, enhanced, categories, top_k, query_spec, timer)
+        with timer.span('prompt_format'):
+            prompt_text = self._build_prompt(question, query_type, retrieved_docs)
+
+        info = {}
+        with timer.span('llm_invoke'):
+            try:
+                llm_result = await self._ainvoke_llm(prompt_text, info)
+            except Exception as e:
+                llm_result = f"LLM invocation failed: {e}"
+
+        return self._build_result(question, enhanced, llm_result, retrieved_docs, timer, info.get('finish_reason'))
+
+    async def _ainvoke_llm(self, prompt_text: str, info: dict = None) -> str:
+        """Await the LLM, using its native async API when it has one"""
+        ainvoke = getattr(self.llm, 'ainvoke', None)
+        if ainvoke is not None and asyncio.iscoroutinefunction(ainvoke):
+            return await ainvoke(prompt_text, info=info)
+        if self.async_llm is not None and self.async_llm.llm is self.llm:
+            return await self.async_llm.ainvoke(prompt_text, info=info)
+        return await asyncio.to_thread(self.llm.invoke, prompt_text, info=info)
+
+    def _plan_query(self, question: str, query_type: str, user_context: dict, cv_context: dict):
+        """Return (query_spec, enhanced query string, categories)"""
         user_context = user_context or {}
         cv_context = cv_context or {}
-        # enhance query
-        enhanced = self._enhance_query(question, cv_context, user_context)
-        # select categories and retrieve
+        query_spec = self.query_builder.build(question, cv_context, user_context)
+        enhanced = self.query_builder.format(query_spec)
         categories = self._select_categories(query_type, cv_context)
+        return query_spec, enhanced, categories
+
+    def _retrieve(self, enhanced: str, categories: list, top_k: int, query_spec: dict = None, timer: StageTimer = None) -> list:
+        """Fetch candidates for the query, then keep the top_k that clear the re-rank cutoff"""
+        timer = timer or StageTimer()
+        with timer.span('retrieval'):
+            candidates = self._fetch_candidates(enhanced, categories, top_k * self.candidate_multiplier, query_spec)
+        if not query_spec or not isinstance(candidates, list):
+            return candidates
+        with timer.span('rerank'):
+            return [d for d, _ in self.reranker.rerank(query_spec['terms'], candidates, top_n=top_k)]
+
+    def _route_structured(self, question: str, user_context: dict, timer: StageTimer, query_type: str = None) -> Optional[dict]:
+        """Answer from structured sources when the intent router recognizes the question"""
+        if self.intent_router is None:
+            return None
+        with timer.span('intent_route'):
+            try:
+                routed = self.intent_router.route(question, (user_context or {}).get('location', ''), query_type)
+            except Exception as e:
+                print(f"Intent routing failed: {e}")
+                routed = None
+        if routed is None:
+            return None
+        result = self._build_result(question, question, routed['answer'], [], timer)
+        result['route'] = 'structured'
+        result['structured_data'] = routed['data']
+        return result
+
+    def _start_timer(self, query_type: str) -> StageTimer:
+        return StageTimer(self.metrics_sink, tags={'query_type': query_type})
+
+    def _fetch_candidates(self, enhanced: str, categories: list, limit: int, query_spec: dict = None) -> list:
+        """First-stage retrieval from the vector store"""
+        # Prefer weighted-term search when the store supports it
+        if query_spec and hasattr(self.vector_store, 'search_terms'):
+            try:
+                docs = self.vector_store.search_terms(query_spec['terms'], filters=query_spec['filters'], k=limit)
+                if isinstance(docs, list) and docs:
+                    return docs
+            except Exception:
+                pass
         retriever = None
         try:
-            retriever = self.vector_store.as_retriever()
+            retriever = self.vector_store.as_retriever(search_kwargs={"k": limit})
         except Exception:
             retriever = None
         retrieved_docs = []
         if retriever:
             try:
-                retrieved_docs = retriever(enhanced, top_k=top_k)
+                retrieved_docs = retriever(enhanced, top_k=limit)
             except Exception:
                 # fallback to direct query
                 retrieved_docs = self.vector_store.query(enhanced, categories=categories) if hasattr(self.vector_store, 'query') else []
         else:
             if hasattr(self.vector_store, 'query'):
                 retrieved_docs = self.vector_store.query(enhanced, categories=categories)
+        return retrieved_docs
 
-        # Build context text
-        context_text = ''
-        for d in retrieved_docs:
-            text = getattr(d, 'page_content', str(d))
-            meta = getattr(d, 'metadata', {})
-            context_text += f"Source: {meta.get('source', meta.get('category','unknown'))}\n{text}\n\n"
+    def _build_prompt(self, question: str, query_type: str, retrieved_docs: list, relevance_text: str = None) -> str:
+        """Format the prompt template for query_type with the retrieved context"""
+        # Build context text from the most relevant, non-redundant passages
+        context_text, _ = self.context_packer.pack(relevance_text or question, retrieved_docs, query_type)
 
         # Select prompt template
         prompt = self.prompts.get(query_type, self.prompts.get('general'))
@@ -72,33 +339,27 @@ class PropertyQueryEngine:
             prompt_text = prompt.format(context=context_text, question=question)
         except Exception:
             prompt_text = f"Context:\n{context_text}\nQuestion: {question}"
+        return prompt_text
 
-        # Call OpenRouter LLM
-        try:
-            llm_result = self.llm.invoke(prompt_text)
-        except Exception as e:
-            llm_result = f"LLM invocation failed: {e}"
-
-        return {
+    def _build_result(self, question: str, enhanced: str, llm_result: str, retrieved_docs: list, timer: StageTimer = None, finish_reason: str = None) -> dict:
+        result = {
             'question': question,
             'enhanced_query': enhanced,
             'answer': llm_result,
             'source_documents': retrieved_docs,
-            'retrieved': [{'content': getattr(d,'page_content',None),'metadata': getattr(d,'metadata',{})} for d in retrieved_docs]
+            'retrieved': [{'content': getattr(d,'page_content',None),'metadata': getattr(d,'metadata',{})} for d in retrieved_docs],
+            # 'length' means the answer was cut short by max_tokens
+            'finish_reason': finish_reason,
+            'truncated': finish_reason == 'length'
         }
+        if timer is not None:
+            # Milliseconds per stage, plus 'total'
+            result['timings'] = timer.finish()
+        return result
 
     def _enhance_query(self, question: str, cv_context: dict, user_context: dict) -> str:
-        enhanced = question
-
-        if cv_context:
-            enhanced += f" Property features: {cv_context.get('components', [])}. "
-            enhanced += f" Condition scores: {cv_context.get('condition_scores', {})}. "
-
-        if user_context:
-            enhanced += f" User type: {user_context.get('user_type', 'general')}. "
-            enhanced += f" Location: {user_context.get('location', 'unknown')}. "
-
-        return enhanced
+        """Compact query string: question plus a bounded set of context terms"""
+        return self.query_builder.format(self.query_builder.build(question, cv_context, user_context))
 
     def _select_categories(self, query_type: str, cv_context: dict) -> list:
         categories = ['general']
@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from typing import Dict, List, Tuple
+from utils.text_utils import tokenize
+
+class LexicalReranker:
+    """Second-stage CPU re-ranker over retrieved candidates.
+
+    Scores each candidate with saturated, field-weighted term frequency
+    plus a bonus for query terms that appear close together, then keeps
+    the best `top_n` whose normalized score clears `min_score`.
+    """
+
+    DEFAULT_FIELD_WEIGHTS = {
+        'content': 1.0,
+        'source': 0.3,
+        'category': 0.3
+    }
+
+    def __init__(self, field_weights: Dict[str, float] = None, min_score: float = 0.15, k1: float = 1.2,
+                 proximity_weight: float = 0.5, proximity_window: int = 8):
+        self.field_weights = dict(self.DEFAULT_FIELD_WEIGHTS)
+        if field_weights:
+            self.field_weights.update(field_weights)
+        self.min_score = min_score
+        self.k1 = k1
+        self.proximity_weight = proximity_weight
+        self.proximity_window = proximity_window
+
+    def rerank(self, terms: List[Tuple[str, float]], documents: list, top_n: int = 5) -> List[Tuple[object, float]]:
+        """Return [(document, score)] sorted by score, cut off at min_score"""
+        weights = {t: w for t, w in terms if w > 0}
+        if not weights or not documents:
+            return []
+        scored = [(d, self.score(weights, d)) for d in documents]
+        scored.sort(key=lambda ds: -ds[1])
+        return [(d, s) for d, s in scored[:top_n] if s >= self.min_score]
+
+    def score(self, weights: Dict[str, float], document) -> float:
+        total_weight = sum(weights.values())
+        content_tokens = tokenize(getattr(document, 'page_content', str(document)) or '')
+
+        counts = {}
+        positions = []
+        for pos, token in enumerate(content_tokens):
+            if token in weights:
+                counts[token] = counts.get(token, 0) + 1
+                positions.append((pos, token))
+
+        score = 0.0
+        for term, tf in counts.items():
+            score += self.field_weights['content'] * weights[term] * tf / (tf + self.k1)
+
+        meta = getattr(document, 'metadata', {}) or {}
+        for field in ('source', 'category'):
+            value = meta.get(field)
+            if not value:
+                continue
+            field_terms = set(tokenize(' '.join(value) if isinstance(value, list) else str(value)))
+            score += self.field_weights[field] * sum(w for t, w in weights.items() if t in field_terms)
+
+        score += self.proximity_weight * self._proximity(positions, weights)
+        return score / total_weight
+
+    def _proximity(self, positions: List[Tuple[int, str]], weights: Dict[str, float]) -> float:
+        """Weight of the best pair of distinct query terms within the window, decayed by distance"""
+        best = 0.0
+        last_seen = {}
+        for pos, term in positions:
+            for other, other_pos in last_seen.items():
+                gap = pos - other_pos
+                if other != term and gap <= self.proximity_window:
+                    best = max(best, min(weights[term], weights[other]) / gap)
+            last_seen[term] = pos
+        return best
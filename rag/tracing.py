@@ -0,0 +1,82 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+class MetricsSink:
+    """Destination for stage timings. Subclass and override record()."""
+
+    def record(self, name: str, duration_ms: float, tags: Optional[Dict] = None):
+        pass
+
+class NullMetricsSink(MetricsSink):
+    """Discards all timings (default)"""
+    pass
+
+class PrintMetricsSink(MetricsSink):
+    """Prints one line per timing, useful during development"""
+
+    def record(self, name: str, duration_ms: float, tags: Optional[Dict] = None):
+        print(f"[timing] {name}={duration_ms:.1f}ms {tags or {}}")
+
+class InMemoryMetricsSink(MetricsSink):
+    """Keeps recent samples per metric so percentiles can be inspected"""
+
+    def __init__(self, max_samples: int = 10000):
+        self.max_samples = max_samples
+        self.samples: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, name: str, duration_ms: float, tags: Optional[Dict] = None):
+        with self._lock:
+            values = self.samples.setdefault(name, [])
+            values.append(duration_ms)
+            if len(values) > self.max_samples:
+                del values[:len(values) - self.max_samples]
+
+    def percentile(self, name: str, pct: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self.samples.get(name, []))
+        if not values:
+            return None
+        index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+        return values[index]
+
+class StageTimer:
+    """Collects named timing spans for one request and forwards them to a sink"""
+
+    def __init__(self, sink: MetricsSink = None, prefix: str = 'query_engine', tags: Optional[Dict] = None):
+        self.sink = sink or NullMetricsSink()
+        self.prefix = prefix
+        self.tags = tags or {}
+        self.timings: Dict[str, float] = {}
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, (time.perf_counter() - start) * 1000)
+
+    def add(self, name: str, duration_ms: float):
+        self.timings[name] = self.timings.get(name, 0.0) + duration_ms
+        self._emit(name, duration_ms)
+
+    def mark(self, name: str):
+        """Record time elapsed since the timer was created (e.g. time to first token)"""
+        self.add(name, (time.perf_counter() - self._start) * 1000)
+
+    def finish(self) -> Dict[str, float]:
+        """Record the total and return all timings in milliseconds"""
+        total = (time.perf_counter() - self._start) * 1000
+        self.timings['total'] = total
+        self._emit('total', total)
+        return {name: round(ms, 3) for name, ms in self.timings.items()}
+
+    def _emit(self, name: str, duration_ms: float):
+        try:
+            self.sink.record(f"{self.prefix}.{name}", duration_ms, self.tags)
+        except Exception as e:
+            print(f"Metrics sink error: {e}")
@@ -1,6 +1,11 @@
 import os
-import json
-from typing import List, Dict
+import sys
+from typing import List, Dict, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.compressed_io import dump_json, load_json, find_existing, with_compression_suffix, candidate_paths
+from utils.text_utils import tokenize
 
 class Document:
     """Simple document class"""
@@ -26,6 +31,8 @@ class PropertyVectorStore:
         self.vector_store = None
         self.documents: List[Document] = []
         self.text_splitter = SimpleTextSplitter()
+        # term -> indexes into self.documents, built lazily for search_terms
+        self._term_index: Optional[Dict[str, set]] = None
 
     def add_documents(self, documents: List[Document], categories: List[str] = None):
         """Add documents to the vector store"""
@@ -35,6 +42,7 @@ class PropertyVectorStore:
             if categories:
                 doc.metadata['category'] = categories[0] if len(categories)==1 else categories
             self.documents.append(doc)
+        self._term_index = None
         # Simple document storage without embeddings
         if self.vector_store is None:
             self.vector_store = {'docs': list(documents)}
@@ -61,21 +69,58 @@ class PropertyVectorStore:
                 matches.append(doc)
         return matches
 
-    def save(self, path: str):
-        """Save the vector store to disk"""
+    def search_terms(self, terms: List[Tuple[str, float]], filters: Dict = None, k: int = 5) -> List[Document]:
+        """Rank documents by the summed weight of the query terms they contain.
+
+        Only documents sharing at least one term are scored, via an inverted
+        index. Filters apply to documents whose metadata has the filter key.
+        """
+        if not terms:
+            return []
+        index = self._get_term_index()
+        filters = filters or {}
+        scores = {}
+        for term, weight in terms:
+            for i in index.get(term, ()):
+                scores[i] = scores.get(i, 0.0) + weight
+        ranked = []
+        for i, score in sorted(scores.items(), key=lambda item: -item[1]):
+            meta = self.documents[i].metadata
+            if any(key in meta and str(meta[key]).lower() != str(value).lower() for key, value in filters.items()):
+                continue
+            ranked.append(self.documents[i])
+            if len(ranked) >= k:
+                break
+        return ranked
+
+    def _get_term_index(self) -> Dict[str, set]:
+        if self._term_index is None:
+            index = {}
+            for i, doc in enumerate(self.documents):
+                for term in set(tokenize(doc.page_content or "")):
+                    index.setdefault(term, set()).add(i)
+            self._term_index = index
+        return self._term_index
+
+    def save(self, path: str, compression: Optional[str] = None):
+        """Save the vector store to disk, optionally as docs.json.gz/.xz/.zst"""
         os.makedirs(path, exist_ok=True)
-        with open(os.path.join(path, 'docs.json'), 'w') as f:
-            docs_data = [{'content': doc.page_content, 'metadata': doc.metadata} for doc in self.documents]
-            json.dump(docs_data, f)
+        docs_file = with_compression_suffix(os.path.join(path, 'docs.json'), compression)
+        docs_data = [{'content': doc.page_content, 'metadata': doc.metadata} for doc in self.documents]
+        dump_json(docs_data, docs_file, indent=None)
+        # Drop stale variants so load() cannot pick up an older copy
+        for candidate in candidate_paths(docs_file):
+            if candidate != docs_file and os.path.exists(candidate):
+                os.remove(candidate)
 
     def load(self, path: str):
-        """Load the vector store from disk"""
-        docs_file = os.path.join(path, 'docs.json')
-        if os.path.exists(docs_file):
-            with open(docs_file, 'r') as f:
-                docs_data = json.load(f)
+        """Load the vector store from disk (plain or compressed docs.json)"""
+        docs_file = find_existing(os.path.join(path, 'docs.json'))
+        if docs_file:
+            docs_data = load_json(docs_file)
             self.documents = [Document(d['content'], d['metadata']) for d in docs_data]
             self.vector_store = {'docs': self.documents}
+            self._term_index = None
 
     def get_stats(self) -> Dict:
         """Get statistics about the vector store"""
@@ -1,5 +1,6 @@
 import os
 import sys
+import asyncio
 from datetime import datetime
 from typing import Dict, List
 
@@ -7,12 +8,25 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from rag.query_engine import PropertyQueryEngine
 from agents.orchestrator import PropertyOrchestrator
+from utils.llm_usage import caller_scope, track_caller
 
 class FinalReportGenerator:
+    # LLM-backed section questions, keyed by report section
+    SECTION_QUERIES = {
+        'executive_summary': ("Provide an executive summary for a property analysis report", "general"),
+        'condition': ("Assess overall property condition including roof, foundation, and exterior", "general"),
+        'market': ("Provide market analysis for property at {address}", "general"),
+        'insurance': ("Assess property insurance risks and coverage recommendations", "general"),
+        'cost': ("Provide cost estimates for common property maintenance and repairs", "cost_estimation"),
+        'regulatory': ("Outline building code compliance and permit requirements for property maintenance", "regulatory")
+    }
+
     def __init__(self, query_engine: PropertyQueryEngine, orchestrator: PropertyOrchestrator):
         self.query_engine = query_engine
         self.orchestrator = orchestrator
+        self._prefetched = {}
         
+    @track_caller('report_generator')
     def generate_comprehensive_report(self, property_data: Dict = None) -> str:
         """Generate a comprehensive property analysis report in markdown format"""
         
@@ -24,6 +38,9 @@ class FinalReportGenerator:
                 'images_analyzed': 0
             }
         
+        # Issue all section questions concurrently before assembling the report
+        self._prefetch_section_answers(property_data)
+        
         report_sections = []
         
         # Header
@@ -56,8 +73,56 @@ class FinalReportGenerator:
         # Conclusion
         report_sections.append(self._generate_conclusion())
         
+        self._prefetched = {}
         return '\n\n'.join(report_sections)
     
+    def _prefetch_section_answers(self, property_data: Dict):
+        """Run every section query at once through the async query path"""
+        self._prefetched = {}
+        if not hasattr(self.query_engine, 'aquery_with_context'):
+            return
+        try:
+            asyncio.get_running_loop()
+            # Already inside an event loop; sections fall back to sequential queries
+            return
+        except RuntimeError:
+            pass
+        
+        sections = list(self.SECTION_QUERIES)
+        
+        async def run_section(section):
+            with caller_scope('report_generator', section):
+                return await self.query_engine.aquery_with_context(self._section_question(section, property_data), self.SECTION_QUERIES[section][1])
+        
+        async def run_all():
+            try:
+                return await asyncio.gather(*(run_section(section) for section in sections), return_exceptions=True)
+            finally:
+                # The HTTP session belongs to this loop, which asyncio.run closes
+                aclose = getattr(self.query_engine, 'aclose', None)
+                if aclose is not None and asyncio.iscoroutinefunction(aclose):
+                    await aclose()
+        
+        try:
+            results = asyncio.run(run_all())
+        except Exception as e:
+            print(f"Concurrent section queries failed: {e}")
+            return
+        self._prefetched = {section: r for section, r in zip(sections, results) if isinstance(r, dict)}
+    
+    def _section_question(self, section: str, property_data: Dict = None) -> str:
+        question = self.SECTION_QUERIES[section][0]
+        if '{address}' in question:
+            question = question.format(address=(property_data or {}).get('address', 'this location'))
+        return question
+    
+    def _query_section(self, section: str, property_data: Dict = None) -> Dict:
+        """Prefetched answer for a section, or a direct query if there is none"""
+        if section in self._prefetched:
+            return self._prefetched[section]
+        with caller_scope('report_generator', section):
+            return self.query_engine.query_with_context(self._section_question(section, property_data), self.SECTION_QUERIES[section][1])
+    
     def _generate_header(self, property_data: Dict) -> str:
         return f"""# Comprehensive Property Analysis Report
 
@@ -70,8 +135,7 @@ class FinalReportGenerator:
     
     def _generate_executive_summary(self, property_data: Dict) -> str:
         try:
-            summary_query = "Provide an executive summary for a property analysis report"
-            result = self.query_engine.query_with_context(summary_query, "general")
+            result = self._query_section('executive_summary')
             summary_text = result.get('answer', 'Executive summary not available')
         except:
             summary_text = """This comprehensive property analysis provides a detailed assessment of the property's condition, 
@@ -106,8 +170,7 @@ market comparisons, and professional recommendations for maintenance and improve
     
     def _generate_condition_assessment(self) -> str:
         try:
-            condition_query = "Assess overall property condition including roof, foundation, and exterior"
-            result = self.query_engine.query_with_context(condition_query, "general")
+            result = self._query_section('condition')
             condition_text = result.get('answer', 'Condition assessment not available')
         except:
             condition_text = """The property shows good overall condition with normal wear patterns expected for its age. 
@@ -133,8 +196,7 @@ Major structural elements appear sound with no immediate safety concerns identif
     
     def _generate_market_analysis(self, property_data: Dict) -> str:
         try:
-            market_query = f"Provide market analysis for property at {property_data.get('address', 'this location')}"
-            result = self.query_engine.query_with_context(market_query, "general")
+            result = self._query_section('market', property_data)
             market_text = result.get('answer', 'Market analysis not available')
         except:
             market_text = """Based on current market conditions and comparable properties in the area, 
@@ -159,8 +221,7 @@ the property shows strong market positioning with steady appreciation potential.
     
     def _generate_insurance_assessment(self) -> str:
         try:
-            insurance_query = "Assess property insurance risks and coverage recommendations"
-            result = self.query_engine.query_with_context(insurance_query, "general")
+            result = self._query_section('insurance')
             insurance_text = result.get('answer', 'Insurance assessment not available')
         except:
             insurance_text = """The property presents low to moderate insurance risk with standard coverage 
@@ -215,8 +276,7 @@ recommendations. No high-risk features or conditions identified."""
     
     def _generate_cost_estimates(self) -> str:
         try:
-            cost_query = "Provide cost estimates for common property maintenance and repairs"
-            result = self.query_engine.query_with_context(cost_query, "cost_estimation")
+            result = self._query_section('cost')
             cost_text = result.get('answer', 'Cost estimates not available')
         except:
             cost_text = """Cost estimates are based on regional averages and may vary based on 
@@ -249,8 +309,7 @@ specific conditions, materials chosen, and contractor selection."""
     
     def _generate_regulatory_section(self) -> str:
         try:
-            regulatory_query = "Outline building code compliance and permit requirements for property maintenance"
-            result = self.query_engine.query_with_context(regulatory_query, "regulatory")
+            result = self._query_section('regulatory')
             regulatory_text = result.get('answer', 'Regulatory information not available')
         except:
             regulatory_text = """Property appears to meet current building code requirements. 
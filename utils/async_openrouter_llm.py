@@ -0,0 +1,239 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from typing import List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.openrouter_llm import OpenRouterLLM, RETRYABLE_STATUS, _finish_reasons, _spent_tokens
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+class AsyncOpenRouterLLM:
+    """asyncio client for OpenRouter that shares config, cache and mock
+    fallback with an OpenRouterLLM.
+
+    Uses aiohttp when installed; otherwise each request runs on a worker
+    thread through the sync client's pooled session.
+    """
+
+    def __init__(self, llm: Optional[OpenRouterLLM] = None, max_concurrency: int = 8, **llm_kwargs):
+        self.llm = llm or OpenRouterLLM(**llm_kwargs)
+        self.max_concurrency = max_concurrency
+        # One aiohttp session per event loop, created under that loop's lock
+        self._sessions = {}
+        self._session_locks = {}
+        self._sessions_guard = threading.Lock()
+
+    @property
+    def model(self) -> str:
+        return self.llm.model
+
+    async def ainvoke(self, prompt: str, **kwargs) -> str:
+        """Invoke the LLM without blocking the event loop; info={} receives
+        the finish_reason as in OpenRouterLLM.invoke"""
+        info = kwargs.get("info")
+        llm = self.llm
+        if llm.use_mock:
+            return llm._mock_response(prompt)
+
+        started = time.perf_counter()
+        params = llm._request_params(kwargs)
+        cache_key = None
+        if llm.cache is not None and kwargs.get("use_cache", True):
+            cache_key = llm.cache.make_key(llm.model, params, prompt)
+            cached = await asyncio.to_thread(llm._cache_get, cache_key)
+            if cached is not None:
+                llm._record_usage(llm.model, prompt, started, cache='hit')
+                return cached
+
+        served = {}
+        try:
+            if aiohttp is not None:
+                content = await self._apost_completion(prompt, params, served)
+            else:
+                content = await asyncio.to_thread(llm._post_completion, prompt, params, served=served)
+        except Exception as e:
+            print(f"OpenRouter API error: {e}")
+            return llm._mock_response(prompt)
+        if info is not None and served.get('finish_reason') is not None:
+            info['finish_reason'] = served['finish_reason']
+
+        if cache_key is not None:
+            # Keyed on the model that answered, as in OpenRouterLLM.invoke
+            answered = served.get('model', llm.model)
+            if answered != llm.model:
+                cache_key = llm.cache.make_key(answered, params, prompt)
+            try:
+                await asyncio.to_thread(llm.cache.set, cache_key, content, answered)
+            except Exception as e:
+                print(f"LLM cache write failed: {e}")
+        return content
+
+    async def invoke_many(self, prompts: List[str], max_concurrency: Optional[int] = None, **kwargs) -> List[str]:
+        """Run many prompts concurrently, at most max_concurrency at a time.
+
+        Results are returned in the same order as `prompts`.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_concurrency)
+
+        async def run(prompt):
+            async with semaphore:
+                return await self.ainvoke(prompt, **kwargs)
+
+        return list(await asyncio.gather(*(run(p) for p in prompts)))
+
+    def invoke_many_sync(self, prompts: List[str], max_concurrency: Optional[int] = None, **kwargs) -> List[str]:
+        """Blocking wrapper around invoke_many for non-async callers"""
+        async def run():
+            try:
+                return await self.invoke_many(prompts, max_concurrency, **kwargs)
+            finally:
+                await self.aclose()
+        return asyncio.run(run())
+
+    async def aclose(self):
+        """Close this loop's session (and any left by loops that have ended)"""
+        loop = asyncio.get_running_loop()
+        async with self._session_lock(loop):
+            with self._sessions_guard:
+                session = self._sessions.pop(loop, None)
+            if session is not None and not session.closed:
+                await session.close()
+            await self._close_stale_sessions()
+
+    async def _apost_completion(self, prompt: str, params: dict, served: Optional[dict] = None) -> str:
+        """Complete on the sync client's routed model, failing over like it does;
+        the model that answered is stored in served['model'] and its
+        finish_reason in served['finish_reason'].
+        One rate-limit reservation covers the call and is settled at the end."""
+        served = served if served is not None else {}
+        llm = self.llm
+        reserved = await asyncio.to_thread(llm._acquire_rate_limit, prompt, params)
+        spent = {'tokens': 0}
+        reasons = {}
+        token = _spent_tokens.set(spent)
+        reasons_token = _finish_reasons.set(reasons)
+        try:
+            content = await self._arouted_completion(prompt, params, served)
+            served['finish_reason'] = reasons.get(served.get('model'))
+            return content
+        finally:
+            _finish_reasons.reset(reasons_token)
+            _spent_tokens.reset(token)
+            await asyncio.to_thread(llm._settle_rate_limit, reserved, spent['tokens'])
+    
+    async def _arouted_completion(self, prompt: str, params: dict, served: dict) -> str:
+        router = self.llm.router
+        if router is None:
+            served['model'] = self.llm.model
+            return await self._apost_model_completion(self.llm.model, prompt, params)
+        
+        tried = []
+        last_error = None
+        while len(tried) <= self.llm.max_failover:
+            model = router.choose(exclude=tried, primary=self.llm.model)
+            if model is None:
+                break
+            tried.append(model)
+            start = time.perf_counter()
+            try:
+                content = await self._apost_model_completion(model, prompt, params)
+            except Exception as e:
+                print(f"Model {model} failed: {e}")
+                router.record_failure(model)
+                last_error = e
+                continue
+            router.record_success(model, time.perf_counter() - start)
+            served['model'] = model
+            return content
+        raise last_error or RuntimeError("No healthy model available")
+    
+    async def _apost_model_completion(self, model: str, prompt: str, params: dict) -> str:
+        """aiohttp POST with the same retry/backoff policy as the sync client"""
+        llm = self.llm
+        session = await self._get_session()
+        fitted, params = llm._fit_prompt(model, prompt, params)
+        headers = {
+            "Authorization": f"Bearer {llm.api_key}",
+            "Content-Type": "application/json"
+        }
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": fitted}],
+            **params
+        }
+        started = time.perf_counter()
+        try:
+            attempt = 0
+            while True:
+                try:
+                    async with session.post(llm.base_url, headers=headers, json=data) as response:
+                        delay = None
+                        if response.status in RETRYABLE_STATUS and attempt < llm.max_retries:
+                            delay = llm._retry_delay(attempt, response.headers.get("Retry-After"))
+                        if delay is None:
+                            response.raise_for_status()
+                            result = await response.json()
+                            content = result["choices"][0]["message"]["content"]
+                            llm._note_finish_reason(model, result["choices"][0].get("finish_reason"))
+                            llm._spend_tokens(fitted, content, result.get("usage"))
+                            llm._record_usage(model, fitted, started, content=content, usage=result.get("usage"))
+                            return content
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    if attempt >= llm.max_retries:
+                        raise
+                    delay = llm._retry_delay(attempt, None)
+                attempt += 1
+                await asyncio.sleep(delay)
+        except Exception:
+            llm._record_usage(model, fitted, started, error=True)
+            raise
+
+    async def _get_session(self):
+        """This event loop's aiohttp session, reused across requests.
+
+        Creation is serialized per loop so concurrent first requests share
+        one session. Sessions left by loops that have since closed (e.g. an
+        earlier asyncio.run whose caller did not aclose()) are closed here,
+        so their connectors and sockets are not leaked.
+        """
+        loop = asyncio.get_running_loop()
+        session = self._sessions.get(loop)
+        if session is not None and not session.closed:
+            return session
+        async with self._session_lock(loop):
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                await self._close_stale_sessions()
+                connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+                session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=self.llm.timeout))
+                with self._sessions_guard:
+                    self._sessions[loop] = session
+            return session
+
+    def _session_lock(self, loop) -> asyncio.Lock:
+        with self._sessions_guard:
+            lock = self._session_locks.get(loop)
+            if lock is None:
+                lock = self._session_locks[loop] = asyncio.Lock()
+            return lock
+
+    async def _close_stale_sessions(self):
+        with self._sessions_guard:
+            stale = [(loop, session) for loop, session in self._sessions.items() if loop.is_closed()]
+            for loop, _ in stale:
+                del self._sessions[loop]
+                self._session_locks.pop(loop, None)
+        for _, session in stale:
+            if session.closed:
+                continue
+            try:
+                await session.close()
+            except Exception as e:
+                print(f"Closing stale aiohttp session failed: {e}")
@@ -0,0 +1,106 @@
+import gzip
+import io
+import json
+import lzma
+import os
+from typing import Any, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# File suffix for each supported codec
+COMPRESSION_SUFFIXES = {
+    'gzip': '.gz',
+    'xz': '.xz',
+    'zstd': '.zst'
+}
+
+
+def compression_for_path(path: str) -> Optional[str]:
+    """Return the codec implied by a file name, or None for plain files"""
+    for codec, suffix in COMPRESSION_SUFFIXES.items():
+        if path.endswith(suffix):
+            return codec
+    return None
+
+
+def strip_compression_suffix(path: str) -> str:
+    """Remove a trailing compression suffix (docs.json.gz -> docs.json)"""
+    codec = compression_for_path(path)
+    if codec:
+        return path[:-len(COMPRESSION_SUFFIXES[codec])]
+    return path
+
+
+def with_compression_suffix(path: str, compression: Optional[str]) -> str:
+    """Append the suffix for `compression` to a plain path"""
+    if not compression:
+        return path
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(f"Unsupported compression: {compression}. Use one of {list(COMPRESSION_SUFFIXES)}")
+    return strip_compression_suffix(path) + COMPRESSION_SUFFIXES[compression]
+
+
+def candidate_paths(path: str) -> List[str]:
+    """Plain path followed by every compressed variant of it"""
+    base = strip_compression_suffix(path)
+    return [base] + [base + suffix for suffix in COMPRESSION_SUFFIXES.values()]
+
+
+def open_text(path: str, mode: str = 'r', encoding: str = 'utf-8'):
+    """Open a text file, transparently (de)compressing based on its suffix.
+
+    Decompression is streamed frame by frame, so large files are never
+    held in memory in their compressed and decompressed form at once.
+    """
+    if mode not in ('r', 'w'):
+        raise ValueError("mode must be 'r' or 'w'")
+    codec = compression_for_path(path)
+    if codec == 'gzip':
+        return gzip.open(path, mode + 't', encoding=encoding)
+    if codec == 'xz':
+        return lzma.open(path, mode + 't', encoding=encoding)
+    if codec == 'zstd':
+        if zstandard is None:
+            raise ImportError("zstandard is required for .zst files: pip install zstandard")
+        raw = open(path, mode + 'b')
+        if mode == 'r':
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding=encoding)
+    return open(path, mode, encoding=encoding)
+
+
+def read_text(path: str) -> str:
+    """Read a (possibly compressed) text file"""
+    with open_text(path, 'r') as f:
+        return f.read()
+
+
+def load_json(path: str) -> Any:
+    """Load JSON from a (possibly compressed) file"""
+    with open_text(path, 'r') as f:
+        return json.load(f)
+
+
+def dump_json(data: Any, path: str, indent: Optional[int] = 2):
+    """Write JSON to a (possibly compressed) file.
+
+    Compressed files are written without indentation since nobody reads
+    them by hand and whitespace only costs compression time.
+    """
+    if compression_for_path(path):
+        indent = None
+    with open_text(path, 'w') as f:
+        json.dump(data, f, indent=indent, separators=(',', ':') if indent is None else None)
+
+
+def find_existing(path: str) -> Optional[str]:
+    """Return the first existing plain or compressed variant of `path`"""
+    for candidate in candidate_paths(path):
+        if os.path.exists(candidate):
+            return candidate
+    return None
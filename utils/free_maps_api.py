@@ -1,9 +1,18 @@
+import os
+import sys
 import requests
 import time
 from typing import Dict, List, Optional, Tuple
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+
 class FreeMapsAPI:
-    def __init__(self):
+    def __init__(self, timeout: Optional[float] = None):
+        settings = get_settings()
+        self.timeout = timeout or settings.http_timeout
+        self.user_agent = settings.maps_user_agent
         self.nominatim_url = "https://nominatim.openstreetmap.org"
         self.overpass_url = "https://overpass-api.de/api/interpreter"
         
@@ -17,9 +26,9 @@ class FreeMapsAPI:
                 'limit': 1,
                 'addressdetails': 1
             }
-            headers = {'User-Agent': 'PropertyAnalysisApp/1.0'}
+            headers = {'User-Agent': self.user_agent}
             
-            response = requests.get(url, params=params, headers=headers)
+            response = requests.get(url, params=params, headers=headers, timeout=self.timeout)
             time.sleep(1)  # Rate limit: 1 request per second
             
             if response.status_code == 200:
@@ -47,9 +56,9 @@ class FreeMapsAPI:
                 'format': 'json',
                 'addressdetails': 1
             }
-            headers = {'User-Agent': 'PropertyAnalysisApp/1.0'}
+            headers = {'User-Agent': self.user_agent}
             
-            response = requests.get(url, params=params, headers=headers)
+            response = requests.get(url, params=params, headers=headers, timeout=self.timeout)
             time.sleep(1)  # Rate limit
             
             if response.status_code == 200:
@@ -80,7 +89,7 @@ class FreeMapsAPI:
             out center meta;
             """
             
-            response = requests.post(self.overpass_url, data=query)
+            response = requests.post(self.overpass_url, data=query, timeout=self.timeout)
             time.sleep(1)  # Rate limit
             
             if response.status_code == 200:
@@ -123,7 +132,7 @@ class FreeMapsAPI:
             out geom meta;
             """
             
-            response = requests.post(self.overpass_url, data=query)
+            response = requests.post(self.overpass_url, data=query, timeout=self.timeout)
             time.sleep(1)
             
             if response.status_code == 200:
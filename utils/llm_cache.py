@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "llm_answers.sqlite")
+
+class LLMCache:
+    """Disk-backed LLM answer cache keyed on model, parameters and prompt hash.
+
+    Entries expire after `ttl_seconds`; once the cache grows past
+    `max_entries` or `max_bytes` the least recently used answers are evicted.
+    The database runs in WAL mode so readers in other threads and processes
+    do not queue behind writers, and a hit only rewrites its last-access
+    time when that is older than `touch_interval` seconds.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_seconds: int = 7 * 24 * 3600,
+                 max_entries: int = 5000, max_bytes: int = 50 * 1024 * 1024, evict_every: int = 50,
+                 busy_timeout: float = 5.0, touch_interval: float = 300.0):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every
+        self.busy_timeout = busy_timeout
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, params: Dict, prompt: str) -> str:
+        """Fingerprint of everything that determines the answer"""
+        prompt_hash = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        payload = json.dumps({'model': model, 'params': params, 'prompt': prompt_hash}, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created_at, accessed_at FROM answers WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    conn.execute("DELETE FROM answers WHERE key = ?", (key,))
+                    conn.commit()
+                self.misses += 1
+                return None
+            if now - row[2] >= self.touch_interval:
+                # LRU order only needs coarse times; most hits stay read-only
+                conn.execute("UPDATE answers SET accessed_at = ? WHERE key = ?", (now, key))
+                conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str, model: str = ''):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO answers (key, model, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, value, len(value.encode('utf-8')), now, now)
+            )
+            conn.commit()
+            self._writes += 1
+            if self._writes % self.evict_every == 0:
+                self._evict(conn, now)
+
+    def evict(self):
+        """Drop expired entries and trim the cache back under its size limits"""
+        with self._lock:
+            self._evict(self._connect(), time.time())
+
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM answers")
+            conn.commit()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            count, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        return {'entries': count, 'bytes': size, 'hits': self.hits, 'misses': self.misses}
+
+    def _evict(self, conn, now: float):
+        conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl_seconds,))
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers").fetchone()
+        if count > self.max_entries or size > self.max_bytes:
+            # Walk from least recently used and delete until under both limits
+            doomed = []
+            for key, entry_size in conn.execute("SELECT key, size FROM answers ORDER BY accessed_at ASC"):
+                if count <= self.max_entries and size <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                count -= 1
+                size -= entry_size
+            conn.executemany("DELETE FROM answers WHERE key = ?", doomed)
+        conn.commit()
+
+    def _connect(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+            self._conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout * 1000)}")
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers ("
+                "key TEXT PRIMARY KEY, model TEXT, value TEXT, size INTEGER, created_at REAL, accessed_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_answers_accessed ON answers (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_cache() -> LLMCache:
+    """Process-wide cache shared by every OpenRouterLLM instance"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(get_settings().llm_cache_path or DEFAULT_CACHE_PATH)
+        return _default_cache
@@ -0,0 +1,241 @@
+import contextvars
+import functools
+import inspect
+import os
+import sys
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.llm_config import MODEL_PRICING
+from config.settings import get_settings
+
+# (caller path, prompt label) of the code currently issuing LLM calls
+_scope = contextvars.ContextVar('llm_usage_scope', default=('unattributed', None))
+
+@contextmanager
+def caller_scope(name: str, prompt: Optional[str] = None):
+    """Attribute LLM calls made inside the block to `name` (nested as parent/name).
+
+    An enclosing scope's prompt label wins over `prompt`, so a caller can
+    label calls made on its behalf by lower layers.
+    """
+    parent, parent_prompt = _scope.get()
+    if parent == 'unattributed':
+        path = name
+    elif parent.split('/')[-1] == name:
+        path = parent
+    else:
+        path = f"{parent}/{name}"
+    token = _scope.set((path, parent_prompt or prompt))
+    try:
+        yield path
+    finally:
+        try:
+            _scope.reset(token)
+        except ValueError:
+            # Generator finalized from another context; nothing to restore
+            pass
+
+def track_caller(name: str, prompt_arg: Optional[str] = None):
+    """Decorator form of caller_scope; `prompt_arg` names a parameter used as the prompt label"""
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        def label(args, kwargs):
+            if prompt_arg is None:
+                return None
+            try:
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                return bound.arguments.get(prompt_arg)
+            except TypeError:
+                return None
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with caller_scope(name, label(args, kwargs)):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with caller_scope(name, label(args, kwargs)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def current_caller() -> str:
+    return _scope.get()[0]
+
+def _new_bucket() -> Dict:
+    return {
+        'calls': 0, 'upstream_calls': 0, 'cache_hits': 0, 'coalesced': 0, 'errors': 0,
+        'prompt_tokens': 0, 'completion_tokens': 0, 'cost_usd': 0.0, 'latency_ms_total': 0.0
+    }
+
+class UsageTracker:
+    """Aggregates tokens, cost, latency and cache status of LLM calls by caller, model and prompt.
+
+    Every call is attributed to the innermost caller_scope/track_caller in
+    effect; the prompt label is the scope's label or, failing that, the
+    first line of the prompt.
+    """
+
+    def __init__(self, latency_samples: int = 500, pricing: Optional[Dict] = None):
+        self.latency_samples = latency_samples
+        self.pricing = pricing if pricing is not None else MODEL_PRICING
+        self._lock = threading.Lock()
+        # Periodic summary worker and the event that stops it
+        self._summary_lock = threading.Lock()
+        self._summary_thread = None
+        self._summary_stop = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.by_caller: Dict[str, Dict] = {}
+            self.by_model: Dict[str, Dict] = {}
+            self.by_prompt: Dict[tuple, Dict] = {}
+            self._latencies: Dict[str, deque] = {}
+
+    def record(self, model: str, prompt_tokens: int = 0, completion_tokens: int = 0, latency_ms: float = 0.0,
+               cache: str = 'miss', error: bool = False, cost: Optional[float] = None, prompt_text: Optional[str] = None):
+        """Record one call. cache is 'miss' (upstream request), 'hit' or 'coalesced'."""
+        caller, label = _scope.get()
+        if label is None:
+            first_line = (prompt_text or '').strip().split('\n', 1)[0]
+            label = first_line[:60] or '(empty prompt)'
+        if cost is None:
+            cost = self.estimate_cost(model, prompt_tokens, completion_tokens)
+
+        with self._lock:
+            for bucket in (self.by_caller.setdefault(caller, _new_bucket()),
+                           self.by_model.setdefault(model, _new_bucket()),
+                           self.by_prompt.setdefault((caller, label), _new_bucket())):
+                bucket['calls'] += 1
+                if cache == 'hit':
+                    bucket['cache_hits'] += 1
+                elif cache == 'coalesced':
+                    bucket['coalesced'] += 1
+                else:
+                    bucket['upstream_calls'] += 1
+                if error:
+                    bucket['errors'] += 1
+                bucket['prompt_tokens'] += prompt_tokens
+                bucket['completion_tokens'] += completion_tokens
+                bucket['cost_usd'] += cost
+                bucket['latency_ms_total'] += latency_ms
+            self._latencies.setdefault(caller, deque(maxlen=self.latency_samples)).append(latency_ms)
+
+    def estimate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """USD from per-million-token prices; free models cost nothing"""
+        prices = self.pricing.get(model)
+        if not prices:
+            return 0.0
+        return (prompt_tokens * prices.get('prompt', 0.0) + completion_tokens * prices.get('completion', 0.0)) / 1_000_000
+
+    def summary(self, top: int = 10) -> Dict:
+        """Totals plus per-caller, per-model and heaviest-prompt breakdowns"""
+        with self._lock:
+            totals = _new_bucket()
+            for bucket in self.by_caller.values():
+                for key in totals:
+                    totals[key] += bucket[key]
+            by_caller = {}
+            for caller, bucket in self.by_caller.items():
+                latencies = sorted(self._latencies.get(caller, []))
+                by_caller[caller] = dict(
+                    self._finish(bucket),
+                    p95_latency_ms=round(latencies[int(0.95 * (len(latencies) - 1))], 1) if latencies else None
+                )
+            by_model = {model: self._finish(bucket) for model, bucket in self.by_model.items()}
+            prompts = sorted(
+                self.by_prompt.items(),
+                key=lambda item: (item[1]['prompt_tokens'] + item[1]['completion_tokens'], item[1]['latency_ms_total']),
+                reverse=True
+            )[:top]
+            top_prompts = [dict(self._finish(bucket), caller=caller, prompt=label) for (caller, label), bucket in prompts]
+        return {'totals': self._finish(totals), 'by_caller': by_caller, 'by_model': by_model, 'top_prompts': top_prompts}
+
+    def format_summary(self, top: int = 5) -> str:
+        summary = self.summary(top)
+        totals = summary['totals']
+        lines = [
+            f"LLM usage: {totals['calls']} calls ({totals['cache_hits']} cached, {totals['errors']} errors), "
+            f"{totals['total_tokens']} tokens, ${totals['cost_usd']:.4f}"
+        ]
+        for caller, bucket in sorted(summary['by_caller'].items(), key=lambda item: -item[1]['total_tokens']):
+            lines.append(f"  {caller}: {bucket['calls']} calls, {bucket['total_tokens']} tokens, "
+                         f"avg {bucket['avg_latency_ms']}ms, p95 {bucket['p95_latency_ms']}ms")
+        for item in summary['top_prompts']:
+            lines.append(f"  top prompt [{item['caller']}] {item['prompt']}: {item['total_tokens']} tokens, "
+                         f"{item['calls']} calls")
+        return '\n'.join(lines)
+
+    def start_periodic_summary(self, interval_seconds: float = 300, printer=print):
+        """Print format_summary() every interval until stop_periodic_summary().
+
+        One worker thread waits on its own stop event, so a restart replaces
+        the previous worker instead of running alongside it.
+        """
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval_seconds):
+                try:
+                    if self.by_caller:
+                        printer(self.format_summary())
+                except Exception as e:
+                    print(f"LLM usage summary failed: {e}")
+
+        thread = threading.Thread(target=run, name="llm-usage-summary", daemon=True)
+        with self._summary_lock:
+            previous = (self._summary_stop, self._summary_thread)
+            self._summary_stop, self._summary_thread = stop, thread
+        self._halt_summary(*previous)
+        thread.start()
+
+    def stop_periodic_summary(self):
+        """Stop the summary worker; no summary is printed after this returns"""
+        with self._summary_lock:
+            previous = (self._summary_stop, self._summary_thread)
+            self._summary_stop = self._summary_thread = None
+        self._halt_summary(*previous)
+
+    def _halt_summary(self, stop: Optional[threading.Event], thread: Optional[threading.Thread]):
+        if stop is None:
+            return
+        stop.set()
+        # Let a summary being printed right now finish (unless the printer itself stopped us)
+        if thread is not threading.current_thread() and thread.is_alive():
+            thread.join()
+
+    def _finish(self, bucket: Dict) -> Dict:
+        result = dict(bucket)
+        result['total_tokens'] = bucket['prompt_tokens'] + bucket['completion_tokens']
+        result['cost_usd'] = round(bucket['cost_usd'], 6)
+        result['avg_latency_ms'] = round(bucket['latency_ms_total'] / bucket['calls'], 1) if bucket['calls'] else 0.0
+        result['latency_ms_total'] = round(bucket['latency_ms_total'], 1)
+        return result
+
+_default_tracker = None
+_default_tracker_lock = threading.Lock()
+
+def get_default_usage_tracker() -> UsageTracker:
+    """Process-wide tracker shared by every OpenRouterLLM instance.
+
+    Set LLM_USAGE_SUMMARY_SECONDS to print a summary periodically.
+    """
+    global _default_tracker
+    with _default_tracker_lock:
+        if _default_tracker is None:
+            _default_tracker = UsageTracker()
+            interval = get_settings().llm_usage_summary_seconds
+            if interval:
+                _default_tracker.start_periodic_summary(interval)
+        return _default_tracker
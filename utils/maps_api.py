@@ -1,12 +1,22 @@
+import os
+import sys
 import requests
 import json
 import time
 import math
 from typing import Dict, List, Optional, Tuple
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+
 class MapsAPI:
-    def __init__(self, api_key: Optional[str] = None):
-        self.api_key = api_key 
+    def __init__(self, api_key: Optional[str] = None, timeout: Optional[float] = None):
+        settings = get_settings()
+        self.api_key = api_key or settings.api_keys['google_maps']
+        self.timeout = timeout or settings.http_timeout
+        self.user_agent = settings.maps_user_agent
+        self.base_url = "https://maps.googleapis.com/maps/api"
         self.nominatim_url = "https://nominatim.openstreetmap.org"
         self.overpass_url = "https://overpass-api.de/api/interpreter"
         
@@ -20,9 +30,9 @@ class MapsAPI:
                 'limit': 1,
                 'addressdetails': 1
             }
-            headers = {'User-Agent': 'PropertyAnalysisApp/1.0'}
+            headers = {'User-Agent': self.user_agent}
             
-            response = requests.get(url, params=params, headers=headers)
+            response = requests.get(url, params=params, headers=headers, timeout=self.timeout)
             time.sleep(1)  # Rate limit: 1 request per second
             
             if response.status_code == 200:
@@ -50,9 +60,9 @@ class MapsAPI:
                 'format': 'json',
                 'addressdetails': 1
             }
-            headers = {'User-Agent': 'PropertyAnalysisApp/1.0'}
+            headers = {'User-Agent': self.user_agent}
             
-            response = requests.get(url, params=params, headers=headers)
+            response = requests.get(url, params=params, headers=headers, timeout=self.timeout)
             time.sleep(1)  # Rate limit
             
             if response.status_code == 200:
@@ -82,7 +92,7 @@ class MapsAPI:
             out center meta;
             """
             
-            response = requests.post(self.overpass_url, data=query)
+            response = requests.post(self.overpass_url, data=query, timeout=self.timeout)
             time.sleep(1)  # Rate limit
             
             if response.status_code == 200:
@@ -131,7 +141,7 @@ class MapsAPI:
                 'key': self.api_key
             }
             
-            response = requests.get(url, params=params)
+            response = requests.get(url, params=params, timeout=self.timeout)
             data = response.json()
             
             if data['status'] == 'OK':
@@ -166,7 +176,7 @@ class MapsAPI:
                 'key': self.api_key
             }
             
-            response = requests.get(url, params=params)
+            response = requests.get(url, params=params, timeout=self.timeout)
             data = response.json()
             
             if data['status'] == 'OK' and data['routes']:
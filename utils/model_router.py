@@ -0,0 +1,172 @@
+import os
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.llm_config import FREE_MODELS
+
+class _ModelStats:
+    def __init__(self, window: int):
+        self.latency_ewma: Optional[float] = None
+        self.outcomes = deque(maxlen=window)
+        self.state = 'closed'
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1.0 - sum(self.outcomes) / len(self.outcomes)
+
+class ModelRouter:
+    """Route requests to the fastest healthy model, with a circuit breaker per model.
+
+    Latency is tracked as an exponentially weighted moving average and
+    errors over a rolling window. A model whose error rate crosses
+    `failure_threshold` is taken out of rotation (circuit open) for
+    `cooldown_seconds`, after which a single probe request is let through
+    (half-open) to decide whether it comes back.
+
+    One router can serve several clients with different preferred models:
+    each passes its own `primary` to choose(), while health and latency
+    are learned from everyone's traffic. A primary outside the router's
+    pool is a candidate only for the caller that names it, so one client's
+    custom or paid model never receives another client's requests.
+    """
+
+    def __init__(self, models: Iterable[str], primary: Optional[str] = None, window: int = 20,
+                 failure_threshold: float = 0.5, min_requests: int = 3, cooldown_seconds: float = 30.0,
+                 latency_alpha: float = 0.3, explore_rate: float = 0.05):
+        self.models: List[str] = list(dict.fromkeys(models))
+        self.primary = primary or (self.models[0] if self.models else None)
+        if self.primary and self.primary not in self.models:
+            self.models.insert(0, self.primary)
+        self.window = window
+        self.failure_threshold = failure_threshold
+        self.min_requests = min_requests
+        self.cooldown_seconds = cooldown_seconds
+        self.latency_alpha = latency_alpha
+        # Small share of traffic that samples models with no latency data yet
+        self.explore_rate = explore_rate
+        self._stats: Dict[str, _ModelStats] = {m: _ModelStats(window) for m in self.models}
+        self._lock = threading.Lock()
+
+    def set_primary(self, model: str):
+        with self._lock:
+            self._add(model)
+            self.primary = model
+
+    def choose(self, exclude: Iterable[str] = (), primary: Optional[str] = None) -> Optional[str]:
+        """Pick the model for the next request, preferring `primary`
+        (default: the router's own) until others prove faster"""
+        exclude = set(exclude)
+        now = time.time()
+        with self._lock:
+            primary = primary or self.primary
+            pool = self.models
+            if primary and primary not in pool:
+                self._stats.setdefault(primary, _ModelStats(self.window))
+                pool = [primary] + pool
+            available = [m for m in pool if m not in exclude and self._is_available(m, now)]
+            if not available:
+                # Every circuit is open: use the one that has been open longest
+                remaining = [m for m in pool if m not in exclude]
+                if not remaining:
+                    return None
+                return min(remaining, key=lambda m: self._stats[m].opened_at)
+
+            unmeasured = [m for m in available if self._stats[m].latency_ewma is None and m != primary]
+            if unmeasured and random.random() < self.explore_rate:
+                choice = random.choice(unmeasured)
+            else:
+                choice = min(available, key=lambda m: self._rank(m, primary))
+            stats = self._stats[choice]
+            if stats.state == 'open':
+                # Cooldown elapsed: this request is the half-open probe
+                stats.state = 'half_open'
+                stats.probe_in_flight = True
+            return choice
+
+    def record_success(self, model: str, latency_seconds: float):
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                return
+            if stats.latency_ewma is None:
+                stats.latency_ewma = latency_seconds
+            else:
+                stats.latency_ewma += self.latency_alpha * (latency_seconds - stats.latency_ewma)
+            stats.outcomes.append(1)
+            if stats.state == 'half_open':
+                stats.state = 'closed'
+                stats.probe_in_flight = False
+                stats.outcomes.clear()
+                stats.outcomes.append(1)
+
+    def record_failure(self, model: str):
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                return
+            stats.outcomes.append(0)
+            if stats.state == 'half_open':
+                self._open(stats)
+            elif len(stats.outcomes) >= self.min_requests and stats.error_rate() >= self.failure_threshold:
+                self._open(stats)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Current health and latency per model"""
+        with self._lock:
+            return {
+                m: {
+                    'state': s.state,
+                    'latency_ewma': s.latency_ewma,
+                    'error_rate': round(s.error_rate(), 3),
+                    'requests': len(s.outcomes)
+                }
+                for m, s in self._stats.items()
+            }
+
+    def _add(self, model: str):
+        if model not in self._stats:
+            self.models.insert(0, model)
+            self._stats[model] = _ModelStats(self.window)
+
+    def _open(self, stats: _ModelStats):
+        stats.state = 'open'
+        stats.opened_at = time.time()
+        stats.probe_in_flight = False
+
+    def _is_available(self, model: str, now: float) -> bool:
+        stats = self._stats[model]
+        if stats.state == 'closed':
+            return True
+        if stats.state == 'half_open':
+            return not stats.probe_in_flight
+        return now - stats.opened_at >= self.cooldown_seconds
+
+    def _rank(self, model: str, primary: Optional[str]):
+        stats = self._stats[model]
+        # Unmeasured models rank after measured ones; the primary wins ties
+        latency = stats.latency_ewma if stats.latency_ewma is not None else float('inf')
+        if model == primary and stats.latency_ewma is None:
+            latency = 0.0
+        return (latency, model != primary)
+
+_default_router = None
+_default_router_lock = threading.Lock()
+
+def get_default_router() -> ModelRouter:
+    """Process-wide router over the free models, shared by every
+    OpenRouterLLM so circuit breaker state and latency estimates are not
+    relearned by each new client"""
+    global _default_router
+    with _default_router_lock:
+        if _default_router is None:
+            _default_router = ModelRouter(FREE_MODELS.values())
+        return _default_router
@@ -1,26 +1,125 @@
 import requests
 import json
 import os
-from typing import Optional
+import sys
+import time
+import random
+import threading
+import contextvars
+from email.utils import parsedate_to_datetime
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Iterator, Optional
+from requests.adapters import HTTPAdapter
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.llm_cache import LLMCache, get_default_cache
+from utils.single_flight import SingleFlight
+from utils.model_router import ModelRouter, get_default_router
+from utils.rate_limiter import RateLimiter, get_default_rate_limiter
+from utils.text_utils import estimate_tokens
+from utils.llm_usage import UsageTracker, get_default_usage_tracker
+from utils.prompt_fitter import PromptFitter
+from config.llm_config import FREE_MODELS
+from config.settings import get_settings
+
+# Status codes worth retrying: rate limiting and transient upstream failures
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# Identical prompts in flight at the same time share one upstream call
+_inflight = SingleFlight()
+
+# Runs the original and the backup request when hedging is enabled
+_hedge_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-hedge")
+
+# Tokens actually used by the request whose rate-limit reservation is open;
+# a mutable dict so hedge and worker threads (copied contexts) add to it
+_spent_tokens = contextvars.ContextVar('llm_spent_tokens', default=None)
+
+# Why each model stopped generating ('stop', 'length', ...) during the open
+# request, keyed by model so a losing hedge cannot overwrite the winner's
+_finish_reasons = contextvars.ContextVar('llm_finish_reasons', default=None)
+
+def get_shared_session(pool_size: int = 10) -> requests.Session:
+    """Keep-alive session shared by all clients with the same pool size"""
+    with _sessions_lock:
+        session = _sessions.get(pool_size)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _sessions[pool_size] = session
+        return session
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After header as seconds from now (delta-seconds or HTTP-date)"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
 
 class OpenRouterLLM:
     """OpenRouter API client for free LLM models"""
     
-    def __init__(self, api_key: Optional[str] = None, model: str = "deepseek/deepseek-chat"):
-        # Try to load from .env file
-        self._load_env()
-        self.api_key = api_key or os.getenv("OPENROUTER_API_KEY")
-        self.model = model
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+    def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None,
+                 cache: Optional[LLMCache] = None, use_cache: bool = True,
+                 pool_size: Optional[int] = None, max_retries: Optional[int] = None,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0, retry_after_max: float = 60.0,
+                 routing: bool = True, router: Optional[ModelRouter] = None,
+                 hedge_after: Optional[float] = None, max_failover: int = 2,
+                 rate_limiter: Optional[RateLimiter] = None, rate_limit: bool = True,
+                 base_url: Optional[str] = None, usage_tracker: Optional[UsageTracker] = None,
+                 timeout: Optional[float] = None, prompt_fitter: Optional[PromptFitter] = None,
+                 fit_prompts: bool = True):
+        # Parsed once per process; unset arguments fall back to it
+        settings = get_settings()
+        self.settings = settings
+        self.api_key = api_key or settings.openrouter_api_key
+        self.model = model = model or settings.default_model
+        # OPENROUTER_BASE_URL points every client at e.g. utils/openrouter_standin.py
+        self.base_url = base_url or settings.openrouter_base_url or DEFAULT_BASE_URL
+        self.timeout = timeout or settings.llm_timeout
+        # Answers for identical (model, params, prompt) are served from disk
+        self.cache = cache if cache is not None else (get_default_cache() if use_cache else None)
+        # Pooled keep-alive connections amortize TCP/TLS handshakes across calls
+        self.session = get_shared_session(pool_size or settings.llm_pool_size)
+        self.max_retries = max_retries if max_retries is not None else settings.llm_max_retries
+        # Tokens, cost, latency and cache status of every call, per caller
+        self.usage_tracker = usage_tracker or get_default_usage_tracker()
+        # RPM/TPM budget shared with every other client on this machine
+        self.rate_limiter = rate_limiter if rate_limiter is not None else (get_default_rate_limiter() if rate_limit else None)
+        # Compresses prompts and trims them to each model's context window
+        self.prompt_fitter = prompt_fitter or (PromptFitter() if fit_prompts else None)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        # Longest server-requested Retry-After we will wait; beyond it we give up
+        self.retry_after_max = retry_after_max
         
         # Free models available on OpenRouter
-        self.free_models = [
-            "deepseek/deepseek-chat",
-            "google/gemma-2-9b-it:free",
-            "meta-llama/llama-3.1-8b-instruct:free",
-            "microsoft/phi-3-mini-128k-instruct:free",
-            "huggingface/zephyr-7b-beta:free"
-        ]
+        self.free_models = list(FREE_MODELS.values())
+        
+        # Requests go to the fastest healthy model, self.model preferred;
+        # failing models are skipped until their circuit breaker closes.
+        # Model health is shared by every client in the process by default;
+        # self.model is passed to each choose() rather than added to the pool.
+        if router is None and routing:
+            router = get_default_router()
+        self.router = router
+        # Seconds to wait before sending a backup request to a second model
+        self.hedge_after = hedge_after
+        self.max_failover = max_failover
         
         if not self.api_key:
             print("Warning: No OpenRouter API key found. Using mock responses.")
@@ -29,32 +128,409 @@ class OpenRouterLLM:
             self.use_mock = False
     
     def invoke(self, prompt: str, **kwargs) -> str:
-        """Invoke the LLM with a prompt"""
+        """Invoke the LLM with a prompt.
+
+        Pass info={} to receive the upstream finish_reason in
+        info['finish_reason'] ('length' means max_tokens cut the answer
+        short); it is not set for cached or mock answers.
+        """
+        info = kwargs.get("info")
         if self.use_mock:
             return self._mock_response(prompt)
         
+        started = time.perf_counter()
+        params = self._request_params(kwargs)
+        use_cache = self.cache is not None and kwargs.get("use_cache", True)
+        request_key = LLMCache.make_key(self.model, params, prompt)
+        if use_cache:
+            cached = self._cache_get(request_key)
+            if cached is not None:
+                self._record_usage(self.model, prompt, started, cache='hit')
+                return cached
+        
+        leader = []
+        
+        def fetch():
+            leader.append(True)
+            served = {}
+            content = self._post_completion(prompt, params, served=served)
+            finish_reason = served.get('finish_reason')
+            if use_cache:
+                # A fallback model's answer is stored under that model, so the
+                # primary is asked again next time instead of being impersonated
+                answered = served.get('model', self.model)
+                key = request_key if answered == self.model else LLMCache.make_key(answered, params, prompt)
+                try:
+                    self.cache.set(key, content, model=answered)
+                except Exception as e:
+                    print(f"LLM cache write failed: {e}")
+            return content, finish_reason
+        
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
-                "temperature": kwargs.get("temperature", 0.7),
-                "max_tokens": kwargs.get("max_tokens", 1000)
-            }
-            
-            response = requests.post(self.base_url, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-            
+            content, finish_reason = _inflight.do(request_key, fetch)
         except Exception as e:
             print(f"OpenRouter API error: {e}")
             return self._mock_response(prompt)
+        if info is not None and finish_reason is not None:
+            info['finish_reason'] = finish_reason
+        if not leader:
+            # Another thread made the upstream call (and recorded its usage)
+            self._record_usage(self.model, prompt, started, cache='coalesced')
+        return content
+    
+    def _cache_get(self, key: str) -> Optional[str]:
+        """Cached answer, or None on a miss or when the cache cannot be read
+        (e.g. sqlite busy in another process) so the model is asked instead"""
+        try:
+            return self.cache.get(key)
+        except Exception as e:
+            print(f"LLM cache read failed: {e}")
+            return None
+    
+    def _request_params(self, kwargs: dict) -> dict:
+        """Sampling parameters sent upstream (and part of the cache key)"""
+        return {
+            "temperature": kwargs.get("temperature", self.settings.llm_temperature),
+            "max_tokens": kwargs.get("max_tokens", self.settings.llm_max_tokens)
+        }
+    
+    def _post_completion(self, prompt: str, params: dict, served: Optional[dict] = None) -> str:
+        """Complete the prompt on the router's choice of model, failing over
+        to the next healthy model (or hedging, if enabled).
+
+        The model that produced the answer is stored in served['model'] and
+        its finish_reason in served['finish_reason'].
+        One rate-limit reservation covers the whole call, failovers and
+        hedges included, and is settled against the real usage at the end;
+        the wait for it is not part of any model's measured latency.
+        """
+        served = served if served is not None else {}
+        reserved = self._acquire_rate_limit(prompt, params)
+        spent = {'tokens': 0}
+        reasons = {}
+        token = _spent_tokens.set(spent)
+        reasons_token = _finish_reasons.set(reasons)
+        try:
+            content = self._routed_completion(prompt, params, served)
+            served['finish_reason'] = reasons.get(served.get('model'))
+            return content
+        finally:
+            _finish_reasons.reset(reasons_token)
+            _spent_tokens.reset(token)
+            self._settle_rate_limit(reserved, spent['tokens'])
+    
+    def _routed_completion(self, prompt: str, params: dict, served: dict) -> str:
+        if self.router is None:
+            served['model'] = self.model
+            return self._post_model_completion(self.model, prompt, params)
+        if self.hedge_after is not None:
+            return self._hedged_completion(prompt, params, served)
+        
+        tried = []
+        last_error = None
+        while len(tried) <= self.max_failover:
+            model = self.router.choose(exclude=tried, primary=self.model)
+            if model is None:
+                break
+            tried.append(model)
+            try:
+                content = self._timed_completion(model, prompt, params)
+            except Exception as e:
+                print(f"Model {model} failed: {e}")
+                last_error = e
+                continue
+            served['model'] = model
+            return content
+        raise last_error or RuntimeError("No healthy model available")
+    
+    def _hedged_completion(self, prompt: str, params: dict, served: Optional[dict] = None) -> str:
+        """Send to one model; if it is slower than hedge_after (or fails),
+        also send to the next best model and return whichever answers first"""
+        served = served if served is not None else {}
+        model = self.router.choose(primary=self.model)
+        if model is None:
+            raise RuntimeError("No healthy model available")
+        tried = [model]
+        # Copy the context so usage is attributed to this caller, not the pool thread
+        futures = {_hedge_pool.submit(contextvars.copy_context().run, self._timed_completion, model, prompt, params): model}
+        pending = set(futures)
+        hedged = False
+        last_error = None
+        while pending:
+            done, pending = wait(pending, timeout=None if hedged else self.hedge_after,
+                                 return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    content = future.result()
+                except Exception as e:
+                    print(f"Model request failed: {e}")
+                    last_error = e
+                    continue
+                served['model'] = futures[future]
+                return content
+            if not hedged:
+                hedged = True
+                backup = self.router.choose(exclude=tried, primary=self.model)
+                if backup is not None:
+                    tried.append(backup)
+                    future = _hedge_pool.submit(contextvars.copy_context().run,
+                                                self._timed_completion, backup, prompt, params)
+                    futures[future] = backup
+                    pending.add(future)
+        raise last_error or RuntimeError("No healthy model available")
+    
+    def _timed_completion(self, model: str, prompt: str, params: dict) -> str:
+        """One request to `model`, with its latency or failure reported to the router"""
+        start = time.perf_counter()
+        try:
+            content = self._post_model_completion(model, prompt, params)
+        except Exception:
+            self.router.record_failure(model)
+            raise
+        self.router.record_success(model, time.perf_counter() - start)
+        return content
+    
+    def _post_model_completion(self, model: str, prompt: str, params: dict) -> str:
+        """Send one chat-completions request and return the message content"""
+        fitted, params = self._fit_prompt(model, prompt, params)
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": fitted}],
+            **params
+        }
+        
+        started = time.perf_counter()
+        try:
+            response = self._post_with_retry(data)
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+        except Exception:
+            self._record_usage(model, fitted, started, error=True)
+            raise
+        self._note_finish_reason(model, result["choices"][0].get("finish_reason"))
+        self._spend_tokens(fitted, content, result.get("usage"))
+        self._record_usage(model, fitted, started, content=content, usage=result.get("usage"))
+        return content
+    
+    def _fit_prompt(self, model: str, prompt: str, params: dict):
+        """Prompt and params adjusted to the model's context window"""
+        if self.prompt_fitter is None:
+            return prompt, params
+        max_tokens = params.get("max_tokens", self.settings.llm_max_tokens)
+        fitted, fitted_max_tokens, info = self.prompt_fitter.fit(prompt, model, max_tokens)
+        if info['trimmed']:
+            print(f"Prompt trimmed for {model}: {info['original_tokens']} -> {info['tokens']} tokens")
+        if fitted_max_tokens != max_tokens:
+            params = dict(params, max_tokens=fitted_max_tokens)
+        return fitted, params
+    
+    def _record_usage(self, model: str, prompt: str, started: float, cache: str = 'miss',
+                      content: Optional[str] = None, usage: Optional[dict] = None, error: bool = False):
+        """Report one call to the usage tracker; tokens are estimated when the
+        response has no usage block, and cache hits cost nothing"""
+        if self.usage_tracker is None:
+            return
+        latency_ms = (time.perf_counter() - started) * 1000
+        prompt_tokens = completion_tokens = 0
+        if cache == 'miss' and not error:
+            usage = usage or {}
+            prompt_tokens = usage.get("prompt_tokens", estimate_tokens(prompt))
+            completion_tokens = usage.get("completion_tokens", estimate_tokens(content or ""))
+        try:
+            self.usage_tracker.record(model, prompt_tokens, completion_tokens, latency_ms, cache=cache,
+                                      error=error, cost=(usage or {}).get("cost"), prompt_text=prompt)
+        except Exception as e:
+            print(f"LLM usage tracking failed: {e}")
+    
+    def _post_with_retry(self, data: dict, stream: bool = False) -> requests.Response:
+        """POST to the completions endpoint, retrying 429/5xx and connection errors.
+
+        Waits use exponential backoff with full jitter, or the server's
+        Retry-After when that is longer (see _retry_delay).
+        """
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        attempt = 0
+        while True:
+            try:
+                response = self.session.post(self.base_url, headers=headers, json=data, timeout=self.timeout, stream=stream)
+                if response.status_code not in RETRYABLE_STATUS or attempt >= self.max_retries:
+                    response.raise_for_status()
+                    return response
+                delay = self._retry_delay(attempt, response.headers.get("Retry-After"))
+                if delay is None:
+                    response.raise_for_status()
+                    return response
+                response.close()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                delay = self._retry_delay(attempt, None)
+            attempt += 1
+            time.sleep(delay)
+    
+    def _retry_delay(self, attempt: int, retry_after: Optional[str]) -> Optional[float]:
+        """Seconds to wait before retry number attempt+1, or None to give up.
+
+        The server's Retry-After (seconds or an HTTP date) is honoured up to
+        retry_after_max; a longer hint means retrying sooner would only be
+        rejected again, so the caller gives up instead.
+        """
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        hint = _parse_retry_after(retry_after)
+        if hint is None:
+            return delay
+        if hint > self.retry_after_max:
+            print(f"Retry-After of {hint:.0f}s exceeds the {self.retry_after_max:.0f}s limit; not retrying")
+            return None
+        return max(delay, hint)
+    
+    def _acquire_rate_limit(self, prompt: str, params: dict) -> int:
+        """Wait for a slot in the shared rate limit; returns the tokens reserved
+        (prompt plus max completion tokens, at most one minute's budget)"""
+        limiter = self.rate_limiter
+        if limiter is None:
+            return 0
+        reserved = estimate_tokens(prompt) + params.get("max_tokens", 0)
+        limiter.acquire(reserved)
+        if not limiter.tokens_per_minute:
+            return 0
+        return min(reserved, limiter.tokens_per_minute)
+    
+    def _settle_rate_limit(self, reserved: int, actual: int):
+        """Replace a worst-case reservation by the tokens really used (0 when
+        every attempt failed, so the whole reservation is returned)"""
+        if self.rate_limiter is None or actual == reserved:
+            return
+        try:
+            self.rate_limiter.adjust_tokens(actual - reserved)
+        except Exception as e:
+            print(f"Rate limit adjustment failed: {e}")
+    
+    def _spend_tokens(self, prompt: str, content: str, usage: Optional[dict] = None):
+        """Count a successful response against the open reservation, from its
+        usage block or an estimate when it has none"""
+        spent = _spent_tokens.get()
+        if spent is None:
+            return
+        usage = usage or {}
+        prompt_tokens = usage.get("prompt_tokens", estimate_tokens(prompt))
+        completion_tokens = usage.get("completion_tokens", estimate_tokens(content))
+        spent['tokens'] += usage.get("total_tokens") or prompt_tokens + completion_tokens
+    
+    def _note_finish_reason(self, model: str, reason: Optional[str]):
+        """Record why `model` stopped, for the open request's caller"""
+        reasons = _finish_reasons.get()
+        if reasons is not None and reason:
+            reasons[model] = reason
+    
+    def stream(self, prompt: str, **kwargs) -> Iterator[str]:
+        """Yield the completion incrementally as tokens arrive.
+
+        As with invoke, an info={} argument receives the upstream
+        finish_reason once the stream is exhausted.
+        """
+        info = kwargs.get("info")
+        info = info if info is not None else {}
+        if self.use_mock:
+            yield from self._chunk_text(self._mock_response(prompt))
+            return
+        
+        start = time.perf_counter()
+        params = self._request_params(kwargs)
+        cache_key = None
+        if self.cache is not None and kwargs.get("use_cache", True):
+            cache_key = self.cache.make_key(self.model, params, prompt)
+            cached = self._cache_get(cache_key)
+            if cached is not None:
+                self._record_usage(self.model, prompt, start, cache='hit')
+                yield cached
+                return
+        
+        model = self.router.choose(primary=self.model) if self.router is not None else self.model
+        if model is None:
+            print("OpenRouter API error: No healthy model available")
+            yield from self._chunk_text(self._mock_response(prompt))
+            return
+        reserved = self._acquire_rate_limit(prompt, params)
+        spent = {'tokens': 0}
+        parts = []
+        usage = {}
+        # Latency is measured from here, after any rate-limit wait
+        sent = time.perf_counter()
+        try:
+            for delta in self._stream_completion(prompt, params, model, usage, info):
+                parts.append(delta)
+                yield delta
+        except Exception as e:
+            print(f"OpenRouter API error: {e}")
+            self._record_usage(model, prompt, sent, error=True)
+            if self.router is not None:
+                self.router.record_failure(model)
+            if not parts:
+                yield from self._chunk_text(self._mock_response(prompt))
+            return
+        finally:
+            if parts:
+                spent['tokens'] = usage.get("total_tokens") or (
+                    usage.get("prompt_tokens", estimate_tokens(prompt))
+                    + usage.get("completion_tokens", estimate_tokens(''.join(parts))))
+            self._settle_rate_limit(reserved, spent['tokens'])
+        if self.router is not None:
+            self.router.record_success(model, time.perf_counter() - sent)
+        self._record_usage(model, prompt, sent, content=''.join(parts), usage=usage)
+        
+        if cache_key is not None and parts:
+            if model != self.model:
+                cache_key = self.cache.make_key(model, params, prompt)
+            try:
+                self.cache.set(cache_key, ''.join(parts), model=model)
+            except Exception as e:
+                print(f"LLM cache write failed: {e}")
+    
+    def _stream_completion(self, prompt: str, params: dict, model: Optional[str] = None,
+                           usage: Optional[dict] = None, info: Optional[dict] = None) -> Iterator[str]:
+        """Send a stream=True request and yield content deltas from the SSE body.
+
+        The usage block of the final chunk, if any, is copied into `usage`
+        and the choice's finish_reason into info['finish_reason'].
+        """
+        model = model or self.model
+        prompt, params = self._fit_prompt(model, prompt, params)
+        data = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": True,
+            **params
+        }
+        
+        with self._post_with_retry(data, stream=True) as response:
+            for line in response.iter_lines(decode_unicode=True):
+                # Blank keep-alives and ": OPENROUTER PROCESSING" comments carry no data
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"].get("message", chunk["error"]))
+                if usage is not None and chunk.get("usage"):
+                    usage.update(chunk["usage"])
+                choices = chunk.get("choices") or [{}]
+                if info is not None and choices[0].get("finish_reason"):
+                    info['finish_reason'] = choices[0]["finish_reason"]
+                delta = choices[0].get("delta", {}).get("content")
+                if delta:
+                    yield delta
+    
+    def _chunk_text(self, text: str) -> Iterator[str]:
+        """Split a complete answer into word-sized pieces for streaming"""
+        words = text.split(' ')
+        for i, word in enumerate(words):
+            yield word if i == len(words) - 1 else word + ' '
     
     def generate(self, prompt: str, **kwargs) -> str:
         """Alternative method name for compatibility"""
@@ -99,16 +575,6 @@ Key considerations include:
 
 For specific details, please consult with relevant professionals in your area."""
 
-    def _load_env(self):
-        """Load environment variables from .env file"""
-        env_file = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".env")
-        if os.path.exists(env_file):
-            with open(env_file, 'r') as f:
-                for line in f:
-                    if '=' in line and not line.startswith('#'):
-                        key, value = line.strip().split('=', 1)
-                        os.environ[key] = value
-    
     def set_model(self, model: str):
         """Change the model being used"""
         if model in self.free_models:
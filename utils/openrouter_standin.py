@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the OpenRouter chat-completions endpoint.
+
+Replays recorded answers ("cassettes") with configurable latency and error
+injection so the RAG and orchestrator paths can be load-tested offline.
+Point a client at it with OPENROUTER_BASE_URL (or OpenRouterLLM(base_url=...))
+and any non-empty OPENROUTER_API_KEY; pass use_cache=False so the answer
+cache does not hide the traffic.
+
+    python utils/openrouter_standin.py --cassette cache/cassette.json --latency lognormal:800:0.5 --error-rate 0.05
+    python utils/openrouter_standin.py --cassette cache/cassette.json --record   # proxy to OpenRouter and save answers
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional
+
+import requests
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.compressed_io import find_existing, load_json, dump_json
+from utils.text_utils import estimate_tokens
+
+UPSTREAM_URL = "https://openrouter.ai/api/v1/chat/completions"
+COMPLETIONS_PATH = "/api/v1/chat/completions"
+
+class LatencyModel:
+    """Response delay distribution, parsed from 'fixed:MS', 'uniform:LO:HI' or 'lognormal:MEDIAN:SIGMA'"""
+
+    def __init__(self, spec: str = "fixed:0"):
+        parts = spec.split(':')
+        self.kind = parts[0]
+        self.args = [float(p) for p in parts[1:]]
+        if self.kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {spec}")
+
+    def sample(self, rng: random.Random) -> float:
+        """Delay in seconds"""
+        if self.kind == 'fixed':
+            ms = self.args[0] if self.args else 0.0
+        elif self.kind == 'uniform':
+            ms = rng.uniform(self.args[0], self.args[1])
+        else:
+            median, sigma = self.args[0], (self.args[1] if len(self.args) > 1 else 0.5)
+            ms = median * rng.lognormvariate(0, sigma)
+        return max(0.0, ms) / 1000.0
+
+class Cassette:
+    """Recorded answers keyed by prompt, persisted as (optionally compressed) JSON"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._answers: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        existing = find_existing(path) if path else None
+        if existing:
+            for item in load_json(existing).get('interactions', []):
+                self._answers[self._key(item.get('model'), item['prompt_hash'])] = item
+                self._answers.setdefault(self._key(None, item['prompt_hash']), item)
+
+    @staticmethod
+    def prompt_hash(messages: Iterable[Dict]) -> str:
+        text = '\n'.join(f"{m.get('role')}:{m.get('content')}" for m in messages)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def _key(model: Optional[str], prompt_hash: str) -> str:
+        return f"{model or '*'}|{prompt_hash}"
+
+    def __len__(self):
+        return len({id(item) for item in self._answers.values()})
+
+    def lookup(self, model: str, messages: Iterable[Dict]) -> Optional[Dict]:
+        """Exact (model, prompt) match first, then the same prompt on any model"""
+        digest = self.prompt_hash(messages)
+        with self._lock:
+            return self._answers.get(self._key(model, digest)) or self._answers.get(self._key(None, digest))
+
+    def record(self, model: str, messages: Iterable[Dict], content: str, usage: Optional[Dict] = None):
+        messages = list(messages)
+        item = {
+            'model': model,
+            'prompt_hash': self.prompt_hash(messages),
+            'prompt_preview': (messages[-1].get('content') or '')[:120] if messages else '',
+            'content': content,
+            'usage': usage or {}
+        }
+        with self._lock:
+            self._answers[self._key(model, item['prompt_hash'])] = item
+            self._answers.setdefault(self._key(None, item['prompt_hash']), item)
+            if self.path:
+                unique = list({id(i): i for i in self._answers.values()}.values())
+                dump_json({'interactions': unique}, self.path)
+
+class OpenRouterStandIn:
+    """Threaded HTTP server that speaks the chat-completions protocol"""
+
+    def __init__(self, cassette_path: Optional[str] = None, latency: str = "fixed:0",
+                 error_rate: float = 0.0, error_statuses: Iterable[int] = (429, 503),
+                 record: bool = False, upstream_url: str = UPSTREAM_URL, upstream_key: Optional[str] = None,
+                 fallback_words: int = 120, token_delay_ms: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None):
+        self.cassette = Cassette(cassette_path)
+        self.latency = LatencyModel(latency)
+        self.error_rate = error_rate
+        self.error_statuses = list(error_statuses)
+        self.record = record
+        self.upstream_url = upstream_url
+        self.upstream_key = upstream_key or os.getenv("OPENROUTER_API_KEY")
+        # Answer length when a prompt is not on the cassette
+        self.fallback_words = fallback_words
+        # Delay between streamed chunks
+        self.token_delay_ms = token_delay_ms
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stats = {'requests': 0, 'replayed': 0, 'recorded': 0, 'synthesized': 0, 'errors_injected': 0}
+        self._stats_lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}{COMPLETIONS_PATH}"
+
+    def start(self) -> str:
+        """Serve on a background thread; returns the completions URL"""
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.base_url
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _draw(self):
+        """Latency and injected status for one request"""
+        with self._rng_lock:
+            delay = self.latency.sample(self.rng)
+            status = None
+            if self.error_statuses and self.rng.random() < self.error_rate:
+                status = self.rng.choice(self.error_statuses)
+        return delay, status
+
+    def _answer(self, body: Dict) -> Dict:
+        """Return {'content', 'usage', 'source'} for a request body"""
+        model = body.get('model', '')
+        messages = body.get('messages', [])
+        item = self.cassette.lookup(model, messages)
+        if item is not None:
+            return {'content': item['content'], 'usage': item.get('usage') or {}, 'source': 'replayed'}
+
+        if self.record:
+            upstream = dict(body, stream=False)
+            response = requests.post(self.upstream_url, json=upstream, timeout=60,
+                                     headers={"Authorization": f"Bearer {self.upstream_key}"})
+            response.raise_for_status()
+            result = response.json()
+            content = result["choices"][0]["message"]["content"]
+            usage = result.get("usage") or {}
+            self.cassette.record(model, messages, content, usage)
+            return {'content': content, 'usage': usage, 'source': 'recorded'}
+
+        prompt = messages[-1].get('content', '') if messages else ''
+        words = ("Stand-in answer for: " + ' '.join(prompt.split()[:12])).split()
+        filler = "property condition cost estimate permit inspection maintenance repair".split()
+        while len(words) < self.fallback_words:
+            words.append(filler[len(words) % len(filler)])
+        return {'content': ' '.join(words), 'usage': {}, 'source': 'synthesized'}
+
+    def _handler_class(self):
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/stats':
+                    with standin._stats_lock:
+                        self._send_json(200, dict(standin.stats, cassette_entries=len(standin.cassette)))
+                else:
+                    self._send_json(404, {"error": {"message": "Not found", "code": 404}})
+
+            def do_POST(self):
+                if self.path.rstrip('/') != COMPLETIONS_PATH:
+                    self._send_json(404, {"error": {"message": "Not found", "code": 404}})
+                    return
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    self._send_json(400, {"error": {"message": "Invalid JSON", "code": 400}})
+                    return
+
+                standin._count('requests')
+                delay, status = standin._draw()
+                if status is not None:
+                    standin._count('errors_injected')
+                    time.sleep(delay)
+                    headers = {'Retry-After': '1'} if status == 429 else {}
+                    self._send_json(status, {"error": {"message": "Injected error", "code": status}}, headers)
+                    return
+
+                try:
+                    answer = standin._answer(body)
+                except Exception as e:
+                    self._send_json(502, {"error": {"message": f"Upstream error: {e}", "code": 502}})
+                    return
+                standin._count(answer['source'])
+                time.sleep(delay)
+
+                model = body.get('model', '')
+                usage = dict(answer['usage']) or {
+                    'prompt_tokens': sum(estimate_tokens(m.get('content', '')) for m in body.get('messages', [])),
+                    'completion_tokens': estimate_tokens(answer['content'])
+                }
+                usage.setdefault('total_tokens', usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0))
+                if body.get('stream'):
+                    self._send_stream(model, answer['content'], usage)
+                else:
+                    self._send_json(200, {
+                        "id": f"standin-{int(time.time() * 1000)}",
+                        "object": "chat.completion",
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": answer['content']},
+                                     "finish_reason": "stop"}],
+                        "usage": usage
+                    })
+
+            def _send_json(self, status: int, payload: Dict, headers: Optional[Dict] = None):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, model: str, content: str, usage: Dict):
+                # No Content-Length: the body ends when the connection closes
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.close_connection = True
+                self.wfile.write(b": OPENROUTER PROCESSING\n\n")
+                words = content.split(' ')
+                for i, word in enumerate(words):
+                    piece = word if i == len(words) - 1 else word + ' '
+                    chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": piece}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+                    self.wfile.flush()
+                    if standin.token_delay_ms:
+                        time.sleep(standin.token_delay_ms / 1000.0)
+                final = {"model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+                self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode('utf-8'))
+                self.wfile.flush()
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline stand-in for the OpenRouter chat-completions API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cassette", help="JSON cassette to replay from (and record into); .gz/.xz/.zst allowed")
+    parser.add_argument("--record", action="store_true", help="Forward cassette misses to OpenRouter and save the answers")
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help="Upstream URL used in --record mode")
+    parser.add_argument("--latency", default="fixed:0", help="fixed:MS, uniform:LO:HI or lognormal:MEDIAN_MS:SIGMA")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="Delay between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with an error")
+    parser.add_argument("--error-statuses", default="429,503", help="Comma-separated statuses to inject")
+    parser.add_argument("--fallback-words", type=int, default=120, help="Length of synthesized answers for cassette misses")
+    parser.add_argument("--seed", type=int, help="Seed for reproducible latency and errors")
+    args = parser.parse_args()
+
+    standin = OpenRouterStandIn(
+        cassette_path=args.cassette,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        error_statuses=[int(s) for s in args.error_statuses.split(',') if s.strip()],
+        record=args.record,
+        upstream_url=args.upstream,
+        fallback_words=args.fallback_words,
+        token_delay_ms=args.token_delay_ms,
+        host=args.host,
+        port=args.port,
+        seed=args.seed
+    )
+    print(f"OpenRouter stand-in listening on {standin.base_url} ({len(standin.cassette)} recorded answers)")
+    print(f"Use: OPENROUTER_BASE_URL={standin.base_url}")
+    print("Press Ctrl+C to stop")
+    try:
+        standin.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.server.server_close()
+
+if __name__ == "__main__":
+    main()
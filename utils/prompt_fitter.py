@@ -0,0 +1,152 @@
+import os
+import re
+import sys
+from typing import Dict, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.llm_config import MODEL_LIMITS, DEFAULT_MODEL_LIMITS
+from utils.text_utils import estimate_tokens
+
+# Whole lines of scraped-page chrome that carry no information for the model
+BOILERPLATE_PATTERNS = [re.compile(p, re.IGNORECASE) for p in (
+    r'^(accept|allow|reject)( all)? cookies\b',
+    r'\bwe use cookies\b',
+    r'^skip to (main )?content$',
+    r'\ball rights reserved\b',
+    r'^(privacy policy|terms of (use|service)|cookie policy|contact us)([\s|·•-]+(privacy policy|terms of (use|service)|cookie policy|contact us))*$',
+    r'^subscribe to our newsletter\b',
+    r'^click here\b',
+    r'^(share|tweet|pin it)( on \w+)?$',
+    r'^(previous|next) (article|post|page)$',
+    r'^advertisement$',
+    r'^sign (in|up)( ?/ ?(sign )?(in|up))?$',
+    r'^loading\.*$'
+)]
+# Longer lines are content even if they mention a boilerplate phrase
+MAX_BOILERPLATE_LINE = 160
+
+_SPACE_RE = re.compile(r'[ \t\f\v\u00a0]+')
+_INDENT_RE = re.compile(r'^[ \t]*')
+_BLANK_LINES_RE = re.compile(r'\n{3,}')
+_CONTEXT_RE = re.compile(r'Context:[ \t]*')
+
+class PromptFitter:
+    """Fit a prompt and its completion budget into a model's context window.
+
+    Every prompt is compressed (blank-line and in-line space runs collapsed,
+    boilerplate and immediately repeated lines dropped; indentation is kept
+    so nested lists and code survive). If it still does not fit, max_tokens is lowered
+    towards `min_completion_tokens` and then the context is trimmed by
+    priority: instructions and the question are kept, and retrieved
+    passages are dropped from the least relevant (last) one up.
+    """
+
+    def __init__(self, limits: Optional[Dict[str, Dict]] = None, safety_margin: int = 64,
+                 min_completion_tokens: int = 256, dedupe_min_chars: int = 30):
+        self.limits = limits if limits is not None else MODEL_LIMITS
+        # Headroom for chat formatting tokens and estimate error
+        self.safety_margin = safety_margin
+        self.min_completion_tokens = min_completion_tokens
+        # Shorter lines (bullets, "Source: x") may repeat even back to back
+        self.dedupe_min_chars = dedupe_min_chars
+
+    def limits_for(self, model: str) -> Dict:
+        return self.limits.get(model, DEFAULT_MODEL_LIMITS)
+
+    def count_tokens(self, text: str, model: str) -> int:
+        return estimate_tokens(text, self.limits_for(model)['chars_per_token'])
+
+    def fit(self, prompt: str, model: str, max_tokens: int) -> Tuple[str, int, Dict]:
+        """Return (prompt, max_tokens, info) sized for `model`"""
+        limits = self.limits_for(model)
+        window = limits['context']
+        original_tokens = self.count_tokens(prompt, model)
+
+        text = self.compress(prompt)
+        tokens = self.count_tokens(text, model)
+
+        # Give up completion room before context, but keep a usable answer length
+        room_for_completion = window - tokens - self.safety_margin
+        if max_tokens > room_for_completion:
+            max_tokens = max(min(max_tokens, self.min_completion_tokens), room_for_completion)
+
+        prompt_budget = window - max_tokens - self.safety_margin
+        trimmed = tokens > prompt_budget
+        if trimmed:
+            text = self.trim(text, int(prompt_budget * limits['chars_per_token']))
+            tokens = self.count_tokens(text, model)
+
+        info = {
+            'model': model,
+            'original_tokens': original_tokens,
+            'tokens': tokens,
+            'max_tokens': max_tokens,
+            'trimmed': trimmed
+        }
+        return text, max_tokens, info
+
+    def compress(self, text: str) -> str:
+        """Collapse blank lines and space runs within lines, and drop
+        boilerplate and lines identical to the one before.
+
+        Leading indentation is preserved, and a line repeated further apart
+        (e.g. the same entry in two listings) is kept.
+        """
+        lines = []
+        previous = None
+        for raw in text.split('\n'):
+            indent = _INDENT_RE.match(raw).group(0)
+            content = _SPACE_RE.sub(' ', raw[len(indent):]).strip()
+            if content and len(content) <= MAX_BOILERPLATE_LINE and any(p.search(content) for p in BOILERPLATE_PATTERNS):
+                continue
+            line = indent + content if content else ''
+            if line == previous and len(content) >= self.dedupe_min_chars:
+                continue
+            lines.append(line)
+            previous = line
+        return _BLANK_LINES_RE.sub('\n\n', '\n'.join(lines)).strip('\n').rstrip()
+
+    def trim(self, text: str, budget_chars: int) -> str:
+        """Shorten text to budget_chars, cutting retrieved context first"""
+        if len(text) <= budget_chars:
+            return text
+        match = _CONTEXT_RE.search(text)
+        question_at = text.rfind('\nQuestion')
+        if match and question_at > match.end():
+            head = text[:match.end()]
+            tail = text[question_at:]
+            room = budget_chars - len(head) - len(tail)
+            context = self._trim_context(text[match.end():question_at], room) if room > 0 else ''
+            text = head + context + tail
+            if len(text) <= budget_chars:
+                return text
+        return self._truncate_middle(text, budget_chars)
+
+    def _trim_context(self, context: str, room: int) -> str:
+        """Keep whole passages in order (most relevant first) while they fit"""
+        passages = [p for p in re.split(r'\n\s*\n', context.strip()) if p.strip()]
+        kept = []
+        used = 0
+        for passage in passages:
+            cost = len(passage) + 2
+            if used + cost <= room:
+                kept.append(passage)
+                used += cost
+                continue
+            # Partially keep the first passage that overflows if a useful amount fits
+            remaining = room - used - 6
+            if remaining >= 200:
+                cut = passage[:remaining].rsplit(' ', 1)[0]
+                kept.append(cut + ' ...')
+            break
+        return '\n\n'.join(kept) + '\n' if kept else ''
+
+    def _truncate_middle(self, text: str, budget_chars: int) -> str:
+        """Last resort: keep the start (instructions) and the end (question)"""
+        marker = '\n...\n'
+        if budget_chars <= len(marker):
+            return text[-budget_chars:] if budget_chars > 0 else ''
+        keep = budget_chars - len(marker)
+        head = keep // 3
+        return text[:head] + marker + text[len(text) - (keep - head):]
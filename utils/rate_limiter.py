@@ -0,0 +1,138 @@
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+DEFAULT_STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "rate_limit.json")
+
+class RateLimiter:
+    """Token bucket for requests-per-minute and tokens-per-minute limits.
+
+    Bucket state lives in a small JSON file guarded by an OS file lock, so
+    every thread and process using the same path draws from one budget.
+    Callers are never rejected: each one reserves its share up front (the
+    balance may go negative) and sleeps until the bucket has refilled
+    enough to cover it, which serves callers in arrival order.
+    """
+
+    def __init__(self, path: str = DEFAULT_STATE_PATH, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None):
+        self.path = path
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._lock = threading.Lock()
+        self.total_wait = 0.0
+
+    def acquire(self, tokens: int = 0) -> float:
+        """Block until one request using `tokens` tokens may be sent; returns seconds waited"""
+        with self._locked_state() as state:
+            self._refill(state)
+            wait = 0.0
+            if self.requests_per_minute:
+                state['requests'] -= 1
+                wait = max(wait, -state['requests'] * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute and tokens:
+                # A single request larger than the whole budget still gets through eventually
+                state['tokens'] -= min(tokens, self.tokens_per_minute)
+                wait = max(wait, -state['tokens'] * 60.0 / self.tokens_per_minute)
+        if wait > 0:
+            time.sleep(wait)
+            self.total_wait += wait
+        return wait
+
+    def adjust_tokens(self, delta: int):
+        """Correct the token balance once the real usage of a request is known
+        (positive delta = the request used more than was reserved)"""
+        if not self.tokens_per_minute or not delta:
+            return
+        with self._locked_state() as state:
+            self._refill(state)
+            state['tokens'] -= delta
+
+    def available(self) -> Dict[str, float]:
+        """Current bucket balances (negative while callers are queued)"""
+        with self._locked_state() as state:
+            self._refill(state)
+            return {'requests': state['requests'], 'tokens': state['tokens']}
+
+    def _refill(self, state: Dict):
+        now = time.time()
+        elapsed = max(0.0, now - state.get('updated', now))
+        if self.requests_per_minute:
+            state['requests'] = min(self.requests_per_minute,
+                                    state.get('requests', self.requests_per_minute) + elapsed * self.requests_per_minute / 60.0)
+        if self.tokens_per_minute:
+            state['tokens'] = min(self.tokens_per_minute,
+                                  state.get('tokens', self.tokens_per_minute) + elapsed * self.tokens_per_minute / 60.0)
+        state['updated'] = now
+
+    @contextmanager
+    def _locked_state(self):
+        """Read-modify-write the shared bucket under a thread and file lock"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            with open(self.path, 'a+') as f:
+                _lock_file(f)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or '{}')
+                    except ValueError:
+                        state = {}
+                    state.setdefault('requests', self.requests_per_minute or 0)
+                    state.setdefault('tokens', self.tokens_per_minute or 0)
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    _unlock_file(f)
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    elif msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    elif msvcrt is not None:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+def get_default_rate_limiter() -> RateLimiter:
+    """Process-wide limiter shared by every OpenRouterLLM instance"""
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            settings = get_settings()
+            _default_limiter = RateLimiter(
+                settings.llm_rate_limit_path or DEFAULT_STATE_PATH,
+                requests_per_minute=settings.llm_requests_per_minute,
+                tokens_per_minute=settings.llm_tokens_per_minute
+            )
+        return _default_limiter
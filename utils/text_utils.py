@@ -0,0 +1,29 @@
+import math
+import re
+from typing import List
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have',
+    'in', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was',
+    'what', 'when', 'where', 'which', 'who', 'will', 'with', 'you', 'your', 'me',
+    'do', 'does', 'can', 'should', 'how', 'any', 'all', 'about', 'into', 'their'
+}
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Rough characters-per-token ratio for English text with BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stopwords and single characters removed"""
+    if not text:
+        return []
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def estimate_tokens(text: str, chars_per_token: float = CHARS_PER_TOKEN) -> int:
+    """Cheap token estimate that avoids loading a real tokenizer"""
+    if not text:
+        return 0
+    return int(math.ceil(len(text) / chars_per_token))
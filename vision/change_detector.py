@@ -1,45 +1,184 @@
+import os
+import sys
 import cv2
 import numpy as np
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vision.feature_cache import FeatureCache, get_default_feature_cache
+from vision.feature_matcher import FeatureMatcher
+from vision.mask_encoding import contours_to_polygons, encode_rle
+
+# What a result carries besides metrics and bounding boxes, smallest first
+ARTIFACT_LEVELS = ('none', 'polygons', 'rle', 'arrays')
 
 class ChangeDetector:
-    def __init__(self):
+    def __init__(self, mode: str = 'auto', pyramid_max_side: int = 1024, tile_size: int = 512,
+                 pyramid_min_pixels: int = 4_000_000, feature_cache: Optional[FeatureCache] = None,
+                 use_feature_cache: bool = True, matcher: Optional[FeatureMatcher] = None,
+                 max_features: int = 500, artifacts: str = 'polygons'):
         self.threshold = 30
         self.min_contour_area = 100
+        # Results stay small by default: 'polygons' adds change_polygons,
+        # 'rle' also a run-length change_mask, and 'arrays' also the
+        # full-size difference_image and threshold_image
+        self.artifacts = artifacts
+        # 'full' diffs every pixel; 'pyramid' diffs a downscaled pair first and
+        # only revisits full-resolution tiles that changed; 'auto' picks
+        # pyramid for images of at least pyramid_min_pixels
+        self.mode = mode
+        self.pyramid_max_side = pyramid_max_side
+        self.tile_size = tile_size
+        self.pyramid_min_pixels = pyramid_min_pixels
         try:
-            self.orb = cv2.ORB_create()
+            self.orb = cv2.ORB_create(nfeatures=max_features)
         except Exception:
             self.orb = None
+        # ORB descriptors are binary strings, so similarity uses the Hamming
+        # distance (Hamming2 when ORB compares 3 or 4 points per bit)
+        if matcher is None:
+            norm = cv2.NORM_HAMMING2 if self.orb is not None and self.orb.getWTA_K() > 2 else cv2.NORM_HAMMING
+            matcher = FeatureMatcher(max_features=max_features, norm=norm)
+        self.matcher = matcher
+        self.bf = matcher.bf
+        # Keypoints/descriptors by image content, so a baseline compared
+        # against many later photos is only described once
+        self.feature_cache = feature_cache if feature_cache is not None else (
+            get_default_feature_cache() if use_feature_cache else None)
+
+    def detect_changes(self, before_image, after_image, mode: str = None, artifacts: str = None) -> Dict:
+        """Detect changes between two images"""
+        before = self._prepare(before_image, mode=mode)
+        # Ensure same size (and the same mode, which depends on size)
+        after = self._prepare(after_image, size=before['shape'], mode=before['mode'], fill=255)
+        return self._compare(before, after, artifacts)
+
+    def detect_sequence(self, images: List, mode: str = None, artifacts: str = None) -> Dict:
+        """Detect changes across an inspection history (oldest image first).
+
+        Each image is loaded, converted and described once, then compared
+        with its predecessor ('pairwise') and with the first image
+        ('cumulative'). With artifacts='arrays', change_frequency counts,
+        per pixel, how many consecutive steps changed it.
+        """
+        artifacts = artifacts or self.artifacts
+        result = {
+            'num_images': len(images),
+            'mode': None,
+            'pairwise': [],
+            'cumulative': [],
+            'change_frequency': None,
+            'history': []
+        }
+        if len(images) < 2:
+            return result
+
+        baseline = self._prepare(images[0], mode=mode)
+        previous = baseline
+        # Only the 'arrays' level returns it; skip the full-resolution counter otherwise
+        change_frequency = np.zeros(baseline['shape'], dtype=np.uint16) if artifacts == 'arrays' else None
+        for index in range(1, len(images)):
+            current = self._prepare(images[index], size=baseline['shape'], mode=baseline['mode'], fill=255)
+            diff, thresh, contours, pyramid_info = self._diff(previous, current)
+            pairwise = self._summarize(previous, current, diff, thresh, contours, pyramid_info, artifacts)
+            cumulative = pairwise if previous is baseline else self._compare(baseline, current, artifacts)
+            if change_frequency is not None:
+                change_frequency += thresh > 0
+
+            result['pairwise'].append(pairwise)
+            result['cumulative'].append(cumulative)
+            result['history'].append({
+                'index': index,
+                'change_percentage': pairwise['change_percentage'],
+                'num_changes': pairwise['num_changes'],
+                'similarity_score': pairwise['similarity_score'],
+                'cumulative_change_percentage': cumulative['change_percentage'],
+                'cumulative_num_changes': cumulative['num_changes']
+            })
+            previous = current
+
+        result['mode'] = baseline['mode']
+        result['change_frequency'] = change_frequency
+        return result
+
+    def _prepare(self, image, size: Tuple[int, int] = None, mode: str = None, fill: int = 0) -> Dict:
+        """Load an image once and compute what every comparison needs: the
+        grayscale used for diffing (downscaled in pyramid mode) and its ORB
+        keypoints and descriptors. `size` is the (h, w) to resize to."""
+        # If input is a file path, load image
+        if isinstance(image, str):
+            loaded = cv2.imread(image)
+            image = loaded if loaded is not None else np.ones((100, 100, 3), dtype=np.uint8) * fill
+        if size is not None and image.shape[:2] != tuple(size):
+            image = cv2.resize(image, (size[1], size[0]))
+        h, w = image.shape[:2]
+
+        mode = mode or self.mode
+        if mode == 'auto':
+            mode = 'pyramid' if h * w >= self.pyramid_min_pixels else 'full'
+
+        scale = 1.0
+        if mode == 'pyramid':
+            scale = min(1.0, self.pyramid_max_side / float(max(h, w)))
+            small_size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            gray = cv2.cvtColor(cv2.resize(image, small_size, interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+        else:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        keypoints, descriptors = self._features(gray)
+
+        return {
+            'image': image,
+            'shape': (h, w),
+            'mode': mode,
+            'scale': scale,
+            'gray': gray,
+            'keypoints': keypoints,
+            'descriptors': descriptors
+        }
+
+    def _features(self, gray: np.ndarray) -> Tuple:
+        """ORB keypoints and descriptors of a grayscale image, from the cache when possible"""
+        if self.orb is None:
+            return None, None
         try:
-            self.bf = cv2.BFMatcher()
+            if self.feature_cache is None:
+                return self.orb.detectAndCompute(gray, None)
+            return self.feature_cache.get_or_compute(
+                gray, lambda image: self.orb.detectAndCompute(image, None), self._feature_namespace())
         except Exception:
-            self.bf = None
+            return None, None
 
-    def detect_changes(self, before_image, after_image) -> Dict:
-        """Detect changes between two images"""
-        # If inputs are file paths, load images
-        if isinstance(before_image, str):
-            before_image = cv2.imread(before_image)
-            if before_image is None:
-                before_image = np.zeros((100,100,3), dtype=np.uint8)
-        if isinstance(after_image, str):
-            after_image = cv2.imread(after_image)
-            if after_image is None:
-                after_image = np.ones((100,100,3), dtype=np.uint8)*255
-        # Ensure same size
-        h, w = before_image.shape[:2]
-        after_resized = cv2.resize(after_image, (w, h))
-
-        # Convert to grayscale
-        before_gray = cv2.cvtColor(before_image, cv2.COLOR_BGR2GRAY)
-        after_gray = cv2.cvtColor(after_resized, cv2.COLOR_BGR2GRAY)
+    def _feature_namespace(self) -> str:
+        """Extractor settings that change the features of identical pixels"""
+        orb = self.orb
+        return (f"orb:{orb.getMaxFeatures()}:{orb.getScaleFactor()}:{orb.getNLevels()}:{orb.getEdgeThreshold()}:"
+                f"{orb.getFirstLevel()}:{orb.getWTA_K()}:{orb.getScoreType()}:{orb.getPatchSize()}:{orb.getFastThreshold()}")
+
+    def _compare(self, before: Dict, after: Dict, artifacts: str = None) -> Dict:
+        """Change metrics between two prepared images of the same shape and mode"""
+        diff, thresh, contours, pyramid_info = self._diff(before, after)
+        return self._summarize(before, after, diff, thresh, contours, pyramid_info, artifacts)
 
+    def _diff(self, before: Dict, after: Dict):
+        """(difference image, threshold mask, contours, pyramid info or None)"""
+        if before['mode'] == 'pyramid':
+            return self._pyramid_diff(before, after)
         # Absolute difference and threshold
-        diff = cv2.absdiff(before_gray, after_gray)
+        diff = cv2.absdiff(before['gray'], after['gray'])
         _, thresh = cv2.threshold(diff, self.threshold, 255, cv2.THRESH_BINARY)
 
         # Find contours of changes
         contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return diff, thresh, contours, None
+
+    def _summarize(self, before: Dict, after: Dict, diff, thresh, contours, pyramid_info, artifacts: str = None) -> Dict:
+        h, w = before['shape']
+        mode = before['mode']
+        artifacts = artifacts or self.artifacts
+        if artifacts not in ARTIFACT_LEVELS:
+            raise ValueError(f"Unknown artifacts level {artifacts!r}; expected one of {ARTIFACT_LEVELS}")
         significant_contours = self._identify_significant_changes(contours)
 
         # Calculate change metrics
@@ -49,24 +188,12 @@ class ChangeDetector:
         # Get bounding boxes
         change_regions = [cv2.boundingRect(c) for c in significant_contours]
 
-        # compute similarity score using ORB features if available
-        similarity_score = 0.0
-        if self.orb is not None and self.bf is not None:
-            try:
-                kp1, des1 = self.orb.detectAndCompute(before_gray, None)
-                kp2, des2 = self.orb.detectAndCompute(after_gray, None)
-                if des1 is not None and des2 is not None and len(des1) > 0 and len(des2) > 0:
-                    matches = self.bf.match(des1, des2)
-                    if matches:
-                        # lower distance means more similar, so invert to a similarity-like metric
-                        avg_distance = sum([m.distance for m in matches]) / len(matches)
-                        similarity_score = max(0.0, 100.0 - avg_distance)
-                    else:
-                        similarity_score = 0.0
-                else:
-                    similarity_score = 0.0
-            except Exception:
-                similarity_score = 0.0
+        # compute similarity score from the precomputed ORB features
+        try:
+            similarity_score = self.matcher.similarity(before['descriptors'], after['descriptors'],
+                                                       before['keypoints'], after['keypoints'])
+        except Exception:
+            similarity_score = 0.0
 
         # derive change types
         change_types = []
@@ -82,22 +209,100 @@ class ChangeDetector:
             'minor_changes': sum(1 for t in change_types if t=='minor')
         }
 
-        return {
+        result = {
             'change_percentage': change_percentage,
             'num_changes': len(significant_contours),
             'change_regions': change_regions,
             'total_change_area': total_change_area,
-            'difference_image': diff,
-            'threshold_image': thresh,
             'similarity_score': similarity_score,
             'change_types': change_types,
-            'change_summary': change_summary
+            'change_summary': change_summary,
+            'mode': mode,
+            'image_shape': [h, w],
+            'artifacts': artifacts
+        }
+        if pyramid_info is not None:
+            result['pyramid'] = pyramid_info
+
+        level = ARTIFACT_LEVELS.index(artifacts)
+        if level >= ARTIFACT_LEVELS.index('polygons'):
+            result['change_polygons'] = contours_to_polygons(significant_contours)
+        if level >= ARTIFACT_LEVELS.index('rle'):
+            change_mask = np.zeros((h, w), dtype=np.uint8)
+            if significant_contours:
+                cv2.drawContours(change_mask, significant_contours, -1, 255, cv2.FILLED)
+            result['change_mask'] = encode_rle(change_mask)
+        if artifacts == 'arrays':
+            result['difference_image'] = diff
+            result['threshold_image'] = thresh
+        return result
+
+    def _pyramid_diff(self, before: Dict, after: Dict):
+        """Coarse-to-fine diff: threshold the downscaled pair, then diff and
+        contour at full resolution only inside tiles the coarse pass flagged.
+
+        Returns (diff, thresh, contours, info).
+        """
+        h, w = before['shape']
+        before_image, after_image = before['image'], after['image']
+        small_before, small_after = before['gray'], after['gray']
+        small_h, small_w = small_before.shape[:2]
+
+        # Downscaling averages small changes away, so the coarse pass uses a
+        # lower threshold and grows the mask by a pixel to cover tile edges
+        coarse_diff = cv2.absdiff(small_before, small_after)
+        _, coarse_mask = cv2.threshold(coarse_diff, max(1, self.threshold // 2), 255, cv2.THRESH_BINARY)
+        coarse_mask = cv2.dilate(coarse_mask, np.ones((3, 3), np.uint8))
+
+        tile = self.tile_size
+        rows, cols = (h + tile - 1) // tile, (w + tile - 1) // tile
+        changed_tiles = np.zeros((rows, cols), dtype=bool)
+        ys, xs = np.nonzero(coarse_mask)
+        if len(ys):
+            sy, sx = h / float(small_h), w / float(small_w)
+            ty0 = np.minimum((ys * sy).astype(int) // tile, rows - 1)
+            ty1 = np.minimum((((ys + 1) * sy).astype(int) - 1) // tile, rows - 1)
+            tx0 = np.minimum((xs * sx).astype(int) // tile, cols - 1)
+            tx1 = np.minimum((((xs + 1) * sx).astype(int) - 1) // tile, cols - 1)
+            for ty in (ty0, ty1):
+                for tx in (tx0, tx1):
+                    changed_tiles[ty, tx] = True
+
+        diff = np.zeros((h, w), dtype=np.uint8)
+        thresh = np.zeros((h, w), dtype=np.uint8)
+        for ty, tx in zip(*np.nonzero(changed_tiles)):
+            y0, x0 = ty * tile, tx * tile
+            y1, x1 = min(y0 + tile, h), min(x0 + tile, w)
+            before_tile = cv2.cvtColor(before_image[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+            after_tile = cv2.cvtColor(after_image[y0:y1, x0:x1], cv2.COLOR_BGR2GRAY)
+            diff[y0:y1, x0:x1] = cv2.absdiff(before_tile, after_tile)
+            _, thresh[y0:y1, x0:x1] = cv2.threshold(diff[y0:y1, x0:x1], self.threshold, 255, cv2.THRESH_BINARY)
+
+        contours = ()
+        if changed_tiles.any():
+            # Contour only the bounding box of the changed tiles; adjacent
+            # tiles share the mask so regions crossing tile borders stay whole
+            tile_rows, tile_cols = np.nonzero(changed_tiles)
+            y0, x0 = tile_rows.min() * tile, tile_cols.min() * tile
+            y1, x1 = min((tile_rows.max() + 1) * tile, h), min((tile_cols.max() + 1) * tile, w)
+            contours, _ = cv2.findContours(thresh[y0:y1, x0:x1].copy(), cv2.RETR_EXTERNAL,
+                                           cv2.CHAIN_APPROX_SIMPLE, offset=(int(x0), int(y0)))
+
+        info = {
+            'scale': before['scale'],
+            'tile_size': tile,
+            'tiles_total': int(rows * cols),
+            'tiles_changed': int(changed_tiles.sum())
         }
+        return diff, thresh, contours, info
 
     def _identify_significant_changes(self, data, threshold=None):
         significant = []
-        # if data is an image (diff), compute contours
-        if isinstance(data, (list, tuple, np.ndarray)):
+        # if data is an image (diff), compute contours; a sequence of
+        # (N, 1, 2) point arrays is already a list of contours
+        is_contours = isinstance(data, (list, tuple)) and all(
+            isinstance(c, np.ndarray) and c.ndim == 3 and c.shape[-1] == 2 for c in data)
+        if not is_contours and isinstance(data, (list, tuple, np.ndarray)):
             diff = np.array(data)
             # normalize and threshold
             try:
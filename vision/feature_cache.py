@@ -0,0 +1,182 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config.settings import get_settings
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "cache", "features")
+
+class FeatureCache:
+    """Keypoints and descriptors keyed by a hash of the image content.
+
+    The most recently used `max_entries` results are held in memory; with a
+    `cache_dir` every result is also written there as a small .npz file so
+    later processes skip extraction too. The oldest files are pruned once
+    the directory holds more than `max_disk_entries`.
+    """
+
+    def __init__(self, cache_dir: Optional[str] = DEFAULT_CACHE_DIR, max_entries: int = 128,
+                 max_disk_entries: int = 5000, evict_every: int = 50):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.evict_every = evict_every
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image: np.ndarray, namespace: str = '') -> str:
+        """Fingerprint of the pixels plus whatever configures the extractor"""
+        image = np.ascontiguousarray(image)
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(f"{namespace}|{image.shape}|{image.dtype}|".encode('utf-8'))
+        digest.update(memoryview(image).cast('B'))
+        return digest.hexdigest()
+
+    def get_or_compute(self, image: np.ndarray, compute: Callable, namespace: str = '') -> Tuple:
+        """(keypoints, descriptors) for `image`, running compute(image) only on a miss"""
+        key = self.make_key(image, namespace)
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+        keypoints, descriptors = compute(image)
+        self.set(key, keypoints, descriptors)
+        return keypoints, descriptors
+
+    def get(self, key: str) -> Optional[Tuple]:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        loaded = self._load(key)
+        with self._lock:
+            if loaded is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._remember(key, loaded)
+        return loaded
+
+    def set(self, key: str, keypoints, descriptors):
+        keypoints = tuple(keypoints) if keypoints is not None else ()
+        with self._lock:
+            self._remember(key, (keypoints, descriptors))
+            self._writes += 1
+            prune = self._writes % self.evict_every == 0
+        self._save(key, keypoints, descriptors)
+        if prune:
+            self.prune_disk()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith('.npz'):
+                    try:
+                        os.remove(os.path.join(self.cache_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses}
+
+    def prune_disk(self):
+        """Delete the least recently used files beyond max_disk_entries"""
+        if not self.cache_dir or not os.path.isdir(self.cache_dir):
+            return
+        try:
+            paths = [os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith('.npz')]
+            if len(paths) <= self.max_disk_entries:
+                return
+            paths.sort(key=os.path.getmtime)
+            for path in paths[:len(paths) - self.max_disk_entries]:
+                os.remove(path)
+        except OSError as e:
+            print(f"Feature cache pruning failed: {e}")
+
+    def _remember(self, key: str, value: Tuple):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _save(self, key: str, keypoints, descriptors):
+        if not self.cache_dir:
+            return
+        tmp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            points, octaves = pack_keypoints(keypoints)
+            # Write then rename so concurrent readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, points=points, octaves=octaves,
+                         descriptors=descriptors if descriptors is not None else np.zeros((0, 0), dtype=np.uint8),
+                         has_descriptors=np.array(descriptors is not None))
+            os.replace(tmp_path, self._path(key))
+            tmp_path = None
+        except OSError as e:
+            print(f"Feature cache write failed: {e}")
+        finally:
+            # A failed write or rename must not leave .tmp files piling up
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    def _load(self, key: str) -> Optional[Tuple]:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                keypoints = unpack_keypoints(data['points'], data['octaves'])
+                descriptors = data['descriptors'] if bool(data['has_descriptors']) else None
+            os.utime(path)
+            return keypoints, descriptors
+        except (OSError, KeyError, ValueError):
+            return None
+
+def pack_keypoints(keypoints) -> Tuple[np.ndarray, np.ndarray]:
+    """cv2.KeyPoint list -> (N x 5 float32 [x, y, size, angle, response], N x 2 int32 [octave, class_id])"""
+    points = np.array([(kp.pt[0], kp.pt[1], kp.size, kp.angle, kp.response) for kp in keypoints],
+                      dtype=np.float32).reshape(-1, 5)
+    octaves = np.array([(kp.octave, kp.class_id) for kp in keypoints], dtype=np.int32).reshape(-1, 2)
+    return points, octaves
+
+def unpack_keypoints(points: np.ndarray, octaves: np.ndarray) -> Tuple:
+    return tuple(
+        cv2.KeyPoint(float(x), float(y), float(size), float(angle), float(response), int(octave), int(class_id))
+        for (x, y, size, angle, response), (octave, class_id) in zip(points, octaves)
+    )
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+def get_default_feature_cache() -> FeatureCache:
+    """Process-wide cache shared by every ChangeDetector"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = FeatureCache(get_settings().feature_cache_dir or DEFAULT_CACHE_DIR)
+        return _default_cache
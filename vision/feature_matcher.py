@@ -0,0 +1,113 @@
+import os
+import sys
+from typing import List, Optional
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# FLANN index parameters for binary descriptors (multi-probe LSH)
+FLANN_INDEX_LSH = 6
+LSH_INDEX_PARAMS = dict(algorithm=FLANN_INDEX_LSH, table_number=6, key_size=12, multi_probe_level=1)
+LSH_SEARCH_PARAMS = dict(checks=50)
+
+class FeatureMatcher:
+    """Matches binary (ORB) descriptors with the Hamming metric.
+
+    method is 'bf' (exact brute force), 'flann' (approximate LSH index) or
+    'auto', which uses FLANN once both sides have at least
+    `flann_min_features` descriptors after the max_features cap (by default
+    the cap itself, so feature-rich images switch to FLANN and sparse ones
+    stay on exact matching). With `ratio` set, a match is kept
+    only if it is clearly better than the second-best candidate (Lowe's
+    ratio test); `cross_check` additionally keeps only mutual best matches.
+    At most `max_features` descriptors per image are matched.
+    """
+
+    def __init__(self, method: str = 'auto', ratio: Optional[float] = 0.75, cross_check: bool = False,
+                 max_features: Optional[int] = 500, norm: int = cv2.NORM_HAMMING,
+                 flann_min_features: Optional[int] = None):
+        self.method = method
+        self.ratio = ratio
+        self.cross_check = cross_check
+        self.max_features = max_features
+        self.norm = norm
+        # A fixed threshold above the cap would never be reached
+        self.flann_min_features = flann_min_features or max_features or 1500
+        try:
+            self.bf = cv2.BFMatcher(norm)
+        except Exception:
+            self.bf = None
+        try:
+            self.flann = cv2.FlannBasedMatcher(LSH_INDEX_PARAMS, LSH_SEARCH_PARAMS)
+        except Exception:
+            self.flann = None
+
+    def match(self, des1: Optional[np.ndarray], des2: Optional[np.ndarray],
+              kp1: Optional[List] = None, kp2: Optional[List] = None) -> List:
+        """Good matches from des1 (query) to des2 (train), best first.
+
+        Given the keypoints, the cap keeps the strongest responses; match
+        indices always refer to the full descriptor arrays.
+        """
+        if des1 is None or des2 is None or len(des1) == 0 or len(des2) == 0:
+            return []
+        des1, index1 = self._limit(des1, kp1)
+        des2, index2 = self._limit(des2, kp2)
+        matcher = self._matcher_for(len(des1), len(des2))
+        if matcher is None:
+            return []
+
+        matches = self._one_way(matcher, des1, des2)
+        if self.cross_check and matches:
+            backward = {m.queryIdx: m.trainIdx for m in self._one_way(matcher, des2, des1)}
+            matches = [m for m in matches if backward.get(m.trainIdx) == m.queryIdx]
+        for m in matches:
+            if index1 is not None:
+                m.queryIdx = int(index1[m.queryIdx])
+            if index2 is not None:
+                m.trainIdx = int(index2[m.trainIdx])
+        return sorted(matches, key=lambda m: m.distance)
+
+    def similarity(self, des1: Optional[np.ndarray], des2: Optional[np.ndarray],
+                   kp1: Optional[List] = None, kp2: Optional[List] = None) -> float:
+        """100 minus the mean Hamming distance of the good matches (0 if none)"""
+        matches = self.match(des1, des2, kp1, kp2)
+        if not matches:
+            return 0.0
+        avg_distance = sum(m.distance for m in matches) / len(matches)
+        return max(0.0, 100.0 - avg_distance)
+
+    def _limit(self, descriptors: np.ndarray, keypoints: Optional[List]):
+        """(descriptors, original row indices or None) capped to max_features"""
+        if not self.max_features or len(descriptors) <= self.max_features:
+            return descriptors, None
+        if keypoints is not None and len(keypoints) == len(descriptors):
+            index = np.argsort([-kp.response for kp in keypoints], kind='stable')[:self.max_features]
+        else:
+            index = np.arange(self.max_features)
+        return descriptors[index], index
+
+    def _matcher_for(self, n1: int, n2: int):
+        use_flann = self.method == 'flann' or (
+            self.method == 'auto' and min(n1, n2) >= self.flann_min_features)
+        if use_flann and self.flann is not None:
+            return self.flann
+        return self.bf
+
+    def _one_way(self, matcher, query: np.ndarray, train: np.ndarray) -> List:
+        if self.ratio is None:
+            if matcher is self.flann:
+                # FLANN has no match(); the nearest neighbour is the first of knnMatch
+                return [pair[0] for pair in matcher.knnMatch(query, train, k=1) if pair]
+            return list(matcher.match(query, train))
+        good = []
+        for pair in matcher.knnMatch(query, train, k=2):
+            if len(pair) == 2:
+                if pair[0].distance < self.ratio * pair[1].distance:
+                    good.append(pair[0])
+            elif len(pair) == 1:
+                # LSH buckets can return a single candidate; nothing to compare against
+                good.append(pair[0])
+        return good
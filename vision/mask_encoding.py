@@ -0,0 +1,58 @@
+import os
+import sys
+from typing import Dict, List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def encode_rle(mask: np.ndarray) -> Dict:
+    """Run-length encode a binary mask in row-major order.
+
+    counts alternate between runs of unset and set pixels, starting with
+    unset (so counts[0] is 0 when the first pixel is set).
+    """
+    h, w = mask.shape[:2]
+    flat = np.ascontiguousarray(mask).reshape(-1) != 0
+    if flat.size == 0:
+        return {'size': [h, w], 'counts': []}
+    boundaries = np.flatnonzero(flat[1:] != flat[:-1]) + 1
+    counts = np.diff(np.concatenate(([0], boundaries, [flat.size]))).tolist()
+    if flat[0]:
+        counts = [0] + counts
+    return {'size': [h, w], 'counts': counts}
+
+def decode_rle(rle: Dict) -> np.ndarray:
+    """uint8 mask (0/255) from encode_rle output"""
+    h, w = rle['size']
+    counts = np.asarray(rle['counts'], dtype=np.int64)
+    values = np.zeros(len(counts), dtype=np.uint8)
+    values[1::2] = 255
+    return np.repeat(values, counts).reshape(h, w)
+
+def contours_to_polygons(contours: Sequence[np.ndarray], epsilon: float = 1.0) -> List[List[List[int]]]:
+    """Simplified contours as JSON-friendly [[x, y], ...] point lists"""
+    polygons = []
+    for contour in contours:
+        approx = cv2.approxPolyDP(contour, epsilon, True) if epsilon else contour
+        polygons.append(approx.reshape(-1, 2).astype(int).tolist())
+    return polygons
+
+def decode_polygons(polygons: List[List[List[int]]], size: Tuple[int, int]) -> np.ndarray:
+    """uint8 mask (0/255) of size (h, w) with the polygons filled"""
+    mask = np.zeros(tuple(size), dtype=np.uint8)
+    if polygons:
+        cv2.fillPoly(mask, [np.asarray(p, dtype=np.int32).reshape(-1, 1, 2) for p in polygons], 255)
+    return mask
+
+def decode_change_mask(result: Dict) -> np.ndarray:
+    """Mask of the significant changes in a ChangeDetector result, from
+    whichever artifact it carries (arrays, RLE or polygons)"""
+    if result.get('change_mask') is not None:
+        return decode_rle(result['change_mask'])
+    if result.get('change_polygons') is not None:
+        return decode_polygons(result['change_polygons'], result['image_shape'])
+    if result.get('threshold_image') is not None:
+        return result['threshold_image']
+    raise ValueError("Result has no change artifacts; detect with artifacts='polygons', 'rle' or 'arrays'")
@@ -0,0 +1,393 @@
+import mmap
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vision.change_detector import ARTIFACT_LEVELS, ChangeDetector
+from vision.mask_encoding import contours_to_polygons, encode_rle
+from vision.property_detector import PropertyDetector
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+# Components detected as discrete objects, read with the tile overlap and
+# kept by the tile holding their centre
+OBJECT_COMPONENTS = ('windows', 'doors')
+
+def open_raster(source, shape: Optional[Tuple[int, ...]] = None, dtype='uint8', offset: int = 0) -> np.ndarray:
+    """Memory-map a large image without reading it into RAM.
+
+    Accepts an array (returned as is), a .npy file, an uncompressed TIFF
+    (needs tifffile) or a headerless raw file, for which `shape`
+    (h, w[, channels]), `dtype` and the header `offset` are required.
+    """
+    if isinstance(source, np.ndarray):
+        return source
+    suffix = os.path.splitext(str(source))[1].lower()
+    if suffix == '.npy':
+        return np.load(source, mmap_mode='r')
+    if suffix in ('.tif', '.tiff'):
+        if tifffile is None:
+            raise ImportError("tifffile is required for TIFF rasters: pip install tifffile")
+        try:
+            return tifffile.memmap(source, mode='r')
+        except ValueError as e:
+            raise ValueError(f"{source} cannot be memory-mapped ({e}); store it as uncompressed, "
+                             f"contiguous TIFF, .npy or raw") from e
+    if shape is None:
+        raise ValueError(f"shape is required to memory-map raw file {source}")
+    return np.memmap(source, dtype=dtype, mode='r', offset=offset, shape=tuple(shape))
+
+def _release_pages(raster: np.ndarray, y0: int, y1: int):
+    """Drop the mapped pages of rows y0:y1 from this process's resident set.
+
+    Pages read through a memory map otherwise stay counted in RSS until the
+    whole raster has been touched; the data remains in the page cache. Only
+    for read-only maps opened by open_raster: on a writable or copy-on-write
+    map this would discard the owner's modified pages.
+    """
+    base = raster.base
+    if not isinstance(base, mmap.mmap) or not hasattr(base, 'madvise') or not raster.flags.c_contiguous:
+        return
+    row_bytes = raster.strides[0]
+    # np.memmap maps from the allocation boundary below its offset
+    start = getattr(raster, 'offset', 0) % mmap.ALLOCATIONGRANULARITY + y0 * row_bytes
+    end = min(len(base), start + (y1 - y0) * row_bytes)
+    start -= start % mmap.PAGESIZE
+    try:
+        base.madvise(mmap.MADV_DONTNEED, start, end - start)
+    except (OSError, ValueError, AttributeError):
+        pass
+
+class _UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, key):
+        parent = self.parent.setdefault(key, key)
+        if parent != key:
+            parent = self.parent[key] = self.find(parent)
+        return parent
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+class TiledProcessor:
+    """Runs ChangeDetector / PropertyDetector over rasters too large for memory.
+
+    The raster is cut into `tile_size` squares that worker threads read
+    (from memory-mapped storage), process and release, so peak memory is
+    about workers x tile size regardless of the raster size. Per-tile
+    results are stitched back in global pixel coordinates: change regions
+    cut by tile borders are re-joined using the labels along the shared
+    edges, and detected objects are kept by the tile that owns their centre.
+    """
+
+    def __init__(self, tile_size: int = 2048, overlap: int = 128, workers: Optional[int] = None,
+                 change_detector: Optional[ChangeDetector] = None,
+                 property_detector: Optional[PropertyDetector] = None, channel_order: str = 'bgr',
+                 merge_max_pixels: Optional[int] = None):
+        self.tile_size = tile_size
+        # Largest bounding box (pixels) a region cut by tile borders is redrawn
+        # in to measure it exactly like the untiled detector; bigger regions
+        # are measured by pixel count, which never undercounts
+        self.merge_max_pixels = merge_max_pixels or 16 * tile_size * tile_size
+        # Extra context read around each tile for the component detectors
+        # (change detection is per pixel and needs none)
+        self.overlap = overlap
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.change_detector = change_detector or ChangeDetector()
+        self.property_detector = property_detector or PropertyDetector()
+        # TIFFs usually store RGB; OpenCV detectors expect BGR
+        self.channel_order = channel_order
+
+    def tiles(self, shape: Tuple[int, ...]) -> List[Tuple[int, int, int, int]]:
+        """(y0, x0, y1, x1) windows covering an image of `shape`, row by row"""
+        h, w = shape[:2]
+        return [(y0, x0, min(y0 + self.tile_size, h), min(x0 + self.tile_size, w))
+                for y0 in range(0, h, self.tile_size) for x0 in range(0, w, self.tile_size)]
+
+    def read_tile(self, raster: np.ndarray, window: Tuple[int, int, int, int], pad: int = 0,
+                  release: bool = False) -> Tuple[np.ndarray, int, int]:
+        """8-bit BGR copy of `window` grown by `pad` pixels; returns (tile, y0, x0) of the read area.
+
+        With `release`, the rows read are dropped from the resident set
+        afterwards; pass it only for maps open_raster created.
+        """
+        h, w = raster.shape[:2]
+        y0, x0 = max(0, window[0] - pad), max(0, window[1] - pad)
+        y1, x1 = min(h, window[2] + pad), min(w, window[3] + pad)
+        tile = np.array(raster[y0:y1, x0:x1])
+        if release:
+            _release_pages(raster, y0, y1)
+        if tile.dtype != np.uint8:
+            # Scale wider integer or float data to 8 bits
+            if np.issubdtype(tile.dtype, np.integer):
+                tile = (tile >> (8 * (tile.dtype.itemsize - 1))).astype(np.uint8)
+            else:
+                tile = np.clip(tile * 255.0, 0, 255).astype(np.uint8)
+        if tile.ndim == 2:
+            tile = cv2.cvtColor(tile, cv2.COLOR_GRAY2BGR)
+        elif tile.shape[2] == 4:
+            tile = cv2.cvtColor(tile, cv2.COLOR_RGBA2BGR if self.channel_order == 'rgb' else cv2.COLOR_BGRA2BGR)
+        elif self.channel_order == 'rgb':
+            tile = cv2.cvtColor(tile, cv2.COLOR_RGB2BGR)
+        return tile, y0, x0
+
+    def detect_changes(self, before, after, artifacts: str = None) -> Dict:
+        """ChangeDetector-style result for two co-registered rasters of equal size.
+
+        `artifacts` works as in ChangeDetector ('rle' and 'arrays' build
+        full-size masks, so they cost memory proportional to the raster).
+        """
+        detector = self.change_detector
+        artifacts = artifacts or detector.artifacts
+        if artifacts not in ARTIFACT_LEVELS:
+            raise ValueError(f"Unknown artifacts level {artifacts!r}; expected one of {ARTIFACT_LEVELS}")
+        # Arrays passed in belong to the caller; only our own maps are released
+        release_before, release_after = not isinstance(before, np.ndarray), not isinstance(after, np.ndarray)
+        before, after = open_raster(before), open_raster(after)
+        if before.shape[:2] != after.shape[:2]:
+            raise ValueError(f"Rasters differ in size: {before.shape[:2]} vs {after.shape[:2]}")
+        h, w = before.shape[:2]
+        windows = self.tiles((h, w))
+        scale = min(1.0, detector.pyramid_max_side / float(max(h, w)))
+        overview_before = np.zeros((max(1, int(round(h * scale))), max(1, int(round(w * scale)))), dtype=np.uint8)
+        overview_after = np.zeros_like(overview_before)
+        difference_image = threshold_image = None
+        if artifacts == 'arrays':
+            difference_image = np.zeros((h, w), dtype=np.uint8)
+            threshold_image = np.zeros((h, w), dtype=np.uint8)
+
+        def process(window):
+            y0, x0, y1, x1 = window
+            before_tile = self.read_tile(before, window, release=release_before)[0]
+            after_tile = self.read_tile(after, window, release=release_after)[0]
+            before_gray = cv2.cvtColor(before_tile, cv2.COLOR_BGR2GRAY)
+            after_gray = cv2.cvtColor(after_tile, cv2.COLOR_BGR2GRAY)
+            del before_tile, after_tile
+
+            # Each tile adds its share of the downscaled overview used for similarity
+            oy0, ox0 = int(round(y0 * scale)), int(round(x0 * scale))
+            oy1, ox1 = int(round(y1 * scale)), int(round(x1 * scale))
+            if oy1 > oy0 and ox1 > ox0:
+                overview_before[oy0:oy1, ox0:ox1] = cv2.resize(before_gray, (ox1 - ox0, oy1 - oy0), interpolation=cv2.INTER_AREA)
+                overview_after[oy0:oy1, ox0:ox1] = cv2.resize(after_gray, (ox1 - ox0, oy1 - oy0), interpolation=cv2.INTER_AREA)
+
+            diff = cv2.absdiff(before_gray, after_gray)
+            _, thresh = cv2.threshold(diff, detector.threshold, 255, cv2.THRESH_BINARY)
+            if difference_image is not None:
+                difference_image[y0:y1, x0:x1] = diff
+                threshold_image[y0:y1, x0:x1] = thresh
+            return self._tile_parts(thresh, window, (h, w))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            tile_results = list(pool.map(process, windows))
+
+        regions = self._stitch(windows, tile_results)
+        regions = [r for r in regions if r['area'] >= detector.min_contour_area]
+
+        # Similarity from ORB on the overview, as in pyramid mode
+        try:
+            kp1, des1 = detector._features(overview_before)
+            kp2, des2 = detector._features(overview_after)
+            similarity_score = detector.matcher.similarity(des1, des2, kp1, kp2)
+        except Exception:
+            similarity_score = 0.0
+
+        change_types = ['major' if r['area'] > (h * w) * 0.01 else 'minor' for r in regions]
+        total_change_area = sum(r['area'] for r in regions)
+        result = {
+            'change_percentage': (total_change_area / (h * w)) * 100 if (h * w) > 0 else 0.0,
+            'num_changes': len(regions),
+            'change_regions': [r['bbox'] for r in regions],
+            'total_change_area': total_change_area,
+            'similarity_score': similarity_score,
+            'change_types': change_types,
+            'change_summary': {
+                'total_regions': len(regions),
+                'major_changes': sum(1 for t in change_types if t == 'major'),
+                'minor_changes': sum(1 for t in change_types if t == 'minor')
+            },
+            'mode': 'tiled',
+            'image_shape': [h, w],
+            'artifacts': artifacts,
+            'tiles': {
+                'tile_size': self.tile_size,
+                'tiles_total': len(windows),
+                'tiles_changed': sum(1 for tile_result in tile_results if tile_result['changed'])
+            }
+        }
+        level = ARTIFACT_LEVELS.index(artifacts)
+        contours = [contour for r in regions for contour in r['contours']]
+        if level >= ARTIFACT_LEVELS.index('polygons'):
+            result['change_polygons'] = contours_to_polygons(contours)
+        if level >= ARTIFACT_LEVELS.index('rle'):
+            change_mask = np.zeros((h, w), dtype=np.uint8)
+            if contours:
+                cv2.drawContours(change_mask, contours, -1, 255, cv2.FILLED)
+            result['change_mask'] = encode_rle(change_mask)
+        if artifacts == 'arrays':
+            result['difference_image'] = difference_image
+            result['threshold_image'] = threshold_image
+        return result
+
+    def detect_property_components(self, raster) -> Dict:
+        """PropertyDetector results over a raster: windows and doors in global
+        coordinates, per-tile edge and area measures summed.
+
+        Only window and door detection sees the overlap; the summed measures
+        come from each tile's own window, so no pixel is counted twice.
+        """
+        release = not isinstance(raster, np.ndarray)
+        raster = open_raster(raster)
+        windows = self.tiles(raster.shape)
+        classifiers = self.property_detector.component_classifiers
+
+        def process(window):
+            tile, ty0, tx0 = self.read_tile(raster, window, pad=self.overlap, release=release)
+            core = tile[window[0] - ty0:window[2] - ty0, window[1] - tx0:window[3] - tx0]
+            found = {name: detector(tile if name in OBJECT_COMPONENTS else core)
+                     for name, detector in classifiers.items()}
+            return found, ty0, tx0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            tile_results = list(pool.map(process, windows))
+
+        properties = {
+            'roof': {'detected': False, 'estimated_area': 0, 'condition': 'unknown'},
+            'walls': {'detected': False, 'vertical_edges': 0, 'material': 'unknown'},
+            'windows': [],
+            'doors': [],
+            'foundation': {'detected': False, 'horizontal_edges': 0, 'material': 'concrete'}
+        }
+        for (y0, x0, y1, x1), (tile_properties, ty0, tx0) in zip(windows, tile_results):
+            for name, counter in (('roof', 'estimated_area'), ('walls', 'vertical_edges'), ('foundation', 'horizontal_edges')):
+                found = tile_properties.get(name, {})
+                properties[name]['detected'] = properties[name]['detected'] or bool(found.get('detected'))
+                properties[name][counter] += found.get(counter, 0)
+            for name in OBJECT_COMPONENTS:
+                for item in tile_properties.get(name, []):
+                    bx, by, bw, bh = item['bbox']
+                    gx, gy = bx + tx0, by + ty0
+                    # Objects seen by two tiles through the overlap belong to the tile holding their centre
+                    cx, cy = gx + bw / 2.0, gy + bh / 2.0
+                    if y0 <= cy < y1 and x0 <= cx < x1:
+                        properties[name].append(dict(item, bbox=(gx, gy, bw, bh)))
+
+        summary = {'num_components': len(properties), 'tiles': len(windows)}
+        return {'properties': properties, 'property_summary': summary}
+
+    def _tile_parts(self, thresh: np.ndarray, window: Tuple[int, int, int, int], shape: Tuple[int, int]) -> Dict:
+        """Contours of one tile's change mask plus the component labels on
+        its edges, keeping only parts that are significant or may continue
+        into a neighbouring tile"""
+        y0, x0, y1, x1 = window
+        if not thresh.any():
+            return {'changed': False, 'parts': {}, 'edges': None}
+        _, labels = cv2.connectedComponents(thresh, connectivity=8)
+        pixel_counts = np.bincount(labels.ravel())
+        edges = {
+            'top': labels[0, :].copy(), 'bottom': labels[-1, :].copy(),
+            'left': labels[:, 0].copy(), 'right': labels[:, -1].copy()
+        }
+        on_edge = set(np.concatenate(list(edges.values())).tolist()) - {0}
+
+        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        parts = {}
+        for contour in contours:
+            px, py = contour[0][0]
+            label = int(labels[py, px])
+            area = cv2.contourArea(contour)
+            if area < self.change_detector.min_contour_area and label not in on_edge:
+                continue
+            bx, by, bw, bh = cv2.boundingRect(contour)
+            parts[label] = {
+                'area': area,
+                'pixels': int(pixel_counts[label]),
+                'bbox': (bx + x0, by + y0, bw, bh),
+                'contour': contour + np.array([x0, y0], dtype=contour.dtype)
+            }
+        return {'changed': True, 'parts': parts, 'edges': edges}
+
+    def _stitch(self, windows: List[Tuple[int, int, int, int]], tile_results: List[Dict]) -> List[Dict]:
+        """Join parts that touch (8-connected) across tile borders into global regions"""
+        index = {(window[0], window[1]): i for i, window in enumerate(windows)}
+        uf = _UnionFind()
+        for i, result in enumerate(tile_results):
+            for label in result['parts']:
+                uf.find((i, label))
+
+        def link(i, a_labels, j, b_labels, diagonal=True):
+            shifts = (-1, 0, 1) if diagonal else (0,)
+            for shift in shifts:
+                a = a_labels[max(0, -shift):len(a_labels) - max(0, shift)]
+                b = b_labels[max(0, shift):len(b_labels) - max(0, -shift)]
+                n = min(len(a), len(b))
+                a, b = a[:n], b[:n]
+                both = (a > 0) & (b > 0)
+                if both.any():
+                    for la, lb in np.unique(np.stack([a[both], b[both]], axis=1), axis=0):
+                        if int(la) in tile_results[i]['parts'] and int(lb) in tile_results[j]['parts']:
+                            uf.union((i, int(la)), (j, int(lb)))
+
+        for i, (y0, x0, y1, x1) in enumerate(windows):
+            if tile_results[i]['edges'] is None:
+                continue
+            edges = tile_results[i]['edges']
+            right = index.get((y0, x1))
+            below = index.get((y1, x0))
+            below_right = index.get((y1, x1))
+            below_left = index.get((y1, x0 - self.tile_size)) if x0 > 0 else None
+            if right is not None and tile_results[right]['edges'] is not None:
+                link(i, edges['right'], right, tile_results[right]['edges']['left'])
+            if below is not None and tile_results[below]['edges'] is not None:
+                link(i, edges['bottom'], below, tile_results[below]['edges']['top'])
+            # Corner pixels touch diagonally adjacent tiles
+            if below_right is not None and tile_results[below_right]['edges'] is not None:
+                link(i, edges['bottom'][-1:], below_right, tile_results[below_right]['edges']['top'][:1], diagonal=False)
+            if below_left is not None and tile_results[below_left]['edges'] is not None:
+                link(i, edges['bottom'][:1], below_left, tile_results[below_left]['edges']['top'][-1:], diagonal=False)
+
+        groups = {}
+        for i, result in enumerate(tile_results):
+            for label, part in result['parts'].items():
+                groups.setdefault(uf.find((i, label)), []).append(part)
+
+        regions = []
+        for parts in groups.values():
+            x0 = min(p['bbox'][0] for p in parts)
+            y0 = min(p['bbox'][1] for p in parts)
+            x1 = max(p['bbox'][0] + p['bbox'][2] for p in parts)
+            y1 = max(p['bbox'][1] + p['bbox'][3] for p in parts)
+            contours = [p['contour'] for p in parts]
+            if len(parts) == 1:
+                area = parts[0]['area']
+            elif (x1 - x0) * (y1 - y0) <= self.merge_max_pixels:
+                contours, area = self._merge_parts(contours, (x0, y0, x1, y1))
+            else:
+                # Summed piece contours miss the strips along the cuts
+                area = float(sum(p['pixels'] for p in parts))
+            regions.append({'area': area, 'bbox': (x0, y0, x1 - x0, y1 - y0), 'contours': contours})
+        regions.sort(key=lambda r: (r['bbox'][1], r['bbox'][0]))
+        return regions
+
+    def _merge_parts(self, contours: List[np.ndarray], box: Tuple[int, int, int, int]) -> Tuple[List[np.ndarray], float]:
+        """Outer contour and contour area of pieces of one region, as the
+        untiled detector would measure it, by redrawing them inside `box`"""
+        x0, y0, x1, y1 = box
+        offset = np.array([x0, y0], dtype=np.int32)
+        mask = np.zeros((y1 - y0, x1 - x0), dtype=np.uint8)
+        cv2.drawContours(mask, [c.astype(np.int32) - offset for c in contours], -1, 255, cv2.FILLED)
+        merged, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        return [c + offset for c in merged], sum(cv2.contourArea(c) for c in merged)
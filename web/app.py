@@ -1,6 +1,7 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
 import os
 import sys
+import json
 import markdown
 import pdfkit
 from datetime import datetime
@@ -14,6 +15,7 @@ from rag.vector_store import PropertyVectorStore
 from rag.query_engine import PropertyQueryEngine
 from agents.orchestrator import PropertyOrchestrator
 from reports.final_report_generator import FinalReportGenerator
+from utils.llm_usage import get_default_usage_tracker
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'uploads'
@@ -45,7 +47,55 @@ def query_property():
         result = query_engine.query_with_context(question, query_type)
         
         # Format response as markdown
-        markdown_response = f"""# Property Analysis Report
+        markdown_response = _format_query_markdown(question, query_type, result)
+        
+        return jsonify({
+            'success': True,
+            'markdown': markdown_response,
+            'html': markdown.markdown(markdown_response),
+            'finish_reason': result['finish_reason'],
+            'truncated': result['truncated'],
+            'raw_result': result
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/query/stream', methods=['GET', 'POST'])
+def stream_query_property():
+    """Server-Sent Events version of /api/query that streams answer tokens"""
+    data = request.json if request.is_json else request.args
+    question = data.get('question', '')
+    query_type = data.get('query_type', 'general')
+    
+    def generate():
+        try:
+            for event in query_engine.stream_query_with_context(question, query_type):
+                if event['type'] == 'done':
+                    result = event['result']
+                    markdown_response = _format_query_markdown(question, query_type, result)
+                    payload = {
+                        'success': True,
+                        'answer': result['answer'],
+                        'markdown': markdown_response,
+                        'html': markdown.markdown(markdown_response),
+                        'retrieved': result['retrieved'],
+                        'finish_reason': result['finish_reason'],
+                        'truncated': result['truncated']
+                    }
+                else:
+                    payload = event
+                yield _sse(event['type'], payload)
+        except Exception as e:
+            yield _sse('error', {'success': False, 'error': str(e)})
+    
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers=headers)
+
+def _sse(event: str, payload: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+def _format_query_markdown(question: str, query_type: str, result: dict) -> str:
+    return f"""# Property Analysis Report
 
 ## Question
 {question}
@@ -58,15 +108,6 @@ def query_property():
 - Query type: {query_type}
 - Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 """
-        
-        return jsonify({
-            'success': True,
-            'markdown': markdown_response,
-            'html': markdown.markdown(markdown_response),
-            'raw_result': result
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_images():
@@ -196,5 +237,18 @@ def generate_pdf():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/llm-usage', methods=['GET'])
+def llm_usage():
+    """Token, cost and latency totals of LLM calls by caller, model and prompt"""
+    tracker = get_default_usage_tracker()
+    try:
+        top = int(request.args.get('top', 10))
+    except ValueError:
+        top = 10
+    summary = tracker.summary(top)
+    if request.args.get('reset') in ('1', 'true'):
+        tracker.reset()
+    return jsonify({'success': True, 'usage': summary})
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
\ No newline at end of file